@@ -0,0 +1,163 @@
+"""
+Benchmarks for the image layer, using synthetic segmented raw images.
+
+Builds a raw image split into 1 to 500 .001-style segments in a temporary
+directory, then measures:
+  - RawSegmentImgInfo.read with random small reads and large sequential reads
+  - compute_hash_raw_segments
+  - run_carver, through img_info.read and through the kernel-side copy of the segment files
+
+    python bench_image.py                                  # 64 MB image, 1/10/100/500 segments
+    python bench_image.py --image-mb 1024 --segments 1 50 --cold
+
+Runs offline on Linux using only temporary files. --cold evicts the segment
+files from the page cache (posix_fadvise) before each measurement.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import script
+
+DEFAULT_SEGMENTS = [1, 10, 100, 500]
+SECTOR = 512
+
+def make_segmented_image(directory, total_size, segment_count, seed=0):
+    """
+    Write a raw image of total_size bytes as segment_count files (name.001, name.002, ...).
+
+    Returns:
+        list: Ordered segment paths
+    """
+    rng = random.Random(seed)
+    base = max(SECTOR, (total_size // segment_count) // SECTOR * SECTOR)
+    block = rng.randbytes(1024 * 1024)
+    segments = []
+    written = 0
+    for i in range(1, segment_count + 1):
+        size = base if i < segment_count else total_size - written
+        path = os.path.join(directory, f"image.{i:03d}")
+        with open(path, 'wb') as f:
+            remaining = size
+            while remaining > 0:
+                chunk = block[:min(remaining, len(block))]
+                f.write(chunk)
+                remaining -= len(chunk)
+        segments.append(path)
+        written += size
+        if written >= total_size:
+            break
+    return segments
+
+def evict_page_cache(paths):
+    """Drop the files from the page cache so the next reads hit the disk."""
+    for path in paths:
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+def bench_random_reads(img_info, count, read_size, seed=0):
+    rng = random.Random(seed)
+    limit = img_info.get_size() - read_size
+    offsets = [rng.randrange(0, limit // SECTOR) * SECTOR for _ in range(count)]
+    start = time.perf_counter()
+    total = 0
+    for offset in offsets:
+        total += len(img_info.read(offset, read_size))
+    elapsed = time.perf_counter() - start
+    return {'reads': count, 'read_size': read_size, 'seconds': round(elapsed, 4),
+            'reads_per_second': round(count / elapsed, 1), 'mb_per_second': round(total / 1024**2 / elapsed, 2)}
+
+def bench_sequential_reads(img_info, read_size):
+    size = img_info.get_size()
+    start = time.perf_counter()
+    offset = 0
+    while offset < size:
+        data = img_info.read(offset, min(read_size, size - offset))
+        if not data:
+            break
+        offset += len(data)
+    elapsed = time.perf_counter() - start
+    return {'bytes': offset, 'read_size': read_size, 'seconds': round(elapsed, 4),
+            'mb_per_second': round(offset / 1024**2 / elapsed, 2)}
+
+def bench_hash(segments, logger):
+    size = sum(os.path.getsize(s) for s in segments)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        script.compute_hash_raw_segments(segments, 'md5', logger)
+    elapsed = time.perf_counter() - start
+    return {'bytes': size, 'seconds': round(elapsed, 4), 'mb_per_second': round(size / 1024**2 / elapsed, 2)}
+
+def bench_carver(img_info, directory, raw_segments=None):
+    size = img_info.get_size()
+    output = os.path.join(directory, 'carved.bin')
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        script.run_carver(img_info, 0, size, output, raw_segments)
+    elapsed = time.perf_counter() - start
+    carved = os.path.getsize(output)
+    os.remove(output)
+    return {'bytes': carved, 'seconds': round(elapsed, 4), 'mb_per_second': round(carved / 1024**2 / elapsed, 2)}
+
+def run_segment_case(total_size, segment_count, random_reads, random_read_size, sequential_read_size, cold, logger):
+    """Build one segmented image and run every image-layer benchmark against it."""
+    with tempfile.TemporaryDirectory(prefix='bench_image_') as directory:
+        segments = make_segmented_image(directory, total_size, segment_count)
+        img_info = script.RawSegmentImgInfo(segments)
+        try:
+            results = {'segments': len(segments), 'image_bytes': total_size}
+            for name, run in (
+                ('random_read', lambda: bench_random_reads(img_info, random_reads, random_read_size)),
+                ('sequential_read', lambda: bench_sequential_reads(img_info, sequential_read_size)),
+                ('hash', lambda: bench_hash(segments, logger)),
+                ('carve', lambda: bench_carver(img_info, directory)),
+                ('carve_kernel', lambda: bench_carver(img_info, directory, segments)),
+            ):
+                if cold:
+                    evict_page_cache(segments)
+                results[name] = run()
+            return results
+        finally:
+            img_info.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark image reads, hashing and carving on synthetic raw images.")
+    parser.add_argument('--segments', type=int, nargs='+', default=DEFAULT_SEGMENTS, help="Segment counts to test (1-999)")
+    parser.add_argument('--image-mb', type=int, default=64, help="Total image size in MB")
+    parser.add_argument('--random-reads', type=int, default=5000, help="Number of random small reads")
+    parser.add_argument('--random-read-size', type=int, default=4096, help="Size of each random read in bytes")
+    parser.add_argument('--sequential-read-size', type=int, default=1024 * 1024, help="Size of each sequential read in bytes")
+    parser.add_argument('--cold', action='store_true', help="Evict segments from the page cache before each measurement")
+    parser.add_argument('--output', help="Also write the results JSON here")
+    args = parser.parse_args(argv)
+
+    logger = logging.getLogger('bench_image')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    total_size = args.image_mb * 1024 * 1024
+    results = {}
+    print(f"{'segments':>8}  {'random 4K reads/s':>18}  {'sequential MB/s':>15}  {'hash MB/s':>10}  {'carve MB/s':>10}  {'kernel carve MB/s':>17}")
+    for count in args.segments:
+        result = run_segment_case(total_size, count, args.random_reads, args.random_read_size,
+                                  args.sequential_read_size, args.cold, logger)
+        results[str(count)] = result
+        print(f"{result['segments']:>8}  {result['random_read']['reads_per_second']:>18,.0f}  "
+              f"{result['sequential_read']['mb_per_second']:>15,.1f}  {result['hash']['mb_per_second']:>10,.1f}  "
+              f"{result['carve']['mb_per_second']:>10,.1f}  {result['carve_kernel']['mb_per_second']:>17,.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
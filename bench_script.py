@@ -0,0 +1,244 @@
+"""
+Benchmarks for SQLite history parsing and export.
+
+Generates synthetic Chromium History and Firefox places.sqlite databases
+(optionally with a live -wal file next to them), then times parse_history_db
+and export_history end to end and compares the results with a stored baseline.
+
+    python bench_script.py                              # 1k, 10k and 100k rows
+    python bench_script.py --sizes 1000 1000000 10000000
+    python bench_script.py --save-baseline              # Store results as the new baseline
+
+Each case runs in a fresh process so peak memory is measured per case.
+Exit code is 1 when a case regresses past --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import script
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+DOMAINS = ['google.com', 'youtube.com', 'github.com', 'stackoverflow.com', 'wikipedia.org', 'reddit.com',
+           'microsoft.com', 'mail.example.org', 'news.ycombinator.com', 'docs.python.org']
+WORDS = ['login', 'search', 'watch', 'issues', 'questions', 'wiki', 'comments', 'inbox', 'item', 'library',
+         'settings', 'profile', 'download', 'report', 'results']
+
+# Microseconds between 1601-01-01 (WebKit epoch) and 1970-01-01
+WEBKIT_OFFSET = 11644473600 * 1000000
+
+def generate_visits(rows, seed=0):
+    """Yield (url, title, unix_micros) tuples that look like real browsing."""
+    rng = random.Random(seed)
+    now = int(time.time() * 1000000)
+    for i in range(rows):
+        domain = rng.choice(DOMAINS)
+        path = '/'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        url = f"https://{domain}/{path}?id={i}&q={rng.getrandbits(32):x}"
+        title = f"{path.replace('/', ' ').title()} - {domain}"
+        yield url, title, now - rng.randint(0, 365 * 86400 * 1000000)
+
+def _write_rows(db_path, schema, insert_sql, rows_iter, rows, wal, dest_path):
+    """
+    Create a database and, for wal=True, leave the last 10% of rows in a -wal
+    file by copying the files while the writer connection is still open (as a
+    running browser would leave them).
+    """
+    conn = sqlite3.connect(db_path)
+    conn.executescript(schema)
+    committed = rows - rows // 10 if wal else rows
+
+    batch = []
+    for i, row in enumerate(rows_iter):
+        if wal and i == committed:
+            conn.executemany(insert_sql, batch)
+            conn.commit()
+            batch = []
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA wal_autocheckpoint=0")
+        batch.append(row)
+        if len(batch) >= 50000:
+            conn.executemany(insert_sql, batch)
+            batch = []
+    conn.executemany(insert_sql, batch)
+    conn.commit()
+
+    shutil.copyfile(db_path, dest_path)
+    if wal:
+        shutil.copyfile(f"{db_path}-wal", f"{dest_path}-wal")
+    conn.close()
+
+def make_chromium_history(dest_path, rows, wal=False, seed=0):
+    """Create a Chromium History database with `rows` URLs (and one visit per URL)."""
+    schema = """
+    CREATE TABLE urls (id INTEGER PRIMARY KEY AUTOINCREMENT, url LONGVARCHAR, title LONGVARCHAR,
+                       visit_count INTEGER DEFAULT 0 NOT NULL, typed_count INTEGER DEFAULT 0 NOT NULL,
+                       last_visit_time INTEGER NOT NULL, hidden INTEGER DEFAULT 0 NOT NULL);
+    CREATE INDEX urls_url_index ON urls (url);
+    CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER NOT NULL, visit_time INTEGER NOT NULL,
+                         from_visit INTEGER, transition INTEGER DEFAULT 0 NOT NULL);
+    CREATE INDEX visits_time_index ON visits (visit_time);
+    CREATE TRIGGER add_visit AFTER INSERT ON urls BEGIN
+        INSERT INTO visits (url, visit_time, transition) VALUES (new.id, new.last_visit_time, 805306368);
+    END;
+    """
+    insert = "INSERT INTO urls (url, title, visit_count, last_visit_time) VALUES (?, ?, 1, ?)"
+    visits = ((url, title, ts + WEBKIT_OFFSET) for url, title, ts in generate_visits(rows, seed))
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_rows(os.path.join(tmp, 'History'), schema, insert, visits, rows, wal, dest_path)
+
+def make_firefox_places(dest_path, rows, wal=False, seed=0):
+    """Create a Firefox places.sqlite database with `rows` places (and one visit per place)."""
+    schema = """
+    CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, rev_host LONGVARCHAR,
+                             visit_count INTEGER DEFAULT 0, hidden INTEGER DEFAULT 0 NOT NULL,
+                             typed INTEGER DEFAULT 0 NOT NULL, frecency INTEGER DEFAULT -1 NOT NULL,
+                             last_visit_date INTEGER, guid TEXT, url_hash INTEGER DEFAULT 0 NOT NULL);
+    CREATE INDEX moz_places_lastvisitdateindex ON moz_places (last_visit_date);
+    CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER,
+                                    visit_date INTEGER, visit_type INTEGER, session INTEGER);
+    CREATE TRIGGER add_visit AFTER INSERT ON moz_places BEGIN
+        INSERT INTO moz_historyvisits (from_visit, place_id, visit_date, visit_type, session)
+        VALUES (0, new.id, new.last_visit_date, 1, 0);
+    END;
+    """
+    insert = "INSERT INTO moz_places (url, title, rev_host, visit_count, frecency, last_visit_date) VALUES (?, ?, ?, 1, 100, ?)"
+    places = ((url, title, url.split('/')[2][::-1] + '.', ts) for url, title, ts in generate_visits(rows, seed))
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_rows(os.path.join(tmp, 'places.sqlite'), schema, insert, places, rows, wal, dest_path)
+
+def get_database(workdir, browser, rows, wal):
+    """Return the path of a generated database, reusing it from workdir when it already exists."""
+    name = f"{browser.lower()}_{rows}{'_wal' if wal else ''}"
+    case_dir = os.path.join(workdir, name)
+    db_path = os.path.join(case_dir, script.get_history_filename(browser))
+    if not os.path.exists(db_path):
+        os.makedirs(case_dir, exist_ok=True)
+        maker = make_firefox_places if browser == 'Firefox' else make_chromium_history
+        maker(db_path, rows, wal)
+    return db_path
+
+def run_case(db_path, browser, rows):
+    """
+    Time parse_history_db and export_history on a copy of db_path (parsing may
+    checkpoint the WAL, so the generated database is never touched).
+
+    Returns:
+        dict: Timings, rows per second and peak RSS for this case
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        work_db = os.path.join(tmp, os.path.basename(db_path))
+        shutil.copyfile(db_path, work_db)
+        if os.path.exists(f"{db_path}-wal"):
+            shutil.copyfile(f"{db_path}-wal", f"{work_db}-wal")
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            records = script.parse_history_db(work_db, browser, 'Default')
+            parsed = time.perf_counter()
+            script.export_history(records, os.path.join(tmp, 'exports'), None, 'bench')
+            exported = time.perf_counter()
+
+    total = exported - start
+    return {
+        'rows': len(records),
+        'expected_rows': rows,
+        'parse_seconds': round(parsed - start, 4),
+        'export_seconds': round(exported - parsed, 4),
+        'total_seconds': round(total, 4),
+        'rows_per_second': round(len(records) / total if total else 0.0, 1),
+        'peak_rss_bytes': script.get_peak_rss(),
+    }
+
+def run_isolated(db_path, browser, rows):
+    """Run one case in a fresh process so its peak RSS isn't inflated by earlier cases."""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_case, (db_path, browser, rows))
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Flag cases that got slower (rows/s) or bigger (peak RSS) than the baseline by more than tolerance.
+
+    Returns:
+        list: Human-readable regression messages
+    """
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        if result['rows_per_second'] < base['rows_per_second'] * (1 - tolerance):
+            regressions.append(f"{case}: {result['rows_per_second']:.0f} rows/s vs baseline {base['rows_per_second']:.0f}")
+        if result['peak_rss_bytes'] and base.get('peak_rss_bytes') and \
+                result['peak_rss_bytes'] > base['peak_rss_bytes'] * (1 + tolerance):
+            regressions.append(f"{case}: peak RSS {result['peak_rss_bytes'] / 1024**2:.0f} MB "
+                               f"vs baseline {base['peak_rss_bytes'] / 1024**2:.0f} MB")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark history parsing and export on synthetic databases.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Row counts to test")
+    parser.add_argument('--browsers', nargs='+', default=['Chrome', 'Firefox'], choices=['Chrome', 'Edge', 'Firefox'])
+    parser.add_argument('--wal', choices=['both', 'yes', 'no'], default='both', help="Test databases with/without a -wal file")
+    parser.add_argument('--workdir', help="Keep generated databases here and reuse them across runs")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Write these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown/growth before flagging (0.2 = 20%%)")
+    parser.add_argument('--output', help="Also write the results JSON here")
+    args = parser.parse_args(argv)
+
+    wal_modes = {'both': [False, True], 'yes': [True], 'no': [False]}[args.wal]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_history_')
+    results = {}
+
+    try:
+        for browser in args.browsers:
+            for rows in args.sizes:
+                for wal in wal_modes:
+                    case = f"{browser}/{rows}{'/wal' if wal else ''}"
+                    db_path = get_database(workdir, browser, rows, wal)
+                    result = run_isolated(db_path, browser, rows)
+                    results[case] = result
+                    print(f"{case:<24} {result['rows']:>10} rows  parse {result['parse_seconds']:>8.3f}s  "
+                          f"export {result['export_seconds']:>8.3f}s  {result['rows_per_second']:>12,.0f} rows/s  "
+                          f"peak {(result['peak_rss_bytes'] or 0) / 1024**2:>8.1f} MB")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline found; run with --save-baseline to store one.")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\n[!] Regressions against baseline:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
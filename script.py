@@ -1,5 +1,3 @@
-import pyewf # To open E01 files
-import pytsk3 # To inspect those opened E01 files
 import os
 import sqlite3
 from datetime import datetime
@@ -10,41 +8,350 @@ import csv
 import json
 import re
 import hashlib
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager, ExitStack
+import time
+import math
+import struct
+import errno
+import heapq
+import collections
+import gzip
+import io
+import zlib
+import argparse
+from urllib.parse import urlsplit
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import importlib
 
-def setup_logging(image_name):
+class LazyModule:
+    """
+    Stand-in for an optional backend module that is only imported on first use.
+    Live mode never touches pyewf or pytsk3, so it starts fast and still runs
+    on hosts where those libraries aren't installed.
+    """
+    def __init__(self, name, install_hint):
+        self._name = name
+        self._install_hint = install_hint
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                raise ImportError(f"{self._name} is required for this mode ({self._install_hint})") from e
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+pyewf = LazyModule('pyewf', "pip install libewf-python")  # To open E01 files
+pytsk3 = LazyModule('pytsk3', "pip install pytsk3")  # To inspect those opened E01 files
+zstandard = LazyModule('zstandard', "pip install zstandard")  # Optional, for --compress zstd
+
+def setup_logging(image_name, verbosity=1):
     """
     Setup logging configuration for error tracking. This config will be used by the logs from now on.
+
+    Records go through a queue to a background listener thread, so the extraction
+    loops never wait on file or console writes.
     
     Args:
         image_name: Name of the E01 image being processed
+        verbosity: 0 = warnings only on console, 1 = info, 2 = debug (the log file always gets debug)
     
     Returns:
         logger: Configured logging object
     """
     import logging
+    import logging.handlers
+    import queue
+    import atexit
     from datetime import datetime
     
     # Create logs directory if it doesn't exist
-    try:
-        os.makedirs('logs')
-    except FileExistsError:
-        print("logs folder already exists")
+    os.makedirs('logs', exist_ok=True)
     # Create log filename with timestamp and image name
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_file = f'logs/{image_name}_{timestamp}_errors.log'
+
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    file_handler.setLevel(logging.DEBUG)
+    console_handler = logging.StreamHandler()  # Also print to console
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel({0: logging.WARNING, 1: logging.INFO}.get(verbosity, logging.DEBUG))
+
+    # Background thread does the actual writing
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
     
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Final formatting happens in the listener
+
     # Configure logging
     logging.basicConfig(
         level=logging.DEBUG,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()  # Also print to console
-        ]
+        handlers=[queue_handler],
+        force=True
     )
     
     return logging.getLogger(__name__)
 
+class ProgressReporter:
+    """
+    Rate-limited console progress instead of per-row output: rows parsed,
+    rows per second, profiles done and an ETA, redrawn at most every `interval`
+    seconds on a single line. Safe to update from several threads.
+
+    verbosity 0 prints nothing, 1 shows progress, 2 also echoes every history row.
+    """
+    def __init__(self, interval=0.5):
+        self.verbosity = 1
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_draw = 0.0
+        self.reset()
+
+    def configure(self, verbosity):
+        self.verbosity = verbosity
+
+    @property
+    def echo_rows(self):
+        return self.verbosity >= 2
+
+    def reset(self, profiles_total=None):
+        self._rows = 0
+        self._profiles_done = 0
+        self._profiles_total = profiles_total
+        self._start = time.perf_counter()
+
+    def add_profiles(self, count):
+        """Raise the number of profiles expected (when they're discovered incrementally)."""
+        with self._lock:
+            self._profiles_total = (self._profiles_total or 0) + count
+
+    def add_rows(self, count):
+        with self._lock:
+            self._rows += count
+            self._draw()
+
+    def profile_done(self):
+        with self._lock:
+            self._profiles_done += 1
+            self._draw()
+
+    def _draw(self, force=False):
+        now = time.perf_counter()
+        if self.verbosity < 1 or (not force and now - self._last_draw < self.interval):
+            return
+        self._last_draw = now
+        elapsed = max(now - self._start, 1e-9)
+        line = f"\r[PARSING] {self._rows:,} rows ({self._rows / elapsed:,.0f} rows/s)"
+        if self._profiles_total:
+            line += f", profiles {self._profiles_done}/{self._profiles_total}"
+            if 0 < self._profiles_done < self._profiles_total:
+                eta = elapsed / self._profiles_done * (self._profiles_total - self._profiles_done)
+                line += f", ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        print(line.ljust(80), end="", flush=True)
+
+    def finish(self):
+        with self._lock:
+            self._draw(force=True)
+        if self.verbosity >= 1:
+            print()
+
+    def bar(self, label, done, total, extra=""):
+        """Rate-limited percentage line for long byte-level jobs (hashing, carving)."""
+        if self.verbosity < 1:
+            return
+        now = time.perf_counter()
+        if done < total and now - self._last_draw < self.interval:
+            return
+        self._last_draw = now
+        print(f"\r[{label}] {(done / total) * 100 if total else 100:.1f}% complete{extra}", end="", flush=True)
+
+def get_peak_rss():
+    """Peak resident set size of this process in bytes, or None if the platform can't tell us."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KB, macOS bytes
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+class StageMetrics:
+    """
+    Lightweight per-stage instrumentation: wall time, CPU time, bytes read from
+    the image, rows produced and peak RSS for each named stage (hashing,
+    partition_detection, filesystem_walk, extraction, sqlite_parse, export).
+
+    Stages may run on several threads at once; CPU time is measured per thread.
+    cProfile or tracemalloc can be switched on for individual stages. tracemalloc
+    is process-wide: a traced peak covers every thread allocating while the stage
+    runs (e.g. other sqlite_parse workers or the reader), not just the stage itself.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+        self._profiles = {}
+        self.profile_stages = set()
+        self.trace_memory_stages = set()
+        self.started = time.time()
+
+    def configure(self, profile_stages=None, trace_memory_stages=None):
+        """Choose the stages to run under cProfile and tracemalloc."""
+        self.profile_stages = set(profile_stages or [])
+        self.trace_memory_stages = set(trace_memory_stages or [])
+
+    def _totals(self, name):
+        if name not in self._stages:
+            self._stages[name] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                  'bytes_read': 0, 'rows': 0, 'peak_rss_bytes': None}
+        return self._stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of work as stage `name`. Yields a dict for bytes_read/rows counts."""
+        counts = {'bytes_read': 0, 'rows': 0}
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append((name, counts))
+
+        profiler = None
+        if name in self.profile_stages:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # Another thread is already profiling
+                profiler = None
+        tracing = name in self.trace_memory_stages and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stack.pop()
+            if profiler is not None:
+                profiler.disable()
+            traced_peak = None
+            if tracing:
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            peak_rss = get_peak_rss()
+
+            with self._lock:
+                totals = self._totals(name)
+                totals['calls'] += 1
+                totals['wall_seconds'] += wall
+                totals['cpu_seconds'] += cpu
+                totals['bytes_read'] += counts['bytes_read']
+                totals['rows'] += counts['rows']
+                if peak_rss is not None:
+                    totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'] or 0, peak_rss)
+                if traced_peak is not None:
+                    totals['traced_peak_bytes'] = max(totals.get('traced_peak_bytes', 0), traced_peak)
+                if profiler is not None:
+                    self._profiles.setdefault(name, []).append(profiler)
+
+    def add(self, bytes_read=0, rows=0):
+        """Count bytes/rows against the innermost stage running on this thread, if any."""
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1][1]['bytes_read'] += bytes_read
+            stack[-1][1]['rows'] += rows
+
+    def current_stage(self):
+        """Name of the innermost stage running on this thread, or None."""
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1][0] if stack else None
+
+    def report(self):
+        """Metrics as a JSON-serializable dict, with derived throughput per stage."""
+        with self._lock:
+            stages = {}
+            for name, totals in self._stages.items():
+                entry = dict(totals)
+                wall = totals['wall_seconds'] or 1e-9
+                entry['rows_per_second'] = round(totals['rows'] / wall, 1)
+                entry['mb_per_second'] = round(totals['bytes_read'] / 1024**2 / wall, 2)
+                stages[name] = entry
+        return {
+            'started': datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+            'wall_seconds': round(time.time() - self.started, 3),
+            'cpu_seconds': round(time.process_time(), 3),
+            'peak_rss_bytes': get_peak_rss(),
+            'stages': stages,
+        }
+
+    def write_report(self, path):
+        """Write the JSON metrics file, plus a .prof file per cProfile'd stage."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=4)
+        base = os.path.splitext(path)[0]
+        for name, profilers in self._profiles.items():
+            import pstats
+            pstats.Stats(*profilers).dump_stats(f"{base}_{name}.prof")
+        return path
+
+# Process-wide recorder used by every instrumented stage
+METRICS = StageMetrics()
+# Process-wide console progress display
+PROGRESS = ProgressReporter()
+METRIC_STAGES = ['hashing', 'partition_detection', 'filesystem_walk', 'extraction', 'sqlite_parse', 'export']
+
+def instrument_stage(name, count_rows=False):
+    """Decorator: run the whole function as stage `name`; optionally count the returned list as rows."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.stage(name) as counts:
+                result = func(*args, **kwargs)
+                if count_rows and isinstance(result, list):
+                    counts['rows'] += len(result)
+                return result
+        return wrapper
+    return decorator
+
+def write_metrics_report(output_dir, selected_browser, image_name, logger):
+    """Write the run's metrics next to the exports."""
+    os.makedirs(output_dir, exist_ok=True)
+    filename_prefix = export_prefix(image_name, selected_browser)
+    path = METRICS.write_report(os.path.join(output_dir, f"{filename_prefix}_metrics.json"))
+    logger.info(f"Wrote performance metrics to: {path}")
+
 def parse_input_mode():
     """
     Ask the user what type of source to analyze.
@@ -76,73 +383,152 @@ def parse_input_mode():
 
     return mode
 
-def process_live_system(selected_browser, logger):
+def process_live_system(selected_browser, logger, artifact_results=None, filters=None, parser_workers=None,
+                        budget=None, on_history=None):
     """
     Extract browser history directly from the live running system.
 
+    Args:
+        selected_browser (str or None): Specific browser to analyze
+        logger: Logging object
+        artifact_results (dict or None): If given, filled with the other artifacts
+            (downloads, bookmarks, ...) as {artifact_name: entries}
+        filters (dict or None): History filters from build_history_filters
+        parser_workers (int or None): Profiles extracted and parsed at once (default: CPU count)
+        budget (ResourceBudget or None): Memory/temp-disk budget each profile must fit in before it starts
+        on_history (callable or None): Called with each profile's history records as soon
+            as they are parsed (e.g. HistoryExporter.write); they are then not collected
+
     Returns:
-        list: All collected browser history entries
+        list: All collected browser history entries (empty with on_history)
     """
     all_history = []
 
     users_root = os.path.join(os.environ.get('SystemDrive', 'C:'), '\\Users')
-    
-    system_users = {"Default", "Default User", "All Users", "Public"}
-    
+
     # Filter to selected browser if specified
-    if selected_browser:
-        selected_browser = selected_browser.capitalize()
+    selected_browser = canonical_browser(selected_browser)
 
-    for username in os.listdir(users_root):
-        user_path = os.path.join(users_root, username)
-        if not os.path.isdir(user_path) or username in system_users:
-            continue
-        
-        logger.info(f"Searching browser history for user: {username}")
-        
-        localappdata = os.path.join(user_path, 'AppData', 'Local')
-        appdata      = os.path.join(user_path, 'AppData', 'Roaming')
-        
-        browser_paths = {
-            'Chrome':  os.path.join(localappdata, 'Google', 'Chrome', 'User Data'),
-            'Edge':    os.path.join(localappdata, 'Microsoft', 'Edge', 'User Data'),
-            'Firefox': os.path.join(appdata, 'Mozilla', 'Firefox', 'Profiles'),
-        }
-        
-        if selected_browser:
-            browser_paths = {k: v for k, v in browser_paths.items() if k == selected_browser}
+    PROGRESS.reset()
+    jobs = discover_live_profiles(users_root, selected_browser, logger)
+    PROGRESS.add_profiles(len(jobs))
 
-        for browser, base_path in browser_paths.items():
-            if not os.path.exists(base_path):
-                logger.debug(f"{browser} not found at {base_path}")
-                continue
+    budget = budget or ResourceBudget()
 
-            logger.info(f"Found {browser} at {base_path}")
+    def run_job(job):
+        username, browser, profile_name, files_dict = job
+        with budget.reserve(*estimate_profile_cost(files_dict)):
+            # Profiles already run on this pool, so each one parses its artifacts sequentially
+            return extract_profile_artifacts(files_dict, browser, profile_name, filters=filters, concurrent=False)
 
+    # Live files are ordinary files and sqlite3 releases the GIL, so profiles parse in parallel.
+    # Results are collected in discovery order to keep the output stable.
+    with ThreadPoolExecutor(max_workers=parser_workers or os.cpu_count() or 1, thread_name_prefix='parser') as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for (username, browser, profile_name, files_dict), future in zip(jobs, futures):
             try:
-                for profile_name in os.listdir(base_path):
-                    profile_path = os.path.join(base_path, profile_name)
+                results = future.result()
+            except Exception as e:
+                logger.error(f"Error processing {browser} profile {profile_name}: {str(e)}")
+                PROGRESS.profile_done()
+                continue
 
-                    # Only process actual profile directories
-                    if not is_valid_profile(browser, profile_name):
-                        continue
+            history_entries = tag_history_source(results.pop('history', []), username, 'live_system')
+            if history_entries:
+                logger.debug(f"Successfully processed {browser} profile {profile_name}")
+                if on_history:
+                    on_history(history_entries)
+                else:
+                    all_history.extend(history_entries)
+            PROGRESS.profile_done()
+            if artifact_results is not None:
+                for name, entries in results.items():
+                    artifact_results.setdefault(name, []).extend(entries)
 
-                    main_name = get_history_filename(browser)
-                    db_path = os.path.join(profile_path, main_name)
+    PROGRESS.finish()
+    return all_history
 
-                    if not os.path.exists(db_path):
-                        continue
+def discover_live_profiles(users_root, selected_browser, logger, max_workers=None):
+    """
+    Find every browser profile under users_root, scanning the user directories in parallel.
 
-                    logger.info(f"Found {browser} history in profile {profile_name}")
-                    history_entries = extract_and_analyze_history({'main': db_path}, browser, profile_name)
-                    if history_entries:
-                        logger.info(f"Successfully processed {browser} profile {profile_name}")
-                        all_history.extend(history_entries)
+    Uses os.scandir so directory/file checks come from the cached dirent types
+    instead of one stat call per candidate.
 
-            except Exception as e:
+    Args:
+        users_root (str): Directory holding the user profiles (normally C:\\Users)
+        selected_browser (str or None): Only look for this browser
+        logger: Logging object
+        max_workers (int or None): Users scanned at once (default: up to 32)
+
+    Returns:
+        list: (username, browser, profile_name, files_dict) tuples, sorted by user
+    """
+    system_users = {"Default", "Default User", "All Users", "Public"}
+
+    try:
+        with os.scandir(users_root) as it:
+            users = sorted((entry.name, entry.path) for entry in it
+                           if entry.name not in system_users and entry.is_dir())
+    except OSError as e:
+        logger.error(f"Failed to list {users_root}: {str(e)}")
+        return []
+
+    if not users:
+        return []
+
+    def scan_user(user):
+        username, user_path = user
+        try:
+            return discover_live_user_profiles(username, user_path, selected_browser, logger)
+        except Exception as e:
+            logger.error(f"Error processing user {username}: {str(e)}")
+            return []
+
+    jobs = []
+    with ThreadPoolExecutor(max_workers=max_workers or min(32, len(users)), thread_name_prefix='discovery') as pool:
+        for user_jobs in pool.map(scan_user, users):
+            jobs.extend(user_jobs)
+    return jobs
+
+def discover_live_user_profiles(username, user_path, selected_browser, logger):
+    """
+    Find the browser profiles of one user on the live system.
+
+    Returns:
+        list: (username, browser, profile_name, files_dict) tuples
+    """
+    logger.info(f"Searching browser history for user: {username}")
+
+    appdata = {root: os.path.join(user_path, 'AppData', root) for root in ('Local', 'Roaming')}
+    browser_paths = locate_browsers(appdata, list_live_subdirs, selected_browser)
+
+    jobs = []
+    for browser, base_path in browser_paths.items():
+        if BROWSER_REGISTRY[browser].get('single_profile'):
+            profiles = [('Default', base_path)]
+        else:
+            try:
+                with os.scandir(base_path) as it:
+                    profiles = sorted((entry.name, entry.path) for entry in it
+                                      if is_valid_profile(browser, entry.name) and entry.is_dir())
+            except OSError as e:
                 logger.error(f"Error processing {browser}: {str(e)}")
+                continue
 
-    return all_history
+        logger.info(f"Found {browser} at {base_path}")
+        for profile_name, profile_path in profiles:
+            try:
+                files_dict = build_files_dict(browser, list_live_profile_entries(profile_path, browser))
+            except OSError as e:
+                logger.error(f"Error reading {browser} profile {profile_name}: {str(e)}")
+                continue
+            if files_dict is None:
+                continue
+
+            logger.info(f"Found {browser} history in profile {profile_name}")
+            jobs.append((username, browser, profile_name, files_dict))
+    return jobs
 
 def extract_ewf_hashes(filenames, logger):
     """Extract embedded MD5/SHA1 from EWF binary sections."""
@@ -188,13 +574,15 @@ def compute_hash_by_algorithm(ewf_handle, algorithm, logger):
     total_size = ewf_handle.get_media_size()
     ewf_handle.seek(0)
 
-    while offset < total_size:
-        data = ewf_handle.read(chunk_size)
-        if not data:
-            break
-        h.update(data)
-        offset += len(data)
-        print(f"\r[HASHING] {(offset/total_size)*100:.1f}% complete", end="")
+    with METRICS.stage('hashing') as counts:
+        while offset < total_size:
+            data = ewf_handle.read(chunk_size)
+            if not data:
+                break
+            h.update(data)
+            offset += len(data)
+            PROGRESS.bar('HASHING', offset, total_size)
+        counts['bytes_read'] += offset
 
     result = h.hexdigest()
     print(f"\n[+] Computed {algorithm.upper()}: {result}")
@@ -205,7 +593,7 @@ def detect_algorithm(hash_string):
     length_map = {32: 'md5', 40: 'sha1', 56: 'sha224', 64: 'sha256'}
     return length_map.get(len(hash_string.strip()), None)
     
-class EwfImgInfo(pytsk3.Img_Info): 
+class _EwfImgInfo:
     """
     pyewf reads Ewfs, but ptsk3 needs image that has read(), close(), get_size() method.
 
@@ -230,7 +618,7 @@ class EwfImgInfo(pytsk3.Img_Info):
         return self._ewf_handle.get_media_size()
 
 
-class RawSegmentImgInfo(pytsk3.Img_Info):
+class _RawSegmentImgInfo:
     """
     Stitches multiple raw segments together so pytsk3 sees one continuous disk.
     Same pattern as EwfImgInfo but reads from ordered segment files.
@@ -278,8 +666,128 @@ class RawSegmentImgInfo(pytsk3.Img_Info):
             seg_start += seg_size
 
         return result
+
+
+class _IOAccountingImgInfo:
+    """
+    Wraps any image object (EwfImgInfo, RawSegmentImgInfo, pytsk3.Img_Info) and
+    accounts for every read pytsk3 makes, per METRICS stage: number of reads,
+    read-size histogram, seek-distance distribution and total bytes. Optionally
+    streams every read to a CSV trace file.
+
+    The image hash is computed straight from the EWF handle or segment files
+    before this wrapper exists, so the hashing pass is not included.
+    """
+    def __init__(self, img_info, trace_path=None):
+        self._img_info = img_info
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_end = None
+        self._trace = None
+        self._trace_writer = None
+        if trace_path:
+            self._trace = open(trace_path, 'w', newline='', encoding='utf-8')
+            self._trace_writer = csv.writer(self._trace)
+            self._trace_writer.writerow(['time', 'stage', 'offset', 'size', 'seek_distance'])
+        self._start = time.perf_counter()
+        super().__init__(url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
+
+    @staticmethod
+    def _bucket(value):
+        """Power-of-two bucket label: 0, 1, 2, 4, ... (upper bound of the bucket)."""
+        return 0 if value <= 0 else 1 << (value - 1).bit_length()
+
+    def close_trace(self):
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+            self._trace_writer = None
+
+    def close(self):
+        self.close_trace()
+        self._img_info.close()
+
+    def get_size(self):
+        return self._img_info.get_size()
+
+    def read(self, offset, size):
+        data = self._img_info.read(offset, size)
+        stage = METRICS.current_stage() or 'unstaged'
+
+        with self._lock:
+            # The first read has nothing to be sequential to or seek from
+            distance = None if self._last_end is None else offset - self._last_end
+            self._last_end = offset + len(data)
+
+            stats = self._stats.get(stage)
+            if stats is None:
+                stats = self._stats[stage] = {'reads': 0, 'bytes': 0, 'sequential_reads': 0, 'backward_seeks': 0,
+                                              'read_sizes': {}, 'seek_distances': {}}
+            stats['reads'] += 1
+            stats['bytes'] += len(data)
+            if distance == 0:
+                stats['sequential_reads'] += 1
+            elif distance is not None and distance < 0:
+                stats['backward_seeks'] += 1
+            size_bucket = self._bucket(size)
+            stats['read_sizes'][size_bucket] = stats['read_sizes'].get(size_bucket, 0) + 1
+            if distance is not None:
+                seek_bucket = self._bucket(abs(distance))
+                stats['seek_distances'][seek_bucket] = stats['seek_distances'].get(seek_bucket, 0) + 1
+
+            if self._trace_writer is not None:
+                self._trace_writer.writerow([f"{time.perf_counter() - self._start:.6f}", stage, offset, size,
+                                             '' if distance is None else distance])
+
+        return data
+
+    def report(self):
+        """Per-stage and total I/O accounting as a JSON-serializable dict."""
+        with self._lock:
+            stages = {}
+            total = {'reads': 0, 'bytes': 0, 'sequential_reads': 0, 'backward_seeks': 0}
+            for stage, stats in self._stats.items():
+                stages[stage] = {
+                    'reads': stats['reads'],
+                    'bytes': stats['bytes'],
+                    'average_read_size': stats['bytes'] // max(stats['reads'], 1),
+                    'sequential_reads': stats['sequential_reads'],
+                    'backward_seeks': stats['backward_seeks'],
+                    'read_sizes': {str(k): v for k, v in sorted(stats['read_sizes'].items())},
+                    'seek_distances': {str(k): v for k, v in sorted(stats['seek_distances'].items())},
+                }
+                for key in total:
+                    total[key] += stats[key]
+        return {'total': total, 'stages': stages}
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=4)
+        return path
     
 
+# The Img_Info wrappers above are written as plain classes; the real subclasses of
+# pytsk3.Img_Info are only built (and pytsk3 only imported) when an image is opened.
+_IMAGE_CLASS_BODIES = {
+    'EwfImgInfo': _EwfImgInfo,
+    'RawSegmentImgInfo': _RawSegmentImgInfo,
+    'IOAccountingImgInfo': _IOAccountingImgInfo,
+}
+_IMAGE_CLASSES = {}
+
+def image_class(name):
+    """Return the pytsk3.Img_Info subclass `name` (EwfImgInfo, RawSegmentImgInfo, IOAccountingImgInfo)."""
+    if name not in _IMAGE_CLASSES:
+        body = _IMAGE_CLASS_BODIES[name]
+        _IMAGE_CLASSES[name] = type(name, (body, pytsk3.Img_Info), {'__doc__': body.__doc__, '__module__': __name__})
+    return _IMAGE_CLASSES[name]
+
+def __getattr__(name):
+    # Keeps script.EwfImgInfo & co. working for importers without loading pytsk3 at import time
+    if name in _IMAGE_CLASS_BODIES:
+        return image_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def get_partition_offset(img_info, logger):
     """
     Get partition offset either automatically for basic data partition where all the user files are or through user input.
@@ -337,6 +845,12 @@ def get_partition_offset(img_info, logger):
 
     try:
         auto_offset, volume_info = find_windows_partition(img_info, logger)
+        scanned = []
+        if auto_offset is None and volume_info is None:
+            # No usable partition table: look for the volumes' boot sectors instead
+            scanned = scan_boot_sectors(img_info, logger)
+            if scanned:
+                auto_offset = scanned[0]['offset']
         
         while True:
             logger.info("\nPartition offset options:")
@@ -344,10 +858,12 @@ def get_partition_offset(img_info, logger):
             logger.info("1. Enter offset manually")
             logger.info("2. Try common offsets")
             
-            if auto_offset:
+            if auto_offset is not None:
                 logger.info(f"3. Use detected offset ({auto_offset} bytes)")
             else:
                 logger.info("Couldn't get the offset for basic data partition")
+            if len(scanned) > 1:
+                logger.info("4. Choose another volume found by the signature scan")
             
             logger.info("q. Quit")
             
@@ -367,9 +883,20 @@ def get_partition_offset(img_info, logger):
                     if result is None:
                         return None, None # User hit 'q' inside the sub-menu
                     return result, volume_info # User picked a common offset
-                case '3' if auto_offset:
+                case '3' if auto_offset is not None:
                     logger.info(f"Using automatically detected offset: {auto_offset}")
                     return auto_offset, volume_info                   
+                case '4' if len(scanned) > 1:
+                    for i, candidate in enumerate(scanned):
+                        print(f"{i+1}. Offset: {candidate['offset']} bytes ({candidate['type']}, "
+                              f"{candidate['size'] // 1024**2} MB)")
+                    try:
+                        candidate = scanned[int(input("\nSelect volume number: ")) - 1]
+                    except (ValueError, IndexError):
+                        logger.error("Invalid selection")
+                        continue
+                    logger.info(f"Using scanned offset: {candidate['offset']}")
+                    return candidate['offset'], volume_info
                 case _:
                     logger.error("Invalid choice")
                     
@@ -389,21 +916,23 @@ def find_windows_partition(img_info, logger):
         int: Offset to the NTFS partition, or None if not found
     """
     try:
-        volume_info = pytsk3.Volume_Info(img_info) # Partition table
-        sector_size = 512
-        found_partitions = [] # List to hold all basic data partitions/ntfs
-        
-        logger.info("\nDetected Partitions:")
-        for partition in volume_info:
-            desc = partition.desc.decode('utf-8').lower() # .desc -> description  of the parition by parition table (b'Basic Data Partition') and change it to English
-            logger.info(f"Addr: {partition.addr}, Start: {partition.start}, Desc: {partition.desc.decode('utf-8')}")
-            
-            # Look for Windows partition indicators
-            if any(x in desc for x in ['ntfs', 'basic data partition', 'windows']):
-                offset = partition.start * sector_size
-                logger.info(f"\nFound Windows partition at sector {partition.start}")
-                logger.info(f"Using offset: {offset} bytes")
-                found_partitions.append(offset)
+        # Only the table walk is timed; waiting for the user's pick below is not detection work
+        with METRICS.stage('partition_detection'):
+            volume_info = pytsk3.Volume_Info(img_info) # Partition table
+            sector_size = 512
+            found_partitions = [] # List to hold all basic data partitions/ntfs
+
+            logger.info("\nDetected Partitions:")
+            for partition in volume_info:
+                desc = partition.desc.decode('utf-8').lower() # .desc -> description  of the parition by parition table (b'Basic Data Partition') and change it to English
+                logger.info(f"Addr: {partition.addr}, Start: {partition.start}, Desc: {partition.desc.decode('utf-8')}")
+
+                # Look for Windows partition indicators
+                if any(x in desc for x in ['ntfs', 'basic data partition', 'windows']):
+                    offset = partition.start * sector_size
+                    logger.info(f"\nFound Windows partition at sector {partition.start}")
+                    logger.info(f"Using offset: {offset} bytes")
+                    found_partitions.append(offset)
         
         if not found_partitions:
             logger.warning("No Windows partitions found automatically.")
@@ -441,14 +970,228 @@ def find_windows_partition(img_info, logger):
             logger.error(f"Error getting detailed partition info: {e2}")
         return None, None
 
+# (signature, offset of the signature inside the boot sector, filesystem type)
+BOOT_SECTOR_SIGNATURES = [
+    (b'NTFS    ', 3, 'NTFS'),
+    (b'EXFAT   ', 3, 'exFAT'),
+    (b'FAT32   ', 82, 'FAT32'),
+    (b'FAT16   ', 54, 'FAT16'),
+    (b'FAT12   ', 54, 'FAT12'),
+]
+
+def parse_boot_sector(sector, fs_type):
+    """
+    Check the BIOS parameter block of a candidate boot sector.
+
+    Args:
+        sector (bytes): The 512-byte boot sector
+        fs_type (str): Filesystem type suggested by the signature that matched
+
+    Returns:
+        dict: {'type', 'bytes_per_sector', 'size', 'hidden_sectors', 'serial'}, or None if the BPB is invalid
+    """
+    if len(sector) < 512 or sector[510:512] != b'\x55\xaa':
+        return None
+
+    if fs_type == 'exFAT':
+        # exFAT keeps the old BPB area zeroed and stores sizes as shifts
+        if any(sector[11:64]):
+            return None
+        volume_length, = struct.unpack_from('<Q', sector, 72)
+        sector_shift, cluster_shift = sector[108], sector[109]
+        if not 9 <= sector_shift <= 12 or sector_shift + cluster_shift > 25 or not volume_length:
+            return None
+        hidden_sectors, = struct.unpack_from('<Q', sector, 64)
+        serial, = struct.unpack_from('<I', sector, 100)
+        return {'type': fs_type, 'bytes_per_sector': 1 << sector_shift, 'size': volume_length << sector_shift,
+                'hidden_sectors': hidden_sectors, 'serial': serial}
+
+    bytes_per_sector, sectors_per_cluster = struct.unpack_from('<HB', sector, 11)
+    if bytes_per_sector not in (512, 1024, 2048, 4096):
+        return None
+    # NTFS encodes clusters larger than 64 KB as a negative power of two
+    if fs_type == 'NTFS' and sectors_per_cluster >= 0xF4:
+        cluster_ok = 256 - sectors_per_cluster <= 31
+    else:
+        cluster_ok = sectors_per_cluster and sectors_per_cluster & (sectors_per_cluster - 1) == 0
+    if not cluster_ok:
+        return None
+    hidden_sectors, = struct.unpack_from('<I', sector, 28)
+
+    if fs_type == 'NTFS':
+        total_sectors, mft_cluster = struct.unpack_from('<QQ', sector, 40)
+        serial, = struct.unpack_from('<Q', sector, 72)
+        if not total_sectors or not mft_cluster:
+            return None
+        return {'type': fs_type, 'bytes_per_sector': bytes_per_sector, 'size': total_sectors * bytes_per_sector,
+                'hidden_sectors': hidden_sectors, 'serial': serial}
+
+    reserved_sectors, fat_count, _, total_16 = struct.unpack_from('<HBHH', sector, 14)
+    total_32, = struct.unpack_from('<I', sector, 32)
+    total_sectors = total_16 or total_32
+    if not reserved_sectors or fat_count not in (1, 2) or not total_sectors:
+        return None
+    serial, = struct.unpack_from('<I', sector, 67 if fs_type == 'FAT32' else 39)
+    return {'type': fs_type, 'bytes_per_sector': bytes_per_sector, 'size': total_sectors * bytes_per_sector,
+            'hidden_sectors': hidden_sectors, 'serial': serial}
+
+def scan_boot_sectors(img_info, logger, block_size=16 * 1024 * 1024, sector_size=512):
+    """
+    Find NTFS/FAT/exFAT volumes in an image whose partition table is missing or wiped
+    by looking for their boot sectors.
+
+    The image is read once, sequentially, in large blocks; each block is searched
+    with bytes.find for the filesystem signatures, and only sector-aligned hits
+    with a valid BPB are kept. NTFS backup boot sectors (last sector of the
+    volume) are dropped when their primary was also found.
+
+    Args:
+        img_info: The disk image info object
+        logger: Logger object for error tracking
+        block_size (int): Bytes read per call (rounded to whole sectors)
+        sector_size (int): Alignment of the candidates
+
+    Returns:
+        list: Candidate volumes as dicts ({'offset', 'type', 'size', 'score', ...}), best first
+    """
+    block_size = max(sector_size, block_size // sector_size * sector_size)
+    image_size = img_info.get_size()
+    candidates = []
+
+    with METRICS.stage('partition_detection') as counts:
+        offset = 0
+        while offset < image_size:
+            block = img_info.read(offset, min(block_size, image_size - offset))
+            if not block:
+                break
+            for signature, field_offset, fs_type in BOOT_SECTOR_SIGNATURES:
+                pos = block.find(signature)
+                while pos != -1:
+                    start = pos - field_offset
+                    if start >= 0 and start % sector_size == 0:
+                        info = parse_boot_sector(block[start:start + 512], fs_type)
+                        if info:
+                            info['offset'] = offset + start
+                            candidates.append(info)
+                    pos = block.find(signature, pos + 1)
+            offset += len(block)
+            PROGRESS.bar('SCANNING', offset, image_size)
+        counts['bytes_read'] += offset
+    if PROGRESS.verbosity >= 1:
+        print()
+
+    # Drop NTFS backup boot sectors that sit at the end of a volume we already have
+    primaries = {(c['serial'], c['offset'] + c['size']) for c in candidates if c['type'] == 'NTFS'}
+    candidates = [c for c in candidates if not (c['type'] == 'NTFS' and (c['serial'], c['offset']) in primaries)]
+
+    for c in candidates:
+        # Windows volumes first, then volumes that agree with their own hidden-sectors
+        # field and fit inside the image
+        c['score'] = ((3 if c['type'] == 'NTFS' else 1)
+                      + (2 if c['hidden_sectors'] * c['bytes_per_sector'] == c['offset'] else 0)
+                      + (2 if c['offset'] + c['size'] <= image_size else 0))
+    candidates.sort(key=lambda c: (-c['score'], c['offset']))
+
+    if candidates:
+        logger.info("\nBoot sectors found by signature scan:")
+        for c in candidates:
+            logger.info(f"Offset: {c['offset']} bytes, Type: {c['type']}, "
+                        f"Size: {c['size'] // 1024**2} MB, Score: {c['score']}")
+    else:
+        logger.warning("Signature scan found no NTFS/FAT/exFAT boot sectors.")
+    return candidates
+
+# Where each browser keeps its profiles, relative to the user's AppData/Local or
+# AppData/Roaming. 'family' picks the database schema and timestamp epoch;
+# 'single_profile' browsers keep one profile directly in that directory.
+BROWSER_REGISTRY = {
+    'Chrome':        {'family': 'chromium', 'root': 'Local', 'path': ('Google', 'Chrome', 'User Data')},
+    'Firefox':       {'family': 'firefox', 'root': 'Roaming', 'path': ('Mozilla', 'Firefox', 'Profiles')},
+    'Edge':          {'family': 'chromium', 'root': 'Local', 'path': ('Microsoft', 'Edge', 'User Data')},
+    'Brave':         {'family': 'chromium', 'root': 'Local', 'path': ('BraveSoftware', 'Brave-Browser', 'User Data')},
+    'Chromium':      {'family': 'chromium', 'root': 'Local', 'path': ('Chromium', 'User Data')},
+    'Vivaldi':       {'family': 'chromium', 'root': 'Local', 'path': ('Vivaldi', 'User Data')},
+    'Yandex':        {'family': 'chromium', 'root': 'Local', 'path': ('Yandex', 'YandexBrowser', 'User Data')},
+    'Opera':         {'family': 'chromium', 'root': 'Roaming', 'path': ('Opera Software', 'Opera Stable'),
+                      'single_profile': True},
+    'Opera GX':      {'family': 'chromium', 'root': 'Roaming', 'path': ('Opera Software', 'Opera GX Stable'),
+                      'single_profile': True},
+    'Waterfox':      {'family': 'firefox', 'root': 'Roaming', 'path': ('Waterfox', 'Profiles')},
+    'LibreWolf':     {'family': 'firefox', 'root': 'Roaming', 'path': ('librewolf', 'Profiles')},
+    'Pale Moon':     {'family': 'firefox', 'root': 'Roaming', 'path': ('Moonchild Productions', 'Pale Moon', 'Profiles')},
+}
+
+def canonical_browser(name):
+    """Registry name for a browser given in any case ('librewolf' -> 'LibreWolf'), or None."""
+    if not name:
+        return None
+    folded = name.casefold()
+    for browser in BROWSER_REGISTRY:
+        if browser.casefold() == folded:
+            return browser
+    return None
+
+def export_prefix(image_name, selected_browser=None):
+    """Filename prefix for every export of a run: [image]_browser_history[_browser slug]."""
+    if not selected_browser:
+        return f"{image_name}_browser_history"
+    slug = re.sub(r'[^a-z0-9]+', '_', selected_browser.lower()).strip('_')
+    return f"{image_name}_browser_history_{slug}"
+
+def browser_family(browser_type):
+    """'chromium' (WebKit timestamps, History) or 'firefox' (Unix timestamps, places.sqlite)."""
+    spec = BROWSER_REGISTRY.get(browser_type)
+    return spec['family'] if spec else 'chromium'
+
 def get_history_filename(browser_type):
-    return "places.sqlite" if browser_type == 'Firefox' else "History"
+    return "places.sqlite" if browser_family(browser_type) == 'firefox' else "History"
 
 def is_valid_profile(browser, profile_name):
-    if browser == 'Firefox':
+    if browser_family(browser) == 'firefox':
         return '.' in profile_name
     return profile_name == 'Default' or profile_name.startswith('Profile ')
 
+def locate_browsers(appdata, list_dirs, selected_browser=None):
+    """
+    Resolve the registry against a user's AppData directories. Every directory
+    on the way (AppData/Local, Google, Opera Software, ...) is listed at most
+    once and matched against all registry entries in memory, so supporting
+    more browsers doesn't add a lookup per browser per user.
+
+    Args:
+        appdata: {'Local': handle, 'Roaming': handle}, None where missing
+        list_dirs: Callable returning {casefolded name: handle} of a handle's subdirectories
+        selected_browser: Only resolve this registry entry
+
+    Returns:
+        dict: {browser: handle of the directory holding its profiles}
+    """
+    listings = {}
+
+    def subdirs(key, handle):
+        if key not in listings:
+            try:
+                listings[key] = list_dirs(handle)
+            except Exception:
+                listings[key] = {}
+        return listings[key]
+
+    found = {}
+    for browser, spec in BROWSER_REGISTRY.items():
+        if selected_browser and browser != selected_browser:
+            continue
+        handle = appdata.get(spec['root'])
+        key = (spec['root'],)
+        for part in spec['path']:
+            if handle is None:
+                break
+            handle = subdirs(key, handle).get(part.casefold())
+            key += (part.casefold(),)
+        if handle is not None:
+            found[browser] = handle
+    return found
+
+@instrument_stage('filesystem_walk')
 def find_browser_files(fs_info, username, logger, selected_browser=None):
     """
     Search for browser history files for a specific user in a disk image.
@@ -457,658 +1200,3777 @@ def find_browser_files(fs_info, username, logger, selected_browser=None):
         dict: {browser: {profile_name: {'main': file, 'wal': file}}}
     """
     found_files = {}
-    
-    browser_paths = {
-        'Chrome': f"Users/{username}/AppData/Local/Google/Chrome/User Data",
-        'Edge':   f"Users/{username}/AppData/Local/Microsoft/Edge/User Data",
-        'Firefox': f"Users/{username}/AppData/Roaming/Mozilla/Firefox/Profiles"
-    }
+    selected_browser = canonical_browser(selected_browser)
 
-    installed_browsers = {}
-    for browser, path in browser_paths.items():
+    appdata = {}
+    for root in ('Local', 'Roaming'):
         try:
-            fs_info.open_dir(path)
-            installed_browsers[browser] = path
-            logger.info(f"Found {browser} installation for user {username}")
+            appdata[root] = fs_info.open(f"Users/{username}/AppData/{root}")
         except Exception as e:
-            logger.debug(f"Browser {browser} not found: {e}")
-    
+            logger.debug(f"No AppData/{root} for user {username}: {e}")
+    installed_browsers = locate_browsers(appdata, list_image_subdirs, selected_browser)
+
     if not installed_browsers:
-        logger.warning(f"No supported browsers found for user {username}")
+        if selected_browser:
+            logger.warning(f"{selected_browser} is not installed for user {username}")
+        else:
+            logger.warning(f"No supported browsers found for user {username}")
         return found_files
 
-    if selected_browser:
-        selected_browser = selected_browser.capitalize()
-        if selected_browser not in installed_browsers:
-            logger.warning(f"{selected_browser} is not installed for user {username}")
-            return found_files
-        installed_browsers = {selected_browser: installed_browsers[selected_browser]}
-    
-    for browser, base_path in installed_browsers.items():
-        found_files[browser] = {} 
+    for browser, base_dir in installed_browsers.items():
+        logger.info(f"Found {browser} installation for user {username}")
+        found_files[browser] = {}
         try:
-            profiles_dir = fs_info.open_dir(base_path)
-            for profile in profiles_dir:
-                profile_name = profile.info.name.name.decode('utf-8')
-                if profile_name in [".", ".."]:
-                    continue
+            if BROWSER_REGISTRY[browser].get('single_profile'):
+                profiles = [('Default', base_dir)]
+            else:
+                profiles = []
+                for profile in base_dir.as_directory():
+                    profile_name = profile.info.name.name.decode('utf-8')
+                    # Only process actual browser profile directories
+                    if profile_name in [".", ".."] or not is_valid_profile(browser, profile_name):
+                        continue
+                    profiles.append((profile_name, profile))
 
-                # Only process actual browser profile directories
-                if not is_valid_profile(browser, profile_name):
+            for profile_name, profile in profiles:
+                # Walk the profile directory once and pick out every registered artifact
+                try:
+                    profile_entries = list_profile_entries(profile.as_directory(), browser)
+                except Exception as e:
+                    logger.debug(f"Error accessing profile {profile_name}: {e}")
                     continue
 
-                main_name = get_history_filename(browser)
-                history_path = f"{base_path}/{profile_name}/{main_name}"
-                wal_path = f"{history_path}-wal"
-            
-                try:
-                    file = fs_info.open(history_path)
-                    found_files[browser][profile_name] = {'main': file}
-                    logger.info(f"Found {browser} history in profile {profile_name}")
+                files_dict = build_files_dict(browser, profile_entries)
+                if files_dict is None:
+                    logger.debug(f"No history database in {browser} profile {profile_name}")
+                    continue
 
-                    try:
-                        wal_file = fs_info.open(wal_path)
-                        found_files[browser][profile_name]['wal'] = wal_file
-                        logger.info(f"Found WAL for {browser} profile {profile_name}")
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.debug(f"Error accessing history in profile {profile_name}: {e}")
+                found_files[browser][profile_name] = files_dict
+                logger.info(f"Found {browser} history in profile {profile_name}")
+                if 'wal' in files_dict:
+                    logger.info(f"Found WAL for {browser} profile {profile_name}")
+                if files_dict['extra']:
+                    logger.info(f"Found {len(files_dict['extra'])} additional artifact files for {browser} profile {profile_name}")
             
         except Exception as e:
             logger.error(f"Error accessing {browser} profiles directory: {str(e)}")
             
     return found_files
 
-def extract_and_analyze_history(files_dict, browser_type, profile_name):
-    temp_dir = tempfile.mkdtemp()
-    try:
-        main_filename = get_history_filename(browser_type)
-        temp_main_db = os.path.join(temp_dir, main_filename)
-
-        # files_dict['main'] can be either a pytsk3 file or a live path string
-        if isinstance(files_dict['main'], str):
-            shutil.copy2(files_dict['main'], temp_main_db)
-            wal_src = files_dict['main'] + "-wal"
-            if os.path.exists(wal_src):
-                shutil.copy2(wal_src, f"{temp_main_db}-wal")
-        else:
-            fs_main = files_dict['main']
-            with open(temp_main_db, 'wb') as f:
-                f.write(fs_main.read_random(0, fs_main.info.meta.size))
-            if 'wal' in files_dict:
-                fs_wal = files_dict['wal']
-                with open(f"{temp_main_db}-wal", 'wb') as f:
-                    f.write(fs_wal.read_random(0, fs_wal.info.meta.size))
-
-        return parse_history_db(temp_main_db, browser_type, profile_name)
-    except Exception as e:
-        print(f"Error processing {browser_type} history: {str(e)}")
-        return []
-    finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+def list_image_subdirs(directory):
+    """{casefolded name: pytsk3 file} of the subdirectories of a directory inside the image."""
+    subdirs = {}
+    for entry in directory.as_directory():
+        name = entry.info.name.name.decode('utf-8')
+        if name not in (".", "..") and entry.info.meta is not None \
+                and entry.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
+            subdirs[name.casefold()] = entry
+    return subdirs
+
+def list_live_subdirs(path):
+    """{casefolded name: path} of the subdirectories of a live directory."""
+    with os.scandir(path) as it:
+        return {entry.name.casefold(): entry.path for entry in it if entry.is_dir()}
 
-def parse_history_db(db_path, browser_type, profile_name):
+def list_profile_entries(profile_dir, browser):
     """
-    Parse a local SQLite history database and return formatted entries.
-    Shared by both image and live modes.
+    List a profile directory inside the image once, keeping only files some artifact needs.
+
+    Args:
+        profile_dir: pytsk3 Directory object of the profile
+        browser: Browser name (a BROWSER_REGISTRY key)
 
     Returns:
-        list: History entries
+        dict: {relative_path: pytsk3 file object}
     """
-    history_entries = []
+    wanted = get_artifact_filenames(browser)
+    subdirs = {name.split('/', 1)[0] for name in wanted if '/' in name}
+    entries = {}
 
-    if browser_type in ['Chrome', 'Edge']:
-        results = extract_chromium_history(db_path)
-    else:
-        results = extract_firefox_history(db_path)
+    for entry in profile_dir:
+        name = entry.info.name.name.decode('utf-8')
+        if name in [".", ".."] or entry.info.meta is None:
+            continue
+        if name in subdirs and entry.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
+            for child in entry.as_directory():
+                child_name = child.info.name.name.decode('utf-8')
+                if f"{name}/{child_name}" in wanted and child.info.meta is not None:
+                    entries[f"{name}/{child_name}"] = child
+        elif name in wanted and entry.info.meta.type == pytsk3.TSK_FS_META_TYPE_REG:
+            entries[name] = entry
 
-    print(f"\n{browser_type} History from profile {profile_name}:")
+    return entries
 
-    for url, title, timestamp in results:
-        try:
-            if browser_type in ['Chrome', 'Edge']:
-                timestamp = datetime.fromtimestamp((timestamp / 1000000) - 11644473600)
-            else:
-                timestamp = datetime.fromtimestamp(timestamp / 1000000)
-        except (OSError, ValueError, OverflowError):
-            timestamp = datetime(1970, 1, 1)
+def list_live_profile_entries(profile_path, browser):
+    """Same as list_profile_entries, but for a profile directory on the live system."""
+    wanted = get_artifact_filenames(browser)
+    subdirs = {name.split('/', 1)[0] for name in wanted if '/' in name}
+    entries = {}
 
-        entry = {
-            'browser': browser_type,
-            'profile': profile_name,
-            'url': url,
-            'title': title,
-            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        history_entries.append(entry)
+    with os.scandir(profile_path) as it:
+        for entry in it:
+            if entry.name in subdirs and entry.is_dir():
+                with os.scandir(entry.path) as children:
+                    for child in children:
+                        if f"{entry.name}/{child.name}" in wanted:
+                            entries[f"{entry.name}/{child.name}"] = child.path
+            elif entry.name in wanted and entry.is_file():
+                entries[entry.name] = entry.path
 
-        print(f"URL: {url}")
-        print(f"Title: {title}")
-        print(f"Profile: {profile_name}")
-        print(f"Visited: {timestamp}")
-        print("-" * 50)
+    return entries
 
-    return history_entries
+def build_files_dict(browser, profile_entries):
+    """
+    Arrange the files found in a profile into the layout extract_and_analyze_history expects.
 
-def extract_chromium_history(db_path):
+    Returns:
+        dict: {'main': file, 'wal': file, 'extra': {relative_path: file}}, or None if
+        the profile has no history database
     """
-    Extract URLs from Chrome/Edge history.
+    main_name = get_history_filename(browser)
+    if main_name not in profile_entries:
+        return None
 
-    Args:
-        db_path: The path to the database file.
+    files_dict = {'main': profile_entries[main_name], 'extra': {}}
+    if f"{main_name}-wal" in profile_entries:
+        files_dict['wal'] = profile_entries[f"{main_name}-wal"]
 
-    Returns:
-        list: A list of tuples containing URLs, titles, and last visit times.
+    for name, file in profile_entries.items():
+        if name not in (main_name, f"{main_name}-wal"):
+            files_dict['extra'][name] = file
+
+    return files_dict
+
+def copy_artifact_file(source, dest_path, chunk_size=1024 * 1024):
     """
-    try:
-        conn = sqlite3.connect(db_path, timeout=10)  # Add timeout
-        conn.execute("PRAGMA journal_mode=WAL")  # Use Write-Ahead Log mode
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT url, title, last_visit_time 
-        FROM urls 
-        WHERE last_visit_time IS NOT NULL
-        ORDER BY last_visit_time DESC
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        conn.close()
-        return results
-    except sqlite3.OperationalError as e:
+    Copy one artifact out of the image (pytsk3 file) or live system (path string).
+    Image files are read in chunks so large databases never sit in memory at once.
+    """
+    parent = os.path.dirname(dest_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+    if isinstance(source, str):
+        fast_copy_file(source, dest_path)
+        return
+
+    size = source.info.meta.size
+    offset = 0
+    with open(dest_path, 'wb') as f:
+        while offset < size:
+            data = source.read_random(offset, min(chunk_size, size - offset))
+            if not data:
+                break
+            f.write(data)
+            offset += len(data)
+    METRICS.add(bytes_read=offset)
+
+def fast_copy_file(source_path, dest_path):
+    """
+    Copy a live file as cheaply as the platform allows: a reflink clone
+    (btrfs/XFS, no data copied), then a kernel-side copy_file_range, then
+    shutil.copyfile. Timestamps are preserved like shutil.copy2.
+    """
+    with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+        copied = False
+        if sys.platform.startswith('linux'):
+            try:
+                import fcntl
+                FICLONE = 0x40049409
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                copied = True
+            except (ImportError, OSError):
+                pass
+
+        if not copied and hasattr(os, 'copy_file_range'):
+            try:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    sent = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, 1 << 30))
+                    if sent == 0:
+                        break
+                    remaining -= sent
+                copied = True
+            except OSError:
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+
+        if not copied:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    shutil.copystat(source_path, dest_path)
+
+def is_sqlite_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(16) == b'SQLite format 3\x00'
+    except OSError:
+        return False
+
+def snapshot_sqlite_database(source_path, dest_path, pages_per_step=1024, max_restarts=5):
+    """
+    Take a consistent snapshot of a live, possibly in-use SQLite database with
+    the online backup API. The source is opened read-only and copied in batches
+    of pages_per_step pages, so the browser is never stopped and the file is
+    never loaded into memory whole. Committed WAL content is included, so no
+    -wal file needs copying afterwards.
+
+    If the browser keeps writing and the incremental copy restarts more than
+    max_restarts times, the copy is redone in a single step (one short read
+    transaction).
+
+    Returns:
+        bool: True if the snapshot was written; False if the file isn't SQLite or
+        can't be opened (e.g. held with an exclusive lock), in which case the
+        caller should fall back to a plain file copy.
+    """
+    if not is_sqlite_file(source_path):
+        return False
+
+    uri = Path(os.path.abspath(source_path)).as_uri() + "?mode=ro"
+    for attempt_pages in (pages_per_step, -1):
+        restarts = 0
+        last_remaining = None
+
+        def progress(status, remaining, total):
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > max_restarts:
+                    raise sqlite3.OperationalError("backup restarted too often")
+            last_remaining = remaining
+
+        src = dst = None
+        try:
+            src = sqlite3.connect(uri, uri=True, timeout=10)
+            dst = sqlite3.connect(dest_path)
+            src.backup(dst, pages=attempt_pages, progress=progress, sleep=0.01)
+            return True
+        except sqlite3.Error:
+            if dst is not None:
+                dst.close()
+                dst = None
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            if attempt_pages == -1 or restarts <= max_restarts:
+                return False  # Locked/unreadable: a single-step retry won't help
+        finally:
+            if src is not None:
+                src.close()
+            if dst is not None:
+                dst.close()
+    return False
+
+class TempWorkspace:
+    """
+    Scratch directories for profile copies. Profiles that fit in the RAM budget
+    go to tmpfs (/dev/shm); larger ones spill to the scratch directory (default:
+    system temp). Directories are emptied and reused across profiles instead of
+    being created and removed each time, and everything is removed at exit.
+    """
+    RAM_ROOT = '/dev/shm'
+
+    def __init__(self, ram_bytes=None, scratch_dir=None):
+        self._lock = threading.Lock()
+        self._roots = {}
+        self._free = {'ram': [], 'disk': []}
+        self._owner = {}
+        self._ram_used = 0
+        self._registered = False
+        self.configure(ram_bytes, scratch_dir)
+
+    def configure(self, ram_bytes=None, scratch_dir=None):
+        """
+        Args:
+            ram_bytes: RAM budget for tmpfs copies; None for a quarter of the free tmpfs space, 0 to disable
+            scratch_dir: Where profiles that don't fit in RAM go (default: system temp)
+        """
+        if ram_bytes is None:
+            try:
+                ram_bytes = shutil.disk_usage(self.RAM_ROOT).free // 4 if os.access(self.RAM_ROOT, os.W_OK) else 0
+            except OSError:
+                ram_bytes = 0
+        self.ram_bytes = ram_bytes
+        self.scratch_dir = scratch_dir
+
+    def _root(self, tier):
+        if tier not in self._roots:
+            parent = self.RAM_ROOT if tier == 'ram' else self.scratch_dir
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._roots[tier] = tempfile.mkdtemp(prefix='browser_history_', dir=parent)
+            if not self._registered:
+                import atexit
+                atexit.register(self.cleanup)
+                self._registered = True
+        return self._roots[tier]
+
+    def acquire(self, size=0):
+        """
+        Get an empty directory for a profile of about `size` bytes.
+
+        Returns:
+            str: Directory path; hand it back with release()
+        """
+        with self._lock:
+            tier = 'ram' if self.ram_bytes > 0 and size <= self.ram_bytes - self._ram_used else 'disk'
+            if tier == 'ram':
+                self._ram_used += size
+            if self._free[tier]:
+                path = self._free[tier].pop()
+            else:
+                path = tempfile.mkdtemp(dir=self._root(tier))
+            self._owner[path] = (tier, size)
+            return path
+
+    def release(self, path):
+        """Empty a directory from acquire() and keep it for the next profile."""
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+        with self._lock:
+            tier, size = self._owner.pop(path)
+            if tier == 'ram':
+                self._ram_used -= size
+            self._free[tier].append(path)
+
+    @contextmanager
+    def directory(self, size=0):
+        path = self.acquire(size)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def cleanup(self):
+        with self._lock:
+            for root in self._roots.values():
+                shutil.rmtree(root, ignore_errors=True)
+            self._roots.clear()
+            self._free = {'ram': [], 'disk': []}
+            self._owner.clear()
+            self._ram_used = 0
+
+WORKSPACE = TempWorkspace()
+
+def extract_and_analyze_history(files_dict, browser_type, profile_name, filters=None):
+    """
+    Extract a profile's history database and parse it.
+
+    Returns:
+        list: History entries
+    """
+    return extract_profile_artifacts(files_dict, browser_type, profile_name, ['history'], filters).get('history', [])
+
+def extract_profile_artifacts(files_dict, browser_type, profile_name, artifacts=None, filters=None, concurrent=True):
+    """
+    Copy every artifact file of a profile into a WORKSPACE directory, then run the
+    registered parsers against that copy.
+
+    Args:
+        files_dict: {'main': file, 'wal': file, 'extra': {relative_path: file}}
+        browser_type: Browser name (a BROWSER_REGISTRY key)
+        profile_name: Name of the browser profile
+        artifacts: Artifact names to parse, or None for every registered artifact
+        filters: Optional history filters, passed to parsers that support them
+        concurrent: Run the parsers on their own thread pool; pass False when the
+            caller already runs profiles on a pool
+
+    Returns:
+        dict: {artifact_name: list of entries}
+    """
+    try:
+        with WORKSPACE.directory(estimate_profile_cost(files_dict)[1]) as temp_dir:
+            copy_profile_artifacts(files_dict, browser_type, temp_dir)
+            return parse_profile_artifacts(temp_dir, browser_type, profile_name, artifacts, filters, concurrent)
+    except Exception as e:
+        print(f"Error processing {browser_type} history: {str(e)}")
+        return {}
+
+@instrument_stage('extraction')
+def copy_profile_artifacts(files_dict, browser_type, temp_dir):
+    """
+    Copy a profile's history database, its WAL and every extra artifact file into temp_dir.
+
+    Returns:
+        int: Number of bytes copied
+    """
+    main_filename = get_history_filename(browser_type)
+
+    # files_dict['main'] can be either a pytsk3 file or a live path string
+    sources = {main_filename: files_dict['main']}
+    if 'wal' in files_dict:
+        sources[f"{main_filename}-wal"] = files_dict['wal']
+    elif isinstance(files_dict['main'], str) and os.path.exists(files_dict['main'] + "-wal"):
+        sources[f"{main_filename}-wal"] = files_dict['main'] + "-wal"
+    sources.update(files_dict.get('extra', {}))
+
+    # Live databases are snapshotted through the SQLite backup API, which already
+    # folds in their WAL; everything else (and anything locked) is copied as a file
+    snapshotted = set()
+    for name, source in sources.items():
+        if name.endswith('-wal'):
+            continue
+        dest_path = os.path.join(temp_dir, *name.split('/'))
+        if isinstance(source, str):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if snapshot_sqlite_database(source, dest_path):
+                snapshotted.add(name)
+                continue
+        copy_artifact_file(source, dest_path)
+
+    for name, source in sources.items():
+        if name.endswith('-wal') and name[:-len('-wal')] not in snapshotted:
+            copy_artifact_file(source, os.path.join(temp_dir, *name.split('/')))
+
+    copied = 0
+    for root, _, files in os.walk(temp_dir):
+        copied += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return copied
+
+def parse_profile_artifacts(temp_dir, browser_type, profile_name, artifacts=None, filters=None, concurrent=True):
+    """
+    Run the registered parsers against the copies in temp_dir, concurrently
+    unless concurrent is False (the caller already parses profiles in parallel,
+    and a pool per profile would multiply threads and SQLite connections).
+    Every parser reads its own copy from the workspace, never the image.
+
+    Returns:
+        dict: {artifact_name: list of entries}
+    """
+    results = {}
+    jobs = {}
+    for name in (artifacts or ARTIFACT_REGISTRY.keys()):
+        db_path = find_artifact_copy(temp_dir, name, browser_type)
+        if db_path:
+            jobs[name] = db_path
+
+    if not jobs:
+        return results
+
+    def run_parser(artifact, db_path):
+        # Timed on the worker thread so CPU time is attributed to the parse itself
+        with METRICS.stage('sqlite_parse') as counts:
+            if artifact['supports_filters']:
+                entries = artifact['parser'](db_path, browser_type, profile_name, filters)
+            else:
+                entries = artifact['parser'](db_path, browser_type, profile_name)
+            counts['rows'] += len(entries)
+            return entries
+
+    if not concurrent:
+        for name, db_path in jobs.items():
+            try:
+                results[name] = run_parser(ARTIFACT_REGISTRY[name], db_path)
+            except Exception as e:
+                print(f"Error parsing {browser_type} {name} from profile {profile_name}: {str(e)}")
+                results[name] = []
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        futures = {executor.submit(run_parser, ARTIFACT_REGISTRY[name], db_path): name for name, db_path in jobs.items()}
+        for future, name in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error parsing {browser_type} {name} from profile {profile_name}: {str(e)}")
+                results[name] = []
+
+    return results
+
+class HistoryRecord:
+    """
+    One history row, kept compact: __slots__ instead of a per-row dict, the raw
+    integer timestamp as stored by the browser, and interned browser/profile
+    strings shared by every row of a profile. Formatting happens at export time.
+
+    user and source record where the row came from (source is the image name,
+    'live_system', ...), so merged and deduplicated output stays traceable.
+    """
+    __slots__ = ('browser', 'profile', 'url', 'title', 'visit_time', 'user', 'source')
+
+    FIELDS = ['browser', 'profile', 'timestamp', 'url', 'title', 'user', 'source']
+
+    def __init__(self, browser, profile, url, title, visit_time, user=None, source=None):
+        self.browser = browser
+        self.profile = profile
+        self.url = url
+        self.title = title
+        self.visit_time = visit_time
+        self.user = user
+        self.source = source
+
+    @property
+    def timestamp(self):
+        """Visit time formatted as 'YYYY-MM-DD HH:MM:SS' (local time)."""
+        return format_browser_timestamp(self.visit_time, self.browser)
+
+    @property
+    def unix_micros(self):
+        """Visit time as microseconds since the Unix epoch, whatever the browser."""
+        if browser_family(self.browser) == 'chromium':
+            return self.visit_time - 11644473600000000
+        return self.visit_time
+
+    def as_row(self):
+        """Values in FIELDS order, for CSV export."""
+        return (self.browser, self.profile, self.timestamp, self.url, self.title, self.user, self.source)
+
+    def as_dict(self):
+        return dict(zip(self.FIELDS, self.as_row()))
+
+    def dedup_key(self):
+        """Compact 16-byte hash identifying this visit: (browser, user, profile, url, timestamp)."""
+        raw = f"{self.browser}\0{self.user}\0{self.profile}\0{self.url}\0{self.visit_time}"
+        return hashlib.blake2b(raw.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def __repr__(self):
+        return f"HistoryRecord({self.browser!r}, {self.profile!r}, {self.url!r}, {self.title!r}, {self.visit_time!r})"
+
+def tag_history_source(records, user, source):
+    """Stamp user and source onto freshly parsed records (interned, shared by all rows)."""
+    user = sys.intern(user) if user else None
+    source = sys.intern(source) if source else None
+    for record in records:
+        record.user = user
+        record.source = source
+    return records
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over 16-byte keys. Answers "definitely new" or
+    "maybe seen"; memory stays at the size chosen up front.
+    """
+    def __init__(self, expected_items, false_positive_rate=0.01):
+        expected_items = max(1, expected_items)
+        self.capacity = expected_items
+        self.num_bits = max(8, int(-expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: two 64-bit halves of the key give every probe position
+        h1 = int.from_bytes(key[:8], 'little')
+        h2 = int.from_bytes(key[8:16], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Add a key. Returns True if it may have been present already."""
+        present = True
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                present = False
+                self._bits[byte] |= 1 << bit
+        return present
+
+class SpillSet:
+    """
+    Exact set of 16-byte keys that keeps at most memory_keys in RAM and spills
+    the rest to an on-disk SQLite table. Each key carries a small integer value
+    (HistoryDeduplicator stores which source the kept row came from).
+    """
+    def __init__(self, memory_keys=1000000, spill_dir=None):
+        self.memory_keys = memory_keys
+        self._memory = {}
+        self._spill_dir = tempfile.mkdtemp(prefix='dedup_', dir=spill_dir)
+        self._conn = None
+
+    def _disk(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(os.path.join(self._spill_dir, 'keys.sqlite'))
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("CREATE TABLE keys (k BLOB PRIMARY KEY, v INTEGER) WITHOUT ROWID")
+        return self._conn
+
+    def get(self, key):
+        """Value stored with key, or None if the key isn't in the set."""
+        value = self._memory.get(key)
+        if value is not None or self._conn is None:
+            return value
+        row = self._conn.execute("SELECT v FROM keys WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def add(self, key, value=0):
+        self._memory.setdefault(key, value)
+        if len(self._memory) >= self.memory_keys:
+            conn = self._disk()
+            conn.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?)", self._memory.items())
+            conn.commit()
+            self._memory.clear()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+class HistoryDeduplicator:
+    """
+    Streaming dedup stage for history records coming from several sources
+    (live mode, WAL replay, carved data, several partitions).
+
+    A Bloom filter answers most lookups for new rows in memory; only "maybe seen"
+    keys are checked against the exact spill-to-disk set. Memory is fixed by
+    expected_items and memory_keys, not by the number of rows processed. Past
+    expected_items distinct visits the false-positive rate climbs and more
+    lookups fall through to the spill set, so size it for the run
+    (--dedup-expected-rows); crossing it is logged.
+
+    The first row of a visit is kept. A repeat from another source is dropped
+    too, but on_merge(record, kept_source) is called for it, so the sources the
+    kept row stands for can be recorded without holding any rows back.
+    """
+    DEFAULT_EXPECTED_ITEMS = 10000000
+
+    def __init__(self, expected_items=None, false_positive_rate=0.01, memory_keys=1000000, spill_dir=None,
+                 on_merge=None, logger=None):
+        self._bloom = BloomFilter(expected_items or self.DEFAULT_EXPECTED_ITEMS, false_positive_rate)
+        self._seen = SpillSet(memory_keys, spill_dir)
+        self._source_ids = {}
+        self._sources = []
+        self.on_merge = on_merge
+        self.logger = logger
+        self.total = 0
+        self.duplicates = 0
+        self.unique = 0
+
+    def _source_id(self, source):
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self._sources)
+            self._sources.append(source)
+        return source_id
+
+    def is_new(self, record):
+        """True the first time a visit is seen, False for every repeat."""
+        self.total += 1
+        key = record.dedup_key()
+        source_id = self._source_id(record.source)
+        if self._bloom.add(key):
+            kept = self._seen.get(key)
+            if kept is not None:
+                self.duplicates += 1
+                if kept != source_id and self.on_merge:
+                    self.on_merge(record, self._sources[kept])
+                return False
+        self._seen.add(key, source_id)
+        self.unique += 1
+        if self.unique == self._bloom.capacity + 1 and self.logger:
+            self.logger.warning(f"Dedup Bloom filter passed its design capacity of {self._bloom.capacity} rows; "
+                                f"lookups will increasingly hit the on-disk set (raise --dedup-expected-rows)")
+        return True
+
+    def filter(self, records):
+        """Yield only the first occurrence of each visit."""
+        for record in records:
+            if self.is_new(record):
+                yield record
+
+    def close(self):
+        self._seen.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class AhoCorasick:
+    """
+    Pure-Python Aho-Corasick automaton: finds every occurrence of any number of
+    literal patterns in one left-to-right pass over the text.
+
+    Transitions live in one dict keyed by (state << 21 | code point) rather than
+    a dict per node, which keeps large pattern sets (100k+) compact.
+    """
+    def __init__(self):
+        self._goto = {}
+        self._fail = [0]
+        self._out = [()]
+        self._built = False
+
+    def add(self, pattern, value):
+        """Add a literal pattern; value is reported when it matches."""
+        state = 0
+        for ch in pattern:
+            key = state << 21 | ord(ch)
+            nxt = self._goto.get(key)
+            if nxt is None:
+                nxt = len(self._fail)
+                self._goto[key] = nxt
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (value,)
+        self._built = False
+
+    def build(self):
+        """Compute failure links (breadth first) and merge outputs along them."""
+        children = {}
+        for key, nxt in self._goto.items():
+            children.setdefault(key >> 21, []).append((key & 0x1FFFFF, nxt))
+
+        queue = [nxt for _, nxt in children.get(0, [])]
+        for state in queue:
+            self._fail[state] = 0
+        for state in queue:  # The list grows while we walk it: a BFS
+            for code, nxt in children.get(state, []):
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and (fail << 21 | code) not in self._goto:
+                    fail = self._fail[fail]
+                target = self._goto.get(fail << 21 | code, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def search(self, text):
+        """Return the set of values whose patterns occur in text."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            code = ord(ch)
+            while True:
+                nxt = goto.get(state << 21 | code)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if out[state]:
+                found.update(out[state])
+        return found
+
+def required_literal(pattern, min_length=3):
+    """
+    Longest run of literal characters every match of the regex must contain
+    (taken from its top-level sequence), or None if there isn't one of min_length.
+    """
+    try:
+        from re import _parser as sre_parse
+    except ImportError:  # Python < 3.11
+        import sre_parse
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return None
+
+    best, run = "", ""
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            run += chr(arg)
+            continue
+        best, run = max(best, run, key=len), ""
+    best = max(best, run, key=len)
+    return best if len(best) >= min_length else None
+
+class IOCMatcher:
+    """
+    Checks every history URL against indicator lists while the profiles are parsed.
+
+    - domain: the host or any subdomain (suffix lookups in a set, one per host label)
+    - url: substring of the lower-cased URL (Aho-Corasick, one pass per URL)
+    - regex: only run when its required literal was seen in that same pass;
+      regexes without a usable literal run on every URL
+    """
+    FIELDS = HistoryRecord.FIELDS + ['ioc_type', 'indicator']
+
+    def __init__(self):
+        self.enabled = False
+        self._domains = set()
+        self._automaton = AhoCorasick()
+        self._substrings = 0
+        self._regexes = []
+        self._unfiltered_regexes = []
+        self._lock = threading.Lock()
+        self.logger = None
+        self.hits = []
+
+    def configure(self, indicator_files=None, logger=None):
+        """Load indicator files (one per line: 'domain:', 'url:' or 'regex:' prefix; bare lines are guessed)."""
+        for path in indicator_files or []:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        self.add_indicator(line)
+                    except ValueError as e:
+                        raise ValueError(f"{path}, line {line_number}: {e}") from e
+        self._automaton.build()
+        self.enabled = bool(self._domains or self._substrings or self._regexes or self._unfiltered_regexes)
+        self.logger = logger
+        if logger and self.enabled:
+            logger.info(f"Loaded IOCs: {len(self._domains)} domains, {self._substrings} URL substrings, "
+                        f"{len(self._regexes) + len(self._unfiltered_regexes)} regexes "
+                        f"({len(self._unfiltered_regexes)} without a literal prefilter)")
+
+    def add_indicator(self, line):
+        """Add one indicator line. Raises ValueError for a regex that doesn't compile."""
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return
+        kind, sep, value = line.partition(':')
+        if not sep or kind not in ('domain', 'url', 'regex'):
+            # Bare indicator: a domain if it looks like one, otherwise a URL substring
+            kind, value = ('domain' if '.' in line and not re.search(r'[/:?\s]', line) else 'url'), line
+        value = value.strip()
+        if kind == 'domain':
+            self._domains.add(value.lower().rstrip('.'))
+        elif kind == 'url':
+            self._automaton.add(value.lower(), ('url', value))
+            self._substrings += 1
+        else:
+            try:
+                compiled = re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid IOC regex {value!r}: {e}") from e
+            literal = required_literal(value)
+            if literal:
+                index = len(self._regexes)
+                self._regexes.append((value, compiled))
+                self._automaton.add(literal.lower(), ('literal', index))
+            else:
+                self._unfiltered_regexes.append((value, compiled))
+
+    def match(self, url):
+        """
+        Returns:
+            list: (ioc_type, indicator) pairs the URL matches
+        """
+        hits = []
+        if self._domains:
+            try:
+                host = urlsplit(url).hostname
+            except ValueError:
+                host = None
+            if host:
+                labels = host.split('.')
+                hits.extend(('domain', '.'.join(labels[i:])) for i in range(len(labels))
+                            if '.'.join(labels[i:]) in self._domains)
+
+        for kind, value in self._automaton.search(url.lower()):
+            if kind == 'url':
+                hits.append(('url', value))
+            else:
+                pattern, compiled = self._regexes[value]
+                if compiled.search(url):
+                    hits.append(('regex', pattern))
+        hits.extend(('regex', pattern) for pattern, compiled in self._unfiltered_regexes if compiled.search(url))
+        return hits
+
+    def check(self, record):
+        """Match one record and remember (and log) any hits right away."""
+        hits = self.match(record.url)
+        if hits:
+            with self._lock:
+                self.hits.extend((record, kind, indicator) for kind, indicator in hits)
+            if self.logger:
+                for kind, indicator in hits:
+                    self.logger.warning(f"[IOC] {kind} {indicator}: {record.url} ({record.browser} {record.profile})")
+        return hits
+
+IOCS = IOCMatcher()
+
+@instrument_stage('export')
+def export_ioc_hits(output_dir, selected_browser, image_name):
+    """
+    Write the IOC hits collected during parsing to [prefix]_ioc_hits.csv
+    (one row per record and indicator, duplicates dropped).
+
+    Returns:
+        str: Path of the CSV, or None if there were no hits
+    """
+    if not IOCS.hits:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    filename_prefix = export_prefix(image_name, selected_browser)
+
+    csv_path = os.path.join(output_dir, f'{filename_prefix}_ioc_hits.csv')
+    seen = set()
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(IOCMatcher.FIELDS)
+        for record, kind, indicator in IOCS.hits:
+            key = (record.dedup_key(), kind, indicator)
+            if key in seen:
+                continue
+            seen.add(key)
+            writer.writerow(record.as_row() + (kind, indicator))
+    print(f"Exported {len(seen)} IOC hits to: {csv_path}")
+    return csv_path
+
+def parse_history_db(db_path, browser_type, profile_name, filters=None):
+    """
+    Parse a local SQLite history database and return compact history records.
+    Shared by both image and live modes.
+
+    Args:
+        filters: Optional history filters, applied inside the SQL query
+
+    Returns:
+        list: HistoryRecord entries
+    """
+    history_entries = []
+
+    if browser_family(browser_type) == 'chromium':
+        results = extract_chromium_history(db_path, filters)
+    else:
+        results = extract_firefox_history(db_path, filters)
+
+    # Every record of this profile shares the same two string objects
+    browser_type = sys.intern(browser_type)
+    profile_name = sys.intern(profile_name)
+
+    echo = PROGRESS.echo_rows
+    if echo:
+        print(f"\n{browser_type} History from profile {profile_name}:")
+
+    ioc_check = IOCS.check if IOCS.enabled else None
+
+    for url, title, timestamp in results:
+        record = HistoryRecord(browser_type, profile_name, url, title, timestamp)
+        history_entries.append(record)
+        if ioc_check:
+            ioc_check(record)
+
+        if echo:
+            print(f"URL: {url}")
+            print(f"Title: {title}")
+            print(f"Profile: {profile_name}")
+            print(f"Visited: {record.timestamp}")
+            print("-" * 50)
+
+    PROGRESS.add_rows(len(history_entries))
+    return history_entries
+
+def parse_filter_time(value):
+    """Parse a --since/--until value ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM[:SS]', local time)."""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid date/time: {value} (expected YYYY-MM-DD [HH:MM[:SS]])")
+
+def parse_until_time(value):
+    """Parse an --until value like parse_filter_time; a bare date means the end of that day, so the whole day is kept."""
+    parsed = parse_filter_time(value)
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', value.strip()):
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+def build_history_filters(since=None, until=None, domains=None, url_regex=None):
+    """
+    Collect the history filters into one dict that gets pushed down into the SQL queries.
+
+    Returns:
+        dict or None: None when no filter is set
+    """
+    if since is None and until is None and not domains and not url_regex:
+        return None
+
+    if url_regex:
+        re.compile(url_regex)  # Fail early on a bad pattern, not inside SQLite
+
+    return {
+        'since': since,
+        'until': until,
+        'domains': {d.lower().strip('.') for d in domains} if domains else None,
+        'url_regex': url_regex,
+    }
+
+def to_browser_time(value, browser_type):
+    """Convert a datetime to the raw epoch a browser stores (WebKit or Unix microseconds)."""
+    # Whole seconds and microseconds separately: a float timestamp can't hold every microsecond exactly
+    seconds = int(value.replace(microsecond=0).timestamp())
+    if browser_family(browser_type) == 'chromium':
+        seconds += 11644473600
+    return seconds * 1000000 + value.microsecond
+
+def url_matches_domains(url, domains):
+    """True if the URL's host is one of the domains or a subdomain of one."""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return False
+    if not host:
+        return False
+    parts = host.split('.')
+    return any('.'.join(parts[i:]) in domains for i in range(len(parts)))
+
+def build_filter_clause(conn, filters, browser_type, time_column, url_column='url'):
+    """
+    Turn the history filters into extra WHERE conditions for a query.
+    Domain and regex checks are registered as SQLite functions so rows are
+    rejected inside SQLite before they are ever handed back to Python.
+
+    Returns:
+        tuple: (sql_fragment, params) where sql_fragment starts with ' AND' or is empty
+    """
+    if not filters:
+        return "", []
+
+    conditions = []
+    params = []
+
+    # Time range first: cheapest check, and can use the visit date index when there is one
+    if filters.get('since') is not None:
+        conditions.append(f"{time_column} >= ?")
+        params.append(to_browser_time(filters['since'], browser_type))
+    if filters.get('until') is not None:
+        conditions.append(f"{time_column} <= ?")
+        params.append(to_browser_time(filters['until'], browser_type))
+
+    if filters.get('domains'):
+        domains = filters['domains']
+        conn.create_function("url_in_domains", 1, lambda url: url is not None and url_matches_domains(url, domains), deterministic=True)
+        conditions.append(f"url_in_domains({url_column})")
+
+    if filters.get('url_regex'):
+        pattern = re.compile(filters['url_regex'])
+        conn.create_function("url_matches_regex", 1, lambda url: url is not None and pattern.search(url) is not None, deterministic=True)
+        conditions.append(f"url_matches_regex({url_column})")
+
+    return "".join(f" AND {condition}" for condition in conditions), params
+
+def extract_chromium_history(db_path, filters=None):
+    """
+    Extract URLs from Chromium-family history (Chrome, Edge, Brave, Opera, ...).
+
+    Args:
+        db_path: The path to the database file.
+        filters: Optional history filters from build_history_filters.
+
+    Returns:
+        list: A list of tuples containing URLs, titles, and last visit times.
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=10)  # Add timeout
+        conn.execute("PRAGMA journal_mode=WAL")  # Use Write-Ahead Log mode
+        cursor = conn.cursor()
+
+        filter_sql, params = build_filter_clause(conn, filters, 'Chrome', 'last_visit_time')
+        
+        query = f"""
+        SELECT url, title, last_visit_time 
+        FROM urls 
+        WHERE last_visit_time IS NOT NULL{filter_sql}
+        ORDER BY last_visit_time DESC
+        """
+        
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    except sqlite3.OperationalError as e:
         if "locked" in str(e):
             print(f"Database is locked: {e}")
         else:
             print(f"SQLite error: {e}")
         return []
 
-def extract_firefox_history(db_path):
+def extract_firefox_history(db_path, filters=None):
+    """
+    Extract URLs from Firefox history.
+
+    Args:
+        db_path: The path to the database file.
+        filters: Optional history filters from build_history_filters.
+
+    Returns:
+        list: A list of tuples containing URLs, titles, and last visit dates.
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=10)  # Add timeout
+        conn.execute("PRAGMA journal_mode=WAL")  # Use WAL mode
+        cursor = conn.cursor()
+
+        filter_sql, params = build_filter_clause(conn, filters, 'Firefox', 'last_visit_date')
+
+        query = f"""
+        SELECT url, title, last_visit_date
+        FROM moz_places 
+        WHERE last_visit_date IS NOT NULL{filter_sql}
+        ORDER BY last_visit_date DESC
+        """
+
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e):
+            print(f"Database is locked: {e}")
+        else:
+            print(f"SQLite error: {e}")
+        return []
+
+def format_browser_timestamp(timestamp, browser_type):
+    """Convert a raw browser timestamp (WebKit or Unix microseconds) to a readable string."""
+    try:
+        if browser_family(browser_type) == 'chromium':
+            value = datetime.fromtimestamp((timestamp / 1000000) - 11644473600)
+        else:
+            value = datetime.fromtimestamp(timestamp / 1000000)
+    except (OSError, ValueError, OverflowError, TypeError):
+        value = datetime(1970, 1, 1)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def run_artifact_query(db_path, query):
+    """
+    Run a read-only query against an extracted artifact database.
+    Missing tables or older schemas simply yield no rows.
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=10)
+        try:
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"SQLite error in {os.path.basename(db_path)}: {e}")
+        return []
+
+def parse_downloads(db_path, browser_type, profile_name):
+    """Parse downloads from Chromium History or Firefox places.sqlite."""
+    if browser_family(browser_type) == 'chromium':
+        query = """
+        SELECT d.target_path,
+               (SELECT c.url FROM downloads_url_chains c WHERE c.id = d.id
+                ORDER BY c.chain_index DESC LIMIT 1),
+               d.start_time, d.received_bytes, d.total_bytes
+        FROM downloads d
+        ORDER BY d.start_time DESC
+        """
+    else:
+        query = """
+        SELECT a.content, p.url, a.dateAdded, NULL, NULL
+        FROM moz_annos a
+        JOIN moz_anno_attributes n ON n.id = a.anno_attribute_id
+        JOIN moz_places p ON p.id = a.place_id
+        WHERE n.name = 'downloads/destinationFileURI'
+        ORDER BY a.dateAdded DESC
+        """
+
+    return [
+        {
+            'browser': browser_type,
+            'profile': profile_name,
+            'timestamp': format_browser_timestamp(start_time, browser_type),
+            'target_path': target_path,
+            'url': url,
+            'received_bytes': received,
+            'total_bytes': total,
+        }
+        for target_path, url, start_time, received, total in run_artifact_query(db_path, query)
+    ]
+
+def parse_keyword_searches(db_path, browser_type, profile_name):
+    """Parse search terms (Chromium keyword_search_terms, Firefox search bar form history)."""
+    if browser_family(browser_type) == 'chromium':
+        query = """
+        SELECT k.term, u.url, u.last_visit_time
+        FROM keyword_search_terms k
+        JOIN urls u ON u.id = k.url_id
+        ORDER BY u.last_visit_time DESC
+        """
+    else:
+        # Firefox keeps no results URL for search bar entries
+        query = """
+        SELECT value, '', lastUsed
+        FROM moz_formhistory
+        WHERE fieldname = 'searchbar-history'
+        ORDER BY lastUsed DESC
+        """
+
+    return [
+        {
+            'browser': browser_type,
+            'profile': profile_name,
+            'timestamp': format_browser_timestamp(timestamp, browser_type),
+            'term': term,
+            'url': url,
+        }
+        for term, url, timestamp in run_artifact_query(db_path, query)
+    ]
+
+def parse_bookmark_keywords(db_path, browser_type, profile_name):
+    """Parse Firefox bookmark keywords (moz_keywords): shortcuts typed in the address bar, not searches."""
+    query = """
+    SELECT k.keyword, p.url, p.last_visit_date
+    FROM moz_keywords k
+    JOIN moz_places p ON p.id = k.place_id
+    """
+    return [
+        {
+            'browser': browser_type,
+            'profile': profile_name,
+            'timestamp': format_browser_timestamp(timestamp, browser_type),
+            'keyword': keyword,
+            'url': url,
+        }
+        for keyword, url, timestamp in run_artifact_query(db_path, query)
+    ]
+
+def parse_bookmarks(db_path, browser_type, profile_name):
+    """Parse bookmarks from the Chromium Bookmarks JSON file or Firefox moz_bookmarks."""
+    if browser_family(browser_type) == 'chromium':
+        try:
+            with open(db_path, 'r', encoding='utf-8') as f:
+                roots = json.load(f).get('roots', {})
+        except (OSError, ValueError) as e:
+            print(f"Could not read Bookmarks file: {e}")
+            return []
+
+        rows = []
+        stack = [(root_name, node) for root_name, node in roots.items() if isinstance(node, dict)]
+        while stack:
+            folder, node = stack.pop()
+            if node.get('type') == 'url':
+                rows.append((node.get('name'), node.get('url'), int(node.get('date_added') or 0), folder))
+            for child in node.get('children', []):
+                stack.append((node.get('name') or folder, child))
+    else:
+        rows = run_artifact_query(db_path, """
+        SELECT b.title, p.url, b.dateAdded, parent.title
+        FROM moz_bookmarks b
+        JOIN moz_places p ON p.id = b.fk
+        LEFT JOIN moz_bookmarks parent ON parent.id = b.parent
+        WHERE b.type = 1
+        """)
+
+    return [
+        {
+            'browser': browser_type,
+            'profile': profile_name,
+            'timestamp': format_browser_timestamp(date_added, browser_type),
+            'folder': folder,
+            'url': url,
+            'title': title,
+        }
+        for title, url, date_added, folder in rows
+    ]
+
+def parse_favicons(db_path, browser_type, profile_name):
+    """Parse page-to-icon mappings from Chromium Favicons or Firefox favicons.sqlite."""
+    if browser_family(browser_type) == 'chromium':
+        query = """
+        SELECT m.page_url, f.url
+        FROM icon_mapping m
+        JOIN favicons f ON f.id = m.icon_id
+        """
+    else:
+        query = """
+        SELECT p.page_url, i.icon_url
+        FROM moz_pages_w_icons p
+        JOIN moz_icons_to_pages ip ON ip.page_id = p.id
+        JOIN moz_icons i ON i.id = ip.icon_id
+        """
+
+    return [
+        {'browser': browser_type, 'profile': profile_name, 'page_url': page_url, 'icon_url': icon_url}
+        for page_url, icon_url in run_artifact_query(db_path, query)
+    ]
+
+def parse_cookies(db_path, browser_type, profile_name):
+    """Parse cookie metadata only; cookie values are never read."""
+    if browser_family(browser_type) == 'chromium':
+        query = """
+        SELECT host_key, name, path, creation_utc, expires_utc, last_access_utc, is_secure, is_httponly
+        FROM cookies
+        """
+    else:
+        # Firefox stores expiry in seconds, everything else in microseconds
+        query = """
+        SELECT host, name, path, creationTime, expiry * 1000000, lastAccessed, isSecure, isHttpOnly
+        FROM moz_cookies
+        """
+
+    return [
+        {
+            'browser': browser_type,
+            'profile': profile_name,
+            'host': host,
+            'name': name,
+            'path': path,
+            'created': format_browser_timestamp(created, browser_type),
+            'expires': format_browser_timestamp(expires, browser_type),
+            'last_accessed': format_browser_timestamp(accessed, browser_type),
+            'secure': bool(secure),
+            'httponly': bool(httponly),
+        }
+        for host, name, path, created, expires, accessed, secure, httponly in run_artifact_query(db_path, query)
+    ]
+
+def parse_top_sites(db_path, browser_type, profile_name):
+    """Parse Chromium Top Sites, or the highest-frecency places for Firefox."""
+    if browser_family(browser_type) == 'chromium':
+        query = "SELECT url, title, url_rank FROM top_sites ORDER BY url_rank"
+    else:
+        query = """
+        SELECT url, title, frecency
+        FROM moz_places
+        WHERE frecency > 0
+        ORDER BY frecency DESC
+        LIMIT 50
+        """
+
+    return [
+        {'browser': browser_type, 'profile': profile_name, 'rank': rank, 'url': url, 'title': title}
+        for rank, (url, title, _) in enumerate(run_artifact_query(db_path, query), start=1)
+    ]
+
+# Artifact registry: one entry per artifact we can parse out of a profile.
+# 'files' maps browser family to candidate paths relative to the profile directory
+# (first match wins); 'fields' is the export column order.
+ARTIFACT_REGISTRY = {}
+
+def register_artifact(name, chromium_files, firefox_files, parser, fields, supports_filters=False):
+    """Register an artifact parser so every profile walk picks up its files."""
+    ARTIFACT_REGISTRY[name] = {
+        'files': {'chromium': list(chromium_files), 'firefox': list(firefox_files)},
+        'parser': parser,
+        'fields': fields,
+        'supports_filters': supports_filters,
+    }
+
+register_artifact('history', ['History'], ['places.sqlite'], parse_history_db,
+                  ['browser', 'profile', 'timestamp', 'url', 'title'], supports_filters=True)
+register_artifact('downloads', ['History'], ['places.sqlite'], parse_downloads,
+                  ['browser', 'profile', 'timestamp', 'target_path', 'url', 'received_bytes', 'total_bytes'])
+register_artifact('keyword_searches', ['History'], ['formhistory.sqlite'], parse_keyword_searches,
+                  ['browser', 'profile', 'timestamp', 'term', 'url'])
+register_artifact('bookmark_keywords', [], ['places.sqlite'], parse_bookmark_keywords,
+                  ['browser', 'profile', 'timestamp', 'keyword', 'url'])
+register_artifact('bookmarks', ['Bookmarks'], ['places.sqlite'], parse_bookmarks,
+                  ['browser', 'profile', 'timestamp', 'folder', 'url', 'title'])
+register_artifact('favicons', ['Favicons'], ['favicons.sqlite'], parse_favicons,
+                  ['browser', 'profile', 'page_url', 'icon_url'])
+register_artifact('cookies', ['Network/Cookies', 'Cookies'], ['cookies.sqlite'], parse_cookies,
+                  ['browser', 'profile', 'host', 'name', 'path', 'created', 'expires', 'last_accessed', 'secure', 'httponly'])
+register_artifact('top_sites', ['Top Sites'], ['places.sqlite'], parse_top_sites,
+                  ['browser', 'profile', 'rank', 'url', 'title'])
+
+def get_artifact_filenames(browser):
+    """Every relative path (plus SQLite -wal companions) any registered artifact may need."""
+    family = browser_family(browser)
+    names = set()
+    for artifact in ARTIFACT_REGISTRY.values():
+        for name in artifact['files'][family]:
+            names.add(name)
+            names.add(f"{name}-wal")
+    return names
+
+def find_artifact_copy(temp_dir, artifact_name, browser):
+    """Return the path of the extracted copy backing an artifact, or None if it wasn't found."""
+    family = browser_family(browser)
+    for name in ARTIFACT_REGISTRY[artifact_name]['files'][family]:
+        candidate = os.path.join(temp_dir, *name.split('/'))
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+class CountMinSketch:
+    """
+    Fixed-size frequency estimates for more keys than fit in memory: depth rows
+    of width counters, and the estimate is the smallest of the key's counters
+    (never an undercount).
+    """
+    def __init__(self, width=1 << 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i * 8:i * 8 + 8], 'little') % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Count key and return its new estimate."""
+        estimate = None
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+# Host of a URL without urlsplit's overhead (no userinfo, no port); used per export row
+_URL_HOST_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://(?:[^/?#@]*@)?(\[[^\]/?#]*\]|[^/?#:]*)')
+
+class HistoryAggregator:
+    """
+    Summary statistics computed while the export is being written, so triage
+    doesn't need a second read of the CSV: visits, first and last seen per
+    domain and per user, visits per hour of day, weekday and calendar day.
+
+    Domains are counted exactly up to max_domains distinct keys; after that new
+    domains go to a count-min sketch and only the top_k heaviest of them are
+    kept by name, so memory stays fixed however many domains show up.
+    """
+    def __init__(self, max_domains=100000, top_k=100):
+        self.max_domains = max_domains
+        self.top_k = top_k
+        self.rows = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.domains = {}            # domain -> [visits, first_seen, last_seen]
+        self.users = {}              # user -> [visits, first_seen, last_seen]
+        self.hours = [0] * 24
+        self.days = {}               # 'YYYY-MM-DD' -> visits
+        self.sketch = None
+        self.overflow_visits = 0
+        self.overflow_top = {}       # domain -> estimated visits, at most top_k entries
+        self._overflow_floor = 0     # Smallest estimate in overflow_top (may lag behind, never above)
+
+    @staticmethod
+    def _update(table, key, timestamp):
+        stats = table.get(key)
+        if stats is None:
+            table[key] = [1, timestamp, timestamp]
+        else:
+            stats[0] += 1
+            if timestamp < stats[1]:
+                stats[1] = timestamp
+            if timestamp > stats[2]:
+                stats[2] = timestamp
+
+    def add_row(self, row):
+        """Count one export row (HistoryRecord.as_row order), reusing its formatted timestamp."""
+        timestamp, url, user = row[2], row[3], row[5]
+        self.rows += 1
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+
+        if len(timestamp) >= 13:  # 'YYYY-MM-DD HH:MM:SS'
+            self.hours[int(timestamp[11:13])] += 1
+            day = timestamp[:10]
+            self.days[day] = self.days.get(day, 0) + 1
+
+        self._update(self.users, user or '', timestamp)
+
+        match = _URL_HOST_RE.match(url) if url else None
+        domain = match.group(1).lower() if match else ''
+        if domain in self.domains or len(self.domains) < self.max_domains:
+            self._update(self.domains, domain, timestamp)
+            return
+
+        # Too many distinct domains: estimate from here on
+        if self.sketch is None:
+            self.sketch = CountMinSketch()
+        self.overflow_visits += 1
+        estimate = self.sketch.add(domain)
+        if domain in self.overflow_top or len(self.overflow_top) < self.top_k:
+            self.overflow_top[domain] = estimate
+        elif estimate > self._overflow_floor:
+            del self.overflow_top[min(self.overflow_top, key=self.overflow_top.get)]
+            self.overflow_top[domain] = estimate
+            self._overflow_floor = min(self.overflow_top.values())
+
+    def summary(self, top_domains=1000):
+        """Summary as a JSON-serializable dict."""
+        weekdays = [0] * 7
+        for day, visits in self.days.items():
+            try:
+                weekdays[datetime.strptime(day, '%Y-%m-%d').weekday()] += visits
+            except ValueError:
+                continue
+
+        def table(stats, name, limit=None):
+            ordered = sorted(stats.items(), key=lambda item: (-item[1][0], item[0]))
+            return [{name: key, 'visits': v[0], 'first_seen': v[1], 'last_seen': v[2]}
+                    for key, v in ordered[:limit]]
+
+        return {
+            'rows': self.rows,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'distinct_domains': len(self.domains),
+            'domains_estimated': self.sketch is not None,
+            'top_domains': table(self.domains, 'domain', top_domains),
+            'estimated_overflow_domains': {
+                'visits': self.overflow_visits,
+                'top': [{'domain': d, 'estimated_visits': c}
+                        for d, c in sorted(self.overflow_top.items(), key=lambda item: -item[1])],
+            } if self.sketch is not None else None,
+            'users': table(self.users, 'user'),
+            'visits_by_hour': self.hours,
+            'visits_by_weekday': dict(zip(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'], weekdays)),
+            'visits_by_day': dict(sorted(self.days.items())),
+        }
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+def resolve_compression(choice, logger=None):
+    """
+    Pick the codec for --compress: 'auto' means zstd when the zstandard module
+    is installed and gzip otherwise. Returns None for uncompressed output.
+    """
+    if choice in (None, 'gzip'):
+        return choice
+    try:
+        zstandard.load()
+        return 'zstd'
+    except ImportError:
+        if choice == 'zstd' and logger:
+            logger.warning("zstandard is not installed (pip install zstandard); compressing with gzip")
+        return 'gzip'
+
+class ParallelCompressedWriter:
+    """
+    Text stream that compresses fixed-size blocks on a thread pool and writes them in order.
+
+    Every block becomes an independent gzip member or zstd frame; concatenated they
+    decompress as one stream (zcat, zstd -d, gzip.open). zlib and zstandard release
+    the GIL, so blocks compress in parallel. At most two blocks per thread are in
+    flight, so memory stays flat however large the export gets.
+    """
+    def __init__(self, path, codec='gzip', threads=None, block_size=1024 * 1024, level=None):
+        self.codec = codec
+        self.level = level if level is not None else (6 if codec == 'gzip' else 3)
+        self.block_size = block_size
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self._threads = threads or os.cpu_count() or 1
+        self._file = open(path, 'wb')
+        self._pool = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix='compress')
+        self._pending = collections.deque()
+        self._buffer = []
+        self._buffered = 0
+        self._local = threading.local()
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            # ZstdCompressor objects can't be shared between threads
+            compressor = getattr(self._local, 'compressor', None)
+            if compressor is None:
+                compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+            return compressor.compress(data)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+        return compressor.compress(data) + compressor.flush()
+
+    def _drain(self, keep):
+        while len(self._pending) > keep:
+            block = self._pending.popleft().result()
+            self._file.write(block)
+            self.compressed_bytes += len(block)
+
+    def _submit(self):
+        data = ''.join(self._buffer).encode('utf-8')
+        self._buffer = []
+        self._buffered = 0
+        self.raw_bytes += len(data)
+        self._pending.append(self._pool.submit(self._compress, data))
+        self._drain(2 * self._threads)
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.block_size:
+            self._submit()
+        return len(text)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit()
+            self._drain(0)
+        finally:
+            self._pool.shutdown()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def open_export(path, compression=None):
+    """Open an export file for writing text, through ParallelCompressedWriter when compressing."""
+    if compression:
+        with ParallelCompressedWriter(path, compression) as f:
+            yield f
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            yield f
+
+def open_export_for_reading(path):
+    """Open a CSV/JSONL export as text, whether it is plain, .gz or .zst."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    if path.endswith('.zst'):
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True, read_across_frames=True)
+        return io.TextIOWrapper(reader, newline='', encoding='utf-8')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+class HistoryExporter:
+    """
+    History export written while the rows are still being produced: each batch
+    handed to write() (normally one profile's history) goes straight to the CSV,
+    the JSON and the summary aggregator, so the full history is never held in
+    memory. Compressed exports are JSON Lines instead of a JSON array, which can
+    be streamed back without parsing the whole file.
+
+    With dedup, repeated visits are dropped on the way in (HistoryDeduplicator).
+    The kept row is already written when a repeat from another source arrives,
+    so those sources go to [prefix]_merged_sources.csv, one line per extra source
+    of a kept row. With timeline, the kept rows are also spilled to
+    [prefix]_timeline.runs (TimelineRuns) and merged into [prefix]_timeline.csv
+    on close.
+
+    Files are created on the first row; an exporter that never sees one writes nothing.
+    """
+    MERGED_FIELDS = ['browser', 'profile', 'timestamp', 'url', 'user', 'source', 'also_in']
+
+    def __init__(self, output_dir, selected_browser, image_name, summary=True, compression=None, dedup=False,
+                 spill_dir=None, timeline=False, logger=None, expected_rows=None):
+        self.output_dir = output_dir
+        self.selected_browser = selected_browser
+        self.image_name = image_name
+        self.compression = compression
+        self.logger = logger
+        prefix = export_prefix(image_name, selected_browser)
+        suffix = COMPRESSION_SUFFIXES.get(compression, '')
+        self.csv_path = os.path.join(output_dir, f'{prefix}.csv{suffix}')
+        self.json_path = os.path.join(output_dir, f'{prefix}.jsonl{suffix}' if compression else f'{prefix}.json')
+        self.summary_path = os.path.join(output_dir, f'{prefix}_summary.json') if summary else None
+        self.merged_path = os.path.join(output_dir, f'{prefix}_merged_sources.csv{suffix}')
+        self.runs_path = os.path.join(output_dir, f'{prefix}_timeline.runs') if timeline else None
+        self.aggregator = HistoryAggregator() if summary else None
+        self.dedup = HistoryDeduplicator(expected_rows, spill_dir=spill_dir, on_merge=self._write_merged,
+                                         logger=logger) if dedup else None
+        self.timeline = None
+        self.rows = 0
+        self.merged_rows = 0
+        self._files = None
+        self._csv = None
+        self._json = None
+        self._merged = None
+
+    def _open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._files = ExitStack()
+        self._csv = csv.writer(self._files.enter_context(open_export(self.csv_path, self.compression)))
+        self._csv.writerow(HistoryRecord.FIELDS)
+        self._json = self._files.enter_context(open_export(self.json_path, self.compression))
+        if self.runs_path:
+            self.timeline = TimelineRuns(self.runs_path)
+
+    def _write_merged(self, record, kept_source):
+        if self._merged is None:
+            self._merged = csv.writer(self._files.enter_context(open_export(self.merged_path, self.compression)))
+            self._merged.writerow(self.MERGED_FIELDS)
+        self._merged.writerow((record.browser, record.profile, record.timestamp, record.url, record.user,
+                               kept_source, record.source))
+        self.merged_rows += 1
+
+    def write(self, records):
+        """
+        Export a batch of HistoryRecords.
+
+        Returns:
+            int: Rows written (after dedup)
+        """
+        written = 0
+        with METRICS.stage('export') as counts:
+            if self.dedup:
+                records = self.dedup.filter(records)
+            for record in records:
+                if self._files is None:
+                    self._open()
+                row = record.as_row()
+                self._csv.writerow(row)
+                if self.aggregator:
+                    self.aggregator.add_row(row)
+                item = dict(zip(HistoryRecord.FIELDS, row))
+                if self.compression:
+                    self._json.write(json.dumps(item) + "\n")
+                else:
+                    # A JSON array one record at a time, same layout as json.dump(..., indent=4)
+                    self._json.write(",\n    " if self.rows else "[\n    ")
+                    self._json.write(json.dumps(item, indent=4).replace("\n", "\n    "))
+                if self.timeline is not None:
+                    self.timeline.append(record.unix_micros, row)
+                self.rows += 1
+                written += 1
+            counts['rows'] += written
+        return written
+
+    def close(self):
+        """Finish the files and write the summary."""
+        try:
+            if self._files is None:
+                return
+            with METRICS.stage('export'):
+                if not self.compression:
+                    self._json.write("\n]")
+                self._files.close()
+                print(f"\nExported CSV to: {self.csv_path}")
+                print(f"Exported JSON to: {self.json_path}")
+                if self.aggregator:
+                    with open(self.summary_path, 'w', encoding='utf-8') as f:
+                        json.dump(self.aggregator.summary(), f, indent=4)
+                    print(f"Exported summary to: {self.summary_path}")
+                if self._merged is not None:
+                    print(f"Exported {self.merged_rows} merged sources to: {self.merged_path}")
+            self._files = None
+            if self.timeline is not None:
+                export_timeline(self.timeline, self.output_dir, self.selected_browser, self.image_name,
+                                self.compression)
+        finally:
+            if self.timeline is not None:
+                self.timeline.close()
+                self.timeline = None
+            if self.dedup:
+                self.dedup.close()
+                if self.dedup.duplicates and self.logger:
+                    self.logger.info(f"Removed {self.dedup.duplicates} duplicate history rows out of {self.dedup.total}")
+                self.dedup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def export_history(history_data, output_dir, selected_browser, image_name, summary=True, compression=None):
+    """
+    Export browser history to CSV and JSON formats.
+
+    Args:
+        history_data: The collected HistoryRecord entries.
+        output_dir: The directory where exports will be saved.
+        summary: Also write [prefix]_summary.json, aggregated while the CSV is written
+        compression: 'gzip' or 'zstd' to write [prefix].csv.gz and [prefix].jsonl.gz
+            (or .zst) instead of the plain CSV and JSON array
+
+    Returns:
+        str: Path of the CSV export
+    """
+    with HistoryExporter(output_dir, selected_browser, image_name, summary, compression) as exporter:
+        exporter.write(history_data)
+    return exporter.csv_path
+
+class TimelineRuns:
+    """
+    Spill file behind the timeline export. Every profile query returns its rows
+    ORDER BY visit time DESC and the exporter sees the profiles one after another,
+    so appending the rows as they are exported leaves the file as a sequence of
+    newest-first runs; a new run starts wherever the visit time goes up. Each
+    record is stored as its visit time and its already rendered CSV line, so the
+    merge never rebuilds a HistoryRecord. Only the run bounds stay in memory.
+    """
+    RECORD = struct.Struct('>qI')
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._bounds = []
+        self._run_start = 0
+        self._offset = 0
+        self._previous = None
+        self.rows = 0
+
+    def append(self, key, row):
+        """Spill one row (as returned by HistoryRecord.as_row) with its visit time in unix microseconds."""
+        if self._previous is not None and key > self._previous:
+            self._bounds.append((self._run_start, self._offset))
+            self._run_start = self._offset
+        self._previous = key
+        self._writer.writerow(row)
+        line = self._buffer.getvalue().encode('utf-8', 'surrogatepass')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._file.write(self.RECORD.pack(key, len(line)))
+        self._file.write(line)
+        self._offset += self.RECORD.size + len(line)
+        self.rows += 1
+
+    def flush(self):
+        """Flush the spilled rows so the file can be mapped."""
+        self._file.flush()
+
+    @property
+    def runs(self):
+        """(start, end) byte ranges of the newest-first runs written so far."""
+        if self._offset > self._run_start:
+            return self._bounds + [(self._run_start, self._offset)]
+        return list(self._bounds)
+
+    def iter_run(self, mm, start, end):
+        """Yield (visit time, CSV line) pairs of one run from the mapped file."""
+        while start < end:
+            key, size = self.RECORD.unpack_from(mm, start)
+            start += self.RECORD.size
+            yield key, mm[start:start + size].decode('utf-8', 'surrogatepass')
+            start += size
+
+    def close(self):
+        """Close and remove the spill file."""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def merge_timeline(timeline_runs):
+    """
+    Yield the spilled history as one chronological timeline (newest first) across
+    all users, browsers, profiles and partitions: a heap-based k-way merge of the
+    per-profile runs in O(n log k) time, reading each run straight from the
+    memory-mapped spill file, so only one pending record per run is held (O(k)).
+
+    Yields:
+        tuple: (visit time in unix microseconds, CSV line)
+    """
+    import mmap
+    runs = timeline_runs.runs
+    timeline_runs.flush()
+    if not runs:
+        return
+    with open(timeline_runs.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from heapq.merge(*(timeline_runs.iter_run(mm, start, end) for start, end in runs),
+                               key=lambda item: item[0], reverse=True)
+
+@instrument_stage('export')
+def export_timeline(timeline_runs, output_dir, selected_browser, image_name, compression=None):
+    """
+    Export all history as a single time-ordered CSV ([prefix]_timeline.csv).
+
+    Args:
+        timeline_runs: The TimelineRuns the history was spilled to (HistoryExporter with timeline=True).
+        output_dir: The directory where exports will be saved.
+        compression: 'gzip' or 'zstd' to write [prefix]_timeline.csv.gz (or .zst)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    filename_prefix = export_prefix(image_name, selected_browser)
+
+    csv_path = os.path.join(output_dir, f'{filename_prefix}_timeline.csv{COMPRESSION_SUFFIXES.get(compression, "")}')
+    with open_export(csv_path, compression) as csvfile:
+        csv.writer(csvfile).writerow(HistoryRecord.FIELDS)
+        rows = 0
+        for _, line in merge_timeline(timeline_runs):
+            csvfile.write(line)
+            rows += 1
+    METRICS.add(rows=rows)
+    print(f"Exported timeline to: {csv_path}")
+
+@instrument_stage('export')
+def export_artifacts(artifact_results, output_dir, selected_browser, image_name):
+    """
+    Export the non-history artifacts (downloads, bookmarks, ...) to CSV and JSON, one pair per artifact.
+
+    Args:
+        artifact_results: {artifact_name: list of entries}
+        output_dir: The directory where exports will be saved.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    filename_prefix = export_prefix(image_name, selected_browser)
+
+    for name, entries in artifact_results.items():
+        if not entries or name == 'history':
+            continue
+
+        csv_path = os.path.join(output_dir, f'{filename_prefix}_{name}.csv')
+        with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=ARTIFACT_REGISTRY[name]['fields'])
+            writer.writeheader()
+            for entry in entries:
+                writer.writerow(entry)
+        METRICS.add(rows=len(entries))
+
+        json_path = os.path.join(output_dir, f'{filename_prefix}_{name}.json')
+        with open(json_path, 'w', encoding='utf-8') as jsonfile:
+            json.dump(entries, jsonfile, indent=4)
+        print(f"Exported {len(entries)} {name} entries to: {csv_path}")
+
+# Case-wide URL index: a directory of immutable, sorted segment files plus an
+# append-only manifest. Every segment is one header, fixed-size postings sorted
+# by key, then a JSON string table:
+#   header:  magic (8s), posting count (Q), string table offset (Q)
+#   posting: key (Q), image, user, profile, browser (4 x I, string table ids), timestamp (Q, YYYYMMDDHHMMSS)
+# A key is the 8-byte blake2b of a normalized URL ('u') or domain ('d'), stored
+# big-endian so postings can be binary-searched as raw bytes through mmap.
+URL_INDEX_MAGIC = b'BHXIDX2\0'
+URL_INDEX_HEADER = struct.Struct('>8sQQ')
+URL_INDEX_POSTING = struct.Struct('>QIIIIQ')
+URL_INDEX_STRING_OFFSET = struct.Struct('>Q')
+URL_INDEX_MANIFEST = 'manifest.jsonl'
+
+def normalize_index_url(url):
+    """Lower-case scheme and host and drop the fragment, so equivalent URLs share a key."""
+    try:
+        parts = urlsplit(url.strip())
+        return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+    except ValueError:
+        return url.strip()
+
+def index_domains(url):
+    """Host of the URL and its parent domains (at least two labels), without a leading 'www.'."""
+    try:
+        host = urlsplit(url.strip()).hostname
+    except ValueError:
+        return []
+    if not host:
+        return []
+    labels = host.rstrip('.').split('.')
+    if labels[0] == 'www' and len(labels) > 2:
+        labels = labels[1:]
+    return ['.'.join(labels[i:]) for i in range(max(1, len(labels) - 1))]
+
+def url_index_key(kind, value):
+    """64-bit key for a normalized URL (kind 'u') or domain (kind 'd')."""
+    digest = hashlib.blake2b(f"{kind}\0{value}".encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def read_url_index_manifest(index_dir):
+    """Return the manifest entries of an index directory, oldest first."""
+    path = os.path.join(index_dir, URL_INDEX_MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_url_index_segment(path, postings, strings):
+    """
+    Write sorted postings and their string table as one segment file (atomically).
+
+    Layout: header (magic, posting count, string table offset), the postings, then
+    the string table: the number of strings, the end offset of each, and the UTF-8
+    strings back to back, so a lookup decodes only the strings its postings use.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(URL_INDEX_HEADER.pack(URL_INDEX_MAGIC, 0, 0))
+        count = 0
+        for posting in postings:
+            f.write(URL_INDEX_POSTING.pack(*posting))
+            count += 1
+        strings_offset = f.tell()
+        encoded = [value.encode('utf-8', 'surrogatepass') for value in strings]
+        f.write(URL_INDEX_STRING_OFFSET.pack(len(encoded)))
+        end = 0
+        for value in encoded:
+            end += len(value)
+            f.write(URL_INDEX_STRING_OFFSET.pack(end))
+        for value in encoded:
+            f.write(value)
+        f.seek(0)
+        f.write(URL_INDEX_HEADER.pack(URL_INDEX_MAGIC, count, strings_offset))
+    os.replace(tmp_path, path)
+    return count
+
+def add_to_url_index(index_dir, csv_paths, logger):
+    """
+    Add history export CSVs to the case-wide URL index as one new segment.
+    CSVs already in the index (same path, size and mtime) are skipped.
+
+    Args:
+        index_dir (str): Index directory (created if missing)
+        csv_paths (list): History CSVs written by export_history (plain, .gz or .zst)
+        logger: Logging object
+
+    Returns:
+        int: Number of postings added
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    indexed = {(src['path'], src['size'], src['mtime'])
+               for entry in read_url_index_manifest(index_dir) for src in entry['sources']}
+
+    strings = []
+    string_ids = {}
+    def string_id(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    postings = []
+    sources = []
+    for csv_path in csv_paths:
+        csv_path = os.path.abspath(csv_path)
+        stat = os.stat(csv_path)
+        source = {'path': csv_path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if (source['path'], source['size'], source['mtime']) in indexed:
+            logger.info(f"Already indexed: {csv_path}")
+            continue
+
+        fallback_image = os.path.basename(csv_path).split('_browser_history')[0]
+        with open_export_for_reading(csv_path) as f:
+            for row in csv.DictReader(f):
+                url = row.get('url') or ''
+                if not url:
+                    continue
+                ids = (string_id(row.get('source') or fallback_image), string_id(row.get('user') or ''),
+                       string_id(row.get('profile') or ''), string_id(row.get('browser') or ''))
+                digits = re.sub(r'\D', '', row.get('timestamp') or '')
+                timestamp = int(digits) if len(digits) == 14 else 0
+                postings.append((url_index_key('u', normalize_index_url(url)),) + ids + (timestamp,))
+                for domain in index_domains(url):
+                    postings.append((url_index_key('d', domain),) + ids + (timestamp,))
+        sources.append(source)
+
+    if not postings:
+        return 0
+
+    postings.sort()
+    name = f"segment_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.getpid()}_{len(read_url_index_manifest(index_dir))}.bhx"
+    count = write_url_index_segment(os.path.join(index_dir, name), postings, strings)
+
+    # The segment is complete on disk before the manifest points at it
+    with open(os.path.join(index_dir, URL_INDEX_MANIFEST), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'segment': name, 'postings': count, 'sources': sources}) + "\n")
+    logger.info(f"Indexed {count} postings from {len(sources)} CSV file(s) into {index_dir}")
+    return count
+
+def iter_segment_postings(mm, start, end):
+    """Yield the postings of a mapped segment between two posting positions."""
+    size = URL_INDEX_POSTING.size
+    for pos in range(URL_INDEX_HEADER.size + start * size, URL_INDEX_HEADER.size + end * size, size):
+        yield URL_INDEX_POSTING.unpack_from(mm, pos)
+
+class UrlIndexSegment:
+    """One memory-mapped index segment: binary search over its postings, strings decoded on demand."""
+    def __init__(self, path):
+        import mmap
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, self.count, strings_offset = URL_INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic != URL_INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"Not a URL index segment, or one from an older version (rebuild the index): {path}")
+        self.num_strings, = URL_INDEX_STRING_OFFSET.unpack_from(self._mm, strings_offset)
+        self._offsets = strings_offset + URL_INDEX_STRING_OFFSET.size
+        self._blob = self._offsets + self.num_strings * URL_INDEX_STRING_OFFSET.size
+        self._strings = {}
+
+    def string(self, string_id):
+        value = self._strings.get(string_id)
+        if value is None:
+            size = URL_INDEX_STRING_OFFSET.size
+            start = URL_INDEX_STRING_OFFSET.unpack_from(self._mm, self._offsets + (string_id - 1) * size)[0] if string_id else 0
+            end, = URL_INDEX_STRING_OFFSET.unpack_from(self._mm, self._offsets + string_id * size)
+            value = self._mm[self._blob + start:self._blob + end].decode('utf-8', 'surrogatepass')
+            self._strings[string_id] = value
+        return value
+
+    def strings(self):
+        return [self.string(i) for i in range(self.num_strings)]
+
+    def postings(self):
+        return iter_segment_postings(self._mm, 0, self.count)
+
+    def find(self, key):
+        """Binary-search the postings for key."""
+        mm = self._mm
+        target = key.to_bytes(8, 'big')
+        size = URL_INDEX_POSTING.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = URL_INDEX_HEADER.size + mid * size
+            if mm[pos:pos + 8] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = lo
+        while end < self.count and mm[URL_INDEX_HEADER.size + end * size:URL_INDEX_HEADER.size + end * size + 8] == target:
+            end += 1
+        return list(iter_segment_postings(mm, lo, end))
+
+    def close(self):
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+class UrlIndexReader:
+    """All segments of an index, opened and mapped once for any number of lookups."""
+    def __init__(self, index_dir):
+        self.segments = []
+        try:
+            for entry in read_url_index_manifest(index_dir):
+                self.segments.append(UrlIndexSegment(os.path.join(index_dir, entry['segment'])))
+        except Exception:
+            self.close()
+            raise
+
+    def lookup(self, term):
+        """
+        Find every visit to a URL (term contains '://') or a domain and its subdomains
+        across all images in the index.
+
+        Returns:
+            list: {'image', 'user', 'profile', 'browser', 'timestamp'} dicts, newest first
+        """
+        if '://' in term:
+            key = url_index_key('u', normalize_index_url(term))
+        else:
+            key = url_index_key('d', term.strip().lower().rstrip('.').removeprefix('www.'))
+
+        results = []
+        for segment in self.segments:
+            for _, image, user, profile, browser, timestamp in segment.find(key):
+                ts = str(timestamp)
+                results.append({
+                    'image': segment.string(image), 'user': segment.string(user),
+                    'profile': segment.string(profile), 'browser': segment.string(browser),
+                    'timestamp': f"{ts[:4]}-{ts[4:6]}-{ts[6:8]} {ts[8:10]}:{ts[10:12]}:{ts[12:]}" if timestamp else '',
+                })
+        results.sort(key=lambda r: r['timestamp'], reverse=True)
+        return results
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def lookup_url_index(index_dir, term):
+    """One lookup (see UrlIndexReader.lookup); open a UrlIndexReader to run several."""
+    with UrlIndexReader(index_dir) as reader:
+        return reader.lookup(term)
+
+def remap_postings(postings, remap):
+    """Translate the string ids of a segment's postings into the merged string table."""
+    for key, image, user, profile, browser, timestamp in postings:
+        yield key, remap[image], remap[user], remap[profile], remap[browser], timestamp
+
+def compact_url_index(index_dir, logger):
+    """
+    Merge all segments of an index into one (k-way merge of the sorted segments),
+    so lookups open a single file however many images were added.
+    """
+    manifest = read_url_index_manifest(index_dir)
+    if len(manifest) < 2:
+        return
+
+    strings = []
+    string_ids = {}
+    streams = []
+    with UrlIndexReader(index_dir) as reader:
+        for segment in reader.segments:
+            remap = []
+            for value in segment.strings():
+                if value not in string_ids:
+                    string_ids[value] = len(strings)
+                    strings.append(value)
+                remap.append(string_ids[value])
+            streams.append(remap_postings(segment.postings(), remap))
+
+        name = f"segment_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.getpid()}_compacted.bhx"
+        count = write_url_index_segment(os.path.join(index_dir, name), heapq.merge(*streams, key=lambda posting: posting[0]), strings)
+
+    merged = {'segment': name, 'postings': count, 'sources': [src for entry in manifest for src in entry['sources']]}
+    manifest_path = os.path.join(index_dir, URL_INDEX_MANIFEST)
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+        f.write(json.dumps(merged) + "\n")
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    for entry in manifest:
+        os.remove(os.path.join(index_dir, entry['segment']))
+    logger.info(f"Compacted {len(manifest)} segments into {name} ({count} postings)")
+
+def run_url_index_command(args):
+    """Handle --index-add, --index-compact and --lookup, which work on the index alone."""
+    import logging
+    logger = logging.getLogger('url_index')
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler(sys.stdout))
+        logger.setLevel(logging.INFO)
+    if args.index_add:
+        add_to_url_index(args.index_dir, args.index_add, logger)
+    if args.index_compact:
+        compact_url_index(args.index_dir, logger)
+    if args.lookup:
+        with UrlIndexReader(args.index_dir) as reader:
+            for term in args.lookup:
+                start = time.perf_counter()
+                results = reader.lookup(term)
+                elapsed = (time.perf_counter() - start) * 1000
+                images = sorted({r['image'] for r in results})
+                print(f"\n{term}: {len(results)} visits on {len(images)} image(s) ({elapsed:.1f} ms)")
+                for r in results:
+                    print(f"  {r['timestamp']:<19}  {r['image']}  {r['user']}  {r['browser']}/{r['profile']}")
+
+def parse_browser_selection():
+    """
+    Prompt user to select which browser(s) to analyze.
+
+    Returns:
+        str: Selected browser (its BROWSER_REGISTRY name) or None for all browsers
+    """
+    print("\nSelect browser to analyze (or press Enter for all):")
+    browsers = list(BROWSER_REGISTRY)
+    for number, browser in enumerate(browsers, 1):
+        print(f"{number}. {browser}")
+    print(f"{len(browsers) + 1}. All browsers")
+
+    choice = input(f"\nEnter your choice (1-{len(browsers) + 1} or browser name): ").strip().lower()
+
+    browser_map = {'all': None, '': None, str(len(browsers) + 1): None}
+    for number, browser in enumerate(browsers, 1):
+        browser_map[str(number)] = browser
+        browser_map[browser.lower()] = browser
+
+    selected_browser = browser_map.get(choice)
+
+    if selected_browser is None and choice not in browser_map:
+        print("Invalid choice. Analyzing all browsers...")
+        selected_browser = None
+
+    return selected_browser
+
+def get_ewf_segments(base_path, base_name, logger):
+    """
+    Find all segments belonging to a specific EWF image.
+    
+    Args:
+        base_path: Directory containing the image
+        base_name: Base name of the image (e.g., 'Laptop1Final' from 'Laptop1Final.E01')
+        logger: Logger object
+    
+    Returns:
+        list: Ordered list of segment paths belonging to this image
+    """
+    segments = []
+    segment_num = 1
+    
+    while True:
+        found = None
+        # Look for next segment using exact naming
+        for ext in [f".E{segment_num:02d}", f".e{segment_num:02d}"]:
+            candidate = os.path.join(base_path, f"{base_name}{ext}")
+            if os.path.exists(candidate):
+                found = candidate
+                break
+        if found:
+            segments.append(found)
+            logger.info(f"Found segment: {os.path.basename(found)}")
+            segment_num += 1
+        else:
+            break
+    
+    return segments
+
+def get_raw_segments(base_path, base_name, logger):
+    """Find all segments of a segmented raw image (.001, .002, etc.)"""
+    segments = []
+    segment_num = 1
+    
+    while True:
+        candidate = os.path.join(base_path, f"{base_name}.{segment_num:03d}")
+        if os.path.exists(candidate):
+            segments.append(candidate)
+            logger.info(f"Found segment: {os.path.basename(candidate)}")
+            segment_num += 1
+        else:
+            break
+    
+    return segments
+
+def open_ewf_image(image_path, logger, compute_hash=True):
+    """
+    Open the EWF disk image and handle split files (E01, E02, etc.).
+
+    Args:
+        image_path (str): Path to any segment of the EWF image
+        logger: Logging object
+        compute_hash (bool): False skips the hash entirely (image_hash is None), e.g. so
+            main can bind its checkpoint first and hash with ewf_image_hash
+
+    Returns:
+        tuple: (ewf_handle, img_info, image_name, image_size, image_hash, filenames)
+    """
+    try:
+        image_path = os.path.normpath(image_path)
+        base_path = os.path.dirname(image_path)
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        
+        # Verify this is an E01 file
+        if not image_path.upper().endswith('.E01'):
+            logger.error("Must specify the .E01 file of the image series")
+            raise ValueError("Invalid file format - must be .E01")
+        
+        # Find all segments for this specific image
+        filenames = get_ewf_segments(base_path, base_name, logger)
+        
+        if not filenames:
+            logger.error(f"No valid EWF segments found for {base_name}")
+            raise ValueError("No valid segments found")
+        
+        # Report what we found
+        if len(filenames) > 1:
+            logger.info(f"Found {len(filenames)} segments for {base_name}")
+        else:
+            logger.info(f"Single segment image: {base_name}")
+        
+        # Open the image with all its segments
+        ewf_handle = pyewf.handle()
+        ewf_handle.open(filenames)
+
+        image_hash = ewf_image_hash(ewf_handle, filenames, logger) if compute_hash else None
+
+        ewf_handle.seek(0)  # Reset before wrapping
+        img_info = image_class('EwfImgInfo')(ewf_handle)
+        
+        # Get total image size
+        image_size = ewf_handle.get_media_size()
+        size_gb = image_size / (1024**3)
+        logger.info(f"Total image size: {image_size} bytes ({size_gb:.2f} GB)")
+        
+        return ewf_handle, img_info, base_name, image_size, image_hash, filenames
+        
+    except Exception as e:
+        logger.error(f"Failed to open EWF image: {str(e)}")
+        raise
+
+def ewf_image_hash(ewf_handle, filenames, logger, journal=None):
+    """
+    Session baseline hash of an EWF image: the embedded MD5/SHA1 if present,
+    else the checkpointed SHA-256, else a freshly computed SHA-256.
+    """
+    embedded_md5, embedded_sha1 = extract_ewf_hashes(filenames, logger)
+    if embedded_md5 or embedded_sha1:
+        return embedded_md5 or embedded_sha1
+    if journal and journal.get('image_hash'):
+        image_hash = journal.get('image_hash')
+        logger.info(f"Using SHA-256 baseline from checkpoint: {image_hash}")
+        return image_hash
+    logger.warning("No embedded hash found. Computing SHA-256 as session baseline.")
+    ewf_handle.seek(0)
+    image_hash = compute_hash_by_algorithm(ewf_handle, 'sha256', logger)
+    if journal:
+        journal.set('image_hash', image_hash)
+    return image_hash
+
+def raw_image_hash(segments, algorithm, logger, journal=None):
+    """Hash of a raw image, reused from the checkpoint when it was computed with the same algorithm."""
+    if journal and journal.get('image_hash') and journal.get('hash_algorithm') == algorithm:
+        image_hash = journal.get('image_hash')
+        logger.info(f"Using {algorithm.upper()} hash from checkpoint: {image_hash}")
+        return image_hash
+    image_hash = compute_hash_raw_segments(segments, algorithm, logger)
+    if journal:
+        journal.set('hash_algorithm', algorithm)
+        journal.set('image_hash', image_hash)
+    return image_hash
+
+def parse_hash_algorithm():
+    """Prompt user to select hash algorithm for raw image verification."""
+    print("\nSelect hash algorithm for integrity verification:")
+    print("1. MD5 (fastest, forensic standard)")
+    print("2. SHA-1 (forensic standard)")
+    print("3. SHA-256 (most secure)")
+
+    choice = input("\nEnter your choice (1-3, default: 1): ").strip()
+
+    algo_map = {
+        '1': 'md5',
+        'md5': 'md5',
+        '2': 'sha1',
+        'sha1': 'sha1',
+        '3': 'sha256',
+        'sha256': 'sha256',
+        '': 'md5',
+    }
+
+    algorithm = algo_map.get(choice.lower(), 'md5')
+    print(f"Using {algorithm.upper()} for hashing.")
+    return algorithm
+
+def compute_hash_raw_segments(segments, algorithm, logger):
+    """Compute hash across all segments of a raw image as if they were one file."""
+    logger.info(f"Computing {algorithm.upper()} hash across {len(segments)} segments...")
+    h = hashlib.new(algorithm)
+    chunk_size = 1024 * 1024
+    total_size = sum(os.path.getsize(s) for s in segments)
+    processed = 0
+
+    with METRICS.stage('hashing') as counts:
+        for segment in segments:
+            with open(segment, 'rb') as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    h.update(data)
+                    processed += len(data)
+                    PROGRESS.bar('HASHING', processed, total_size)
+        counts['bytes_read'] += processed
+
+    result = h.hexdigest()
+    print(f"\n[+] Computed {algorithm.upper()}: {result}")
+    return result
+
+def open_raw_image(image_path, algorithm, logger, compute_hash=True):
+    """
+    Open a raw DD image and hash it with algorithm. compute_hash=False skips
+    hashing (image_hash is None), e.g. so main can bind its checkpoint first
+    and hash with raw_image_hash.
+
+    Returns:
+        tuple: (img_info, base_name, image_size, image_hash, segments)
+    """
+    image_path = os.path.normpath(image_path)
+    base_path = os.path.dirname(image_path)
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+
+    # Check if this is a segmented raw image (.001, .002, ...)
+    segments = get_raw_segments(base_path, base_name, logger)
+    if segments:
+        logger.info(f"Found {len(segments)} raw segments for {base_name}")
+        img_info = image_class('RawSegmentImgInfo')(segments)
+    else:
+        logger.info(f"Single raw image: {base_name}")
+        img_info = pytsk3.Img_Info(image_path)
+        segments = [image_path]
+
+    image_size = img_info.get_size()
+    logger.info(f"Image size: {image_size} bytes ({image_size/(1024**3):.2f} GB)")
+
+    image_hash = raw_image_hash(segments, algorithm, logger) if compute_hash else None
+
+    return img_info, base_name, image_size, image_hash, segments
+
+def get_filesystem(img_info, image_size, logger, raw_segments=None, journal=None):
+    """
+    Get the filesystem information from the disk image. If offset is random, carves raw data until it hits another partition or end
+
+    Args:
+        img_info: Disk image information object
+        logger: Logging object
+        image_size: Size of image
+        raw_segments (list or None): Files backing a raw image, for the fast carve path
+        journal (CheckpointJournal or None): Reuse (and remember) the chosen partition offset
+
+    Returns:
+        tuple: fs_info or None if failed
+    """
+    # Resumed run: the partition was already chosen
+    if journal and journal.get('partition_offset') is not None:
+        offset = journal.get('partition_offset')
+        try:
+            with METRICS.stage('filesystem_walk'):
+                fs_info = pytsk3.FS_Info(img_info, offset=offset)
+            logger.info(f"Using partition offset from checkpoint: {offset}")
+            return fs_info
+        except Exception as e:
+            logger.warning(f"Checkpoint partition offset {offset} no longer opens ({e}); choose again.")
+
+    # Detect and select partition offset
+    offset, volume_info = get_partition_offset(img_info, logger)
+    if offset is None:
+        logger.info("User quit partition selection")
+        return None
+    
+    logger.info(f"Using partition offset: {offset}")
+    
+    try:
+        # Open filesystem (metadata reads count toward the filesystem walk)
+        with METRICS.stage('filesystem_walk'):
+            fs_info = pytsk3.FS_Info(img_info, offset=offset)
+        if journal:
+            journal.set('partition_offset', offset)
+        return fs_info
+    except Exception as e:
+        logger.error(f"Failed to open filesystem at offset {offset}: {str(e)}")
+        
+        # Peek 100 bytes to show the user
+        raw_data = img_info.read(offset, 100)
+        print(f"Raw data preview at {offset}")
+        hex_view = raw_data.hex(' ', 1).upper()
+        # Text view (The decoded English/readable parts)
+        text_view = "".join([chr(b) if 32 <= b <= 126 else "." for b in raw_data])
+        
+        print(f"HEX:  {hex_view[:50]}") 
+        print(f"TEXT: {text_view}")
+        print("------------------------------------------")
+
+        # Ask the user if they want to carve data
+        choice = input("\nUnrecognized filesystem. Carve from this offset to a file for analysis? (y/n, Default: 'n'): ")
+        
+        if choice.lower() == 'y':
+            # Calculate the 'Maximum' possible carve size
+            max_safe_size = calculate_carve_size(offset, image_size, volume_info, logger)
+            
+            print(f"\nMaximum suggested carve size: {max_safe_size} bytes ({max_safe_size // 1024**2} MB)")
+            user_size = input("How many bytes to carve? (Type 'all' or press Enter for maximum): ").strip().lower()
+            
+            # Determine the actual size to carve
+            if user_size == 'all' or user_size == '':
+                carve_size = max_safe_size
+            else:
+                try:
+                    carve_size = int(user_size)
+                    if carve_size > (image_size - offset):
+                        logger.warning("Requested size exceeds disk boundaries. Capping at disk end.")
+                        carve_size = image_size - offset
+                except ValueError:
+                    logger.error("Invalid number entered. Defaulting to maximum safe size.")
+                    carve_size = max_safe_size
+
+            output_name = f"carved_offset_{offset}.bin"
+            logger.info(f"Carving {carve_size} bytes starting at {offset}...")
+            run_carver(img_info, offset, carve_size, output_name, raw_segments)
+            
+        return None
+
+def calculate_carve_size(user_offset, total_image_size, volume_info, logger):
+    """
+    Calculate the maximum safe carve size based on partition boundaries.
+    
+    Args:
+        user_offset: The offset where carving starts
+        total_image_size: Total size of the disk image
+        volume_info: Volume information object containing partition data
+        logger: Logger object
+    
+    Returns:
+        int: Maximum safe carve size in bytes
+    """
+    # Default to carving everything until the end of the disk
+    end_point = total_image_size
+    
+    if volume_info:
+        # Create a sorted list of all partition starting offsets
+        # We use partition.start * 512 to get the byte address
+        all_starts = sorted([p.start * 512 for p in volume_info])
+
+        for p_start_bytes in all_starts:
+            # Find the first partition that starts AFTER our manual offset
+            if p_start_bytes > user_offset:
+                end_point = p_start_bytes
+                logger.info(f"Next partition detected at {end_point}. Limiting carve size.")
+                break
+                
+    return end_point - user_offset
+
+def run_carver(img_info, start_offset, carve_size, output_filename, raw_segments=None):
+    """
+    Carve raw data from disk image to a file.
+
+    Raw images are copied kernel-side straight from their segment files, keeping
+    their holes; EWF (or anything else) goes through img_info.read with the next
+    chunk read while the current one is written, and all-zero chunks become
+    sparse holes. Either way zero runs don't fill the output volume.
+    
+    Args:
+        img_info: Disk image information object
+        start_offset: Starting byte offset for carving
+        carve_size: Number of bytes to carve
+        output_filename: Output filename for carved data
+        raw_segments (list or None): Ordered files backing a raw image, to copy from directly
+    """
+    try:
+        with open(output_filename, "wb") as f_out:
+            bytes_carved = None
+            if raw_segments:
+                bytes_carved = carve_raw_segments(raw_segments, start_offset, carve_size, f_out)
+            if bytes_carved is None:
+                bytes_carved = carve_buffered(img_info, start_offset, carve_size, f_out)
+            # Holes at the end are not written, so set the final length explicitly
+            f_out.truncate(bytes_carved)
+
+        print(f"\n[+] Success! Data saved to: {output_filename}")
+    except Exception as e:
+        print(f"\n[!] Error during carving: {e}")
+
+def carve_buffered(img_info, start_offset, carve_size, f_out, chunk_size=4 * 1024 * 1024):
+    """
+    Copy carve_size bytes from img_info to f_out, reading the next chunk on a
+    second thread while the current one is written (libewf decompresses while
+    we write). All-zero chunks are skipped with a seek, leaving a sparse hole.
+
+    Returns:
+        int: Bytes carved (holes included)
+    """
+    zero_chunk = bytes(chunk_size)
+
+    def read_chunk(position):
+        return img_info.read(start_offset + position, min(chunk_size, carve_size - position))
+
+    bytes_carved = 0
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='carve-reader') as pool:
+        pending = pool.submit(read_chunk, 0) if carve_size > 0 else None
+        while pending is not None:
+            data = pending.result()
+            if not data:
+                break
+            next_position = bytes_carved + len(data)
+            pending = pool.submit(read_chunk, next_position) if next_position < carve_size else None
+
+            if data == (zero_chunk if len(data) == chunk_size else zero_chunk[:len(data)]):
+                f_out.seek(len(data), os.SEEK_CUR)
+            else:
+                f_out.write(data)
+            bytes_carved = next_position
+
+            PROGRESS.bar('CARVING', bytes_carved, carve_size, f" ({bytes_carved // 1024**2} MB)")
+    return bytes_carved
+
+def carve_raw_segments(segments, start_offset, carve_size, f_out, step=64 * 1024 * 1024):
     """
-    Extract URLs from Firefox history.
+    Copy carve_size bytes of a raw image straight from its segment files with
+    os.copy_file_range (or os.sendfile), so the data never passes through
+    Python. Holes in the segment files (SEEK_DATA/SEEK_HOLE) stay holes in the output.
 
-    Args:
-        db_path: The path to the database file.
+    Returns:
+        int: Bytes carved (holes included), or None if this platform can't copy kernel-side
+    """
+    if not hasattr(os, 'copy_file_range') and not hasattr(os, 'sendfile'):
+        return None
+
+    f_out.flush()
+    dst_fd = f_out.fileno()
+    bytes_carved = 0
+    segment_start = 0
+
+    for path in segments:
+        segment_size = os.path.getsize(path)
+        segment_end = segment_start + segment_size
+        position = start_offset + bytes_carved
+        if position >= segment_end:
+            segment_start = segment_end
+            continue
+
+        local_start = position - segment_start
+        local_end = min(segment_size, local_start + (carve_size - bytes_carved))
+        src_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            for data_start, data_end in iter_data_extents(src_fd, local_start, local_end):
+                offset = data_start
+                while offset < data_end:
+                    count = min(step, data_end - offset)
+                    copied = copy_file_range_fallback(src_fd, dst_fd, offset, bytes_carved + offset - local_start, count)
+                    if not copied:
+                        break
+                    offset += copied
+                    PROGRESS.bar('CARVING', bytes_carved + offset - local_start, carve_size,
+                                 f" ({(bytes_carved + offset - local_start) // 1024**2} MB)")
+        finally:
+            os.close(src_fd)
+
+        bytes_carved += local_end - local_start
+        segment_start = segment_end
+        if bytes_carved >= carve_size:
+            break
+
+    PROGRESS.bar('CARVING', bytes_carved, carve_size, f" ({bytes_carved // 1024**2} MB)")
+    return bytes_carved
+
+def iter_data_extents(fd, start, end):
+    """
+    Yield the (start, end) ranges of fd between start and end that hold data,
+    skipping holes. Yields the whole range where SEEK_DATA isn't supported.
+    """
+    if not hasattr(os, 'SEEK_DATA'):
+        yield start, end
+        return
+
+    position = start
+    while position < end:
+        try:
+            data_start = os.lseek(fd, position, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # Only a hole left
+                return
+            yield position, end  # Filesystem doesn't support it
+            return
+        if data_start >= end:
+            return
+        data_end = min(end, os.lseek(fd, data_start, os.SEEK_HOLE))
+        yield data_start, data_end
+        position = data_end
+
+# Kernel copy methods that failed once and shouldn't be tried again this run
+_CARVE_FALLBACKS = {}
+
+def copy_file_range_fallback(src_fd, dst_fd, src_offset, dst_offset, count):
+    """
+    Copy count bytes between file descriptors at explicit offsets, kernel-side
+    where possible: copy_file_range, then sendfile, then pread/pwrite.
 
     Returns:
-        list: A list of tuples containing URLs, titles, and last visit dates.
+        int: Bytes copied (0 at end of source)
     """
-    try:
-        conn = sqlite3.connect(db_path, timeout=10)  # Add timeout
-        conn.execute("PRAGMA journal_mode=WAL")  # Use WAL mode
-        cursor = conn.cursor()
+    if hasattr(os, 'copy_file_range') and not _CARVE_FALLBACKS.get('copy_file_range'):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, src_offset, dst_offset)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            _CARVE_FALLBACKS['copy_file_range'] = True
 
-        query = """
-        SELECT url, title, last_visit_date
-        FROM moz_places 
-        WHERE last_visit_date IS NOT NULL
-        ORDER BY last_visit_date DESC
+    if hasattr(os, 'sendfile') and not _CARVE_FALLBACKS.get('sendfile'):
+        try:
+            os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+            return os.sendfile(dst_fd, src_fd, src_offset, count)
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            _CARVE_FALLBACKS['sendfile'] = True
+
+    data = os.pread(src_fd, min(count, 1024 * 1024), src_offset)
+    if data:
+        os.pwrite(dst_fd, data, dst_offset)
+    return len(data)
+
+class CheckpointJournal:
+    """
+    Checkpoint of a long image run, so an interrupted extraction resumes instead
+    of starting over. Kept in one directory next to the exports:
+
+      journal.json       image fingerprint (segment paths, sizes, mtimes), the
+                         history filters, the completed image hash, browser
+                         choice, partition offset and the profiles already processed
+      history.csv        history rows of processed profiles, appended per profile
+      artifacts.jsonl    other artifacts of processed profiles, one line per profile
+
+    A profile is marked done only after its rows are on disk, and rows of
+    profiles not marked done are ignored on load, so a crash at any point
+    loses at most the profile that was in progress. hashlib objects can't be
+    serialized, so an interrupted hash is recomputed; a completed one is reused.
+    """
+    HISTORY_FIELDS = ['profile_key', 'browser', 'profile', 'url', 'title', 'visit_time', 'user', 'source']
+
+    def __init__(self, directory, logger, restart=False):
+        self.directory = directory
+        self.logger = logger
+        self._path = os.path.join(directory, 'journal.json')
+        self._lock = threading.Lock()
+        self.state = {}
+        if restart:
+            self.reset()
+        elif os.path.exists(self._path):
+            with open(self._path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            logger.info(f"Found checkpoint from {self.state.get('updated', 'an earlier run')} "
+                        f"({len(self.state.get('profiles_done', []))} profiles done)")
+
+    @staticmethod
+    def profile_key(user, browser, profile_name):
+        return f"{user}/{browser}/{profile_name}"
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self.state[key] = value
+            self._save()
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.state['updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+    def reset(self):
+        """Forget everything (different evidence, or --restart)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.state = {}
+
+    @staticmethod
+    def filter_fingerprint(filters):
+        """The history filters from build_history_filters in a JSON-comparable form."""
+        if not filters:
+            return None
+        return {
+            'since': filters['since'].isoformat() if filters['since'] else None,
+            'until': filters['until'].isoformat() if filters['until'] else None,
+            'domains': sorted(filters['domains']) if filters['domains'] else None,
+            'url_regex': filters['url_regex'],
+        }
+
+    def bind(self, segments, filters=None):
+        """
+        Tie the checkpoint to the image files and the history filters. If either
+        differs from what the checkpoint was written for, it is discarded: its
+        partial exports were filtered differently or come from other evidence.
         """
+        fingerprint = [[os.path.abspath(path), os.path.getsize(path), os.path.getmtime(path)] for path in segments]
+        filter_key = self.filter_fingerprint(filters)
+        if self.state and self.state.get('segments') != fingerprint:
+            self.logger.warning("Checkpoint belongs to different image files; starting over.")
+            self.reset()
+        elif self.state and self.state.get('filters') != filter_key:
+            self.logger.warning("Checkpoint was written with different history filters; starting over.")
+            self.reset()
+        with self._lock:
+            self.state['segments'] = fingerprint
+            self.state['filters'] = filter_key
+            self._save()
 
-        cursor.execute(query)
-        results = cursor.fetchall()
-        conn.close()
-        return results
-    except sqlite3.OperationalError as e:
-        if "locked" in str(e):
-            print(f"Database is locked: {e}")
-        else:
-            print(f"SQLite error: {e}")
-        return []
+    def is_done(self, user, browser, profile_name):
+        return self.profile_key(user, browser, profile_name) in self.state.get('profiles_done', [])
+
+    def record_profile(self, user, browser, profile_name, history_entries, artifacts):
+        """Append a finished profile's output to the partial exports, then mark it done."""
+        key = self.profile_key(user, browser, profile_name)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            history_path = os.path.join(self.directory, 'history.csv')
+            new_file = not os.path.exists(history_path)
+            with open(history_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.HISTORY_FIELDS)
+                for r in history_entries:
+                    writer.writerow((key, r.browser, r.profile, r.url, r.title, r.visit_time, r.user, r.source))
+                f.flush()
+                os.fsync(f.fileno())
+            if any(artifacts.values()):
+                with open(os.path.join(self.directory, 'artifacts.jsonl'), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'profile_key': key, 'artifacts': artifacts}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.state.setdefault('profiles_done', []).append(key)
+            self._save()
+
+    def load_partial(self):
+        """
+        Read back the output of the profiles already done.
+
+        Returns:
+            tuple: (history records, {artifact_name: entries})
+        """
+        done = set(self.state.get('profiles_done', []))
+        history = []
+        artifact_results = {}
+        history_path = os.path.join(self.directory, 'history.csv')
+        if done and os.path.exists(history_path):
+            with open(history_path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if row['profile_key'] not in done:
+                        continue
+                    history.append(HistoryRecord(sys.intern(row['browser']), sys.intern(row['profile']), row['url'],
+                                                 row['title'] or None, int(row['visit_time']),
+                                                 sys.intern(row['user']) if row['user'] else None,
+                                                 sys.intern(row['source']) if row['source'] else None))
+        artifacts_path = os.path.join(self.directory, 'artifacts.jsonl')
+        if done and os.path.exists(artifacts_path):
+            with open(artifacts_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from a crash
+                    if item['profile_key'] in done:
+                        for name, entries in item['artifacts'].items():
+                            artifact_results.setdefault(name, []).extend(entries)
+        return history, artifact_results
 
-def export_history(history_data, output_dir, selected_browser, image_name):
+    def finish(self):
+        """The run completed and the exports are written: the checkpoint is no longer needed."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def process_user_profiles(fs_info, selected_browser, logger, artifact_results=None, filters=None, source='image',
+                          journal=None, on_history=None, budget=None):
     """
-    Export browser history to CSV and JSON formats.
+    Process browser history for all user profiles.
 
     Args:
-        history_data: The collected browser history data.
-        output_dir: The directory where exports will be saved.
+        fs_info: Filesystem information object
+        selected_browser (str or None): Specific browser to analyze
+        logger: Logging object
+        artifact_results (dict or None): If given, filled with the other artifacts
+            (downloads, bookmarks, ...) as {artifact_name: entries}
+        filters (dict or None): History filters from build_history_filters
+        source (str): Label recorded on every row, normally the image name
+        journal (CheckpointJournal or None): Skip profiles it has done, record the rest
+        on_history (callable or None): Called with each profile's history records as soon
+            as they are parsed (e.g. HistoryExporter.write); they are then not collected
+        budget (ResourceBudget or None): Memory/temp-disk budget; profiles run one at a time
+            here, so a profile bigger than the whole budget parses its artifacts sequentially
+            instead of on a pool
+
+    Returns:
+        list: Collected browser history entries (empty with on_history)
     """
-    os.makedirs(output_dir, exist_ok=True) # Create the output directory
+    all_history = []
+    budget = budget or ResourceBudget()
     
-    filename_prefix = f"{image_name}_browser_history_{selected_browser}" if selected_browser else f"{image_name}_browser_history"
+    # Discover every profile first (a cheap metadata walk) so progress can show an ETA
+    logger.info("\nFound user profiles:")
+    jobs = []
+    for name in list_image_users(fs_info, logger):
+        try:
+            logger.info(f"Searching browser history for user: {name}")
             
-    # Export to CSV
-    csv_path = os.path.join(output_dir, f'{filename_prefix}.csv')
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['browser', 'profile', 'timestamp', 'url', 'title']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for entry in history_data:
-            writer.writerow(entry)
-    print(f"\nExported CSV to: {csv_path}")
+            # Find browser files for this user
+            found_files = find_browser_files(fs_info, name, logger, selected_browser)
+            for browser, profiles in found_files.items():
+                for profile_name, fs_file in profiles.items():
+                    if journal and journal.is_done(name, browser, profile_name):
+                        logger.info(f"Skipping {browser} profile {profile_name} of {name} (done in checkpoint)")
+                        continue
+                    jobs.append((name, browser, profile_name, fs_file))
+        except Exception as e:
+            logger.error(f"Error processing user {name}: {str(e)}")
+            continue
+
+    PROGRESS.reset(len(jobs))
     
-    # Export to JSON
-    json_path = os.path.join(output_dir, f'{filename_prefix}.json')
-    with open(json_path, 'w', encoding='utf-8') as jsonfile:
-        json.dump(history_data, jsonfile, indent=4)
-    print(f"Exported JSON to: {json_path}")
+    # Process found browser files
+    for name, browser, profile_name, fs_file in jobs:
+        try:
+            cost = estimate_profile_cost(fs_file)
+            concurrent = not budget.exceeds(*cost)
+            if not concurrent:
+                logger.warning(f"{browser} profile {profile_name} of {name} needs more than the memory/temp budget; "
+                               f"parsing its artifacts one at a time")
+            with budget.reserve(*cost):
+                results = extract_profile_artifacts(fs_file, browser, profile_name, filters=filters,
+                                                    concurrent=concurrent)
+            history_entries = tag_history_source(results.pop('history', []), name, source)
+            if journal:
+                journal.record_profile(name, browser, profile_name, history_entries, results)
+            if artifact_results is not None:
+                for artifact_name, entries in results.items():
+                    artifact_results.setdefault(artifact_name, []).extend(entries)
+        except Exception as e:
+            logger.error(f"Error processing {browser} history from profile {profile_name}: {str(e)}")
+            PROGRESS.profile_done()
+            continue
+        # Outside the try: an export that can't be written stops the run instead of skipping profiles
+        if history_entries:
+            logger.debug(f"Successfully processed {browser} history from profile {profile_name}")
+            if on_history:
+                on_history(history_entries)
+            else:
+                all_history.extend(history_entries)
+        PROGRESS.profile_done()
 
-def parse_browser_selection():
+    PROGRESS.finish()
+    return all_history
+
+def list_image_users(fs_info, logger):
     """
-    Prompt user to select which browser(s) to analyze.
+    List the user directories under Users in the image, skipping system accounts.
 
     Returns:
-        str: Selected browser or None for all browsers
+        list: Usernames
     """
-    print("\nSelect browser to analyze (or press Enter for all):")
-    print("1. Chrome")
-    print("2. Firefox")
-    print("3. Edge")
-    print("4. All browsers")
-    
-    choice = input("\nEnter your choice (1-4 or browser name): ").strip().lower()
-    
-    browser_map = {
-        '1': 'chrome',
-        'chrome': 'chrome',
-        '2': 'firefox',
-        'firefox': 'firefox',
-        '3': 'edge',
-        'edge': 'edge',
-        '4': None,
-        'all': None,
-        '': None
-    }
-    
-    selected_browser = browser_map.get(choice)
-    
-    if selected_browser is None and choice not in browser_map:
-        print("Invalid choice. Analyzing all browsers...")
-        selected_browser = None
-    
-    return selected_browser
+    users = []
+    try:
+        # Open Users directory
+        users_dir = fs_info.open_dir("Users")
+    except Exception as e:
+        logger.error(f"Failed to open Users directory: {str(e)}")
+        return users
 
-def get_ewf_segments(base_path, base_name, logger):
+    for entry in users_dir:
+        try:
+            # Decode username and filter out system directories
+            name = entry.info.name.name.decode('utf-8')
+            if name in [".", "..", "Default", "Default User", "All Users", "Public"]:
+                continue
+            if entry.info.meta is None:
+                continue
+            if entry.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR: # Check if pytsk3 recognizes it as a directory
+                users.append(name)
+        except Exception as e:
+            logger.error(f"Error reading user directory entry: {str(e)}")
+
+    return users
+
+def new_stage_stats():
+    return {'items': 0, 'bytes': 0, 'rows': 0, 'busy': 0.0}
+
+def log_pipeline_stats(stats, elapsed, logger):
+    """Log per-stage throughput so the slowest stage of the pipeline is obvious."""
+    logger.info(f"[PIPELINE] Finished in {elapsed:.2f}s")
+    for stage, values in stats.items():
+        busy = values['busy'] or 1e-9
+        logger.info(
+            f"[PIPELINE] {stage:<6} {values['items']} profiles, "
+            f"{values['bytes'] / 1024**2:.1f} MB ({values['bytes'] / 1024**2 / busy:.1f} MB/s), "
+            f"{values['rows']} rows ({values['rows'] / busy:.0f} rows/s), "
+            f"busy {values['busy']:.2f}s ({values['busy'] / (elapsed or 1e-9) * 100:.0f}%)"
+        )
+
+# Parsing a history database holds roughly this many bytes of Python objects
+# per byte of database (fetchall rows plus the HistoryRecords built from them)
+PARSE_MEMORY_FACTOR = 2
+
+def artifact_size(file):
+    """Size in bytes of an artifact: a pytsk3 file (info.meta.size) or a live path."""
+    if isinstance(file, str):
+        try:
+            return os.path.getsize(file)
+        except OSError:
+            return 0
+    meta = file.info.meta
+    return meta.size if meta is not None else 0
+
+def estimate_profile_cost(files_dict):
     """
-    Find all segments belonging to a specific EWF image.
-    
-    Args:
-        base_path: Directory containing the image
-        base_name: Base name of the image (e.g., 'Laptop1Final' from 'Laptop1Final.E01')
-        logger: Logger object
-    
+    Estimate what extracting and parsing one profile needs, before any of it is read.
+
     Returns:
-        list: Ordered list of segment paths belonging to this image
+        tuple: (memory_bytes, temp_disk_bytes)
     """
-    segments = []
-    segment_num = 1
-    
-    while True:
-        found = None
-        # Look for next segment using exact naming
-        for ext in [f".E{segment_num:02d}", f".e{segment_num:02d}"]:
-            candidate = os.path.join(base_path, f"{base_name}{ext}")
-            if os.path.exists(candidate):
-                found = candidate
-                break
-        if found:
-            segments.append(found)
-            logger.info(f"Found segment: {os.path.basename(found)}")
-            segment_num += 1
-        else:
-            break
-    
-    return segments
+    database = artifact_size(files_dict['main']) + (artifact_size(files_dict['wal']) if files_dict.get('wal') else 0)
+    extras = sum(artifact_size(file) for file in files_dict.get('extra', {}).values())
+    return database * PARSE_MEMORY_FACTOR + extras, database + extras
 
-def get_raw_segments(base_path, base_name, logger):
-    """Find all segments of a segmented raw image (.001, .002, etc.)"""
-    segments = []
-    segment_num = 1
-    
-    while True:
-        candidate = os.path.join(base_path, f"{base_name}.{segment_num:03d}")
-        if os.path.exists(candidate):
-            segments.append(candidate)
-            logger.info(f"Found segment: {os.path.basename(candidate)}")
-            segment_num += 1
-        else:
-            break
-    
-    return segments
+def parse_size(value):
+    """Parse a size such as '512M', '4G' or '1073741824' into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', value, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {value} (expected e.g. 512M, 4G)")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMGT'.index(unit.upper() or ' '))
+
+def get_available_memory():
+    """Physical memory currently available in bytes, or None if the platform can't tell us."""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        import ctypes
 
-def open_ewf_image(image_path, logger):
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+    except (AttributeError, OSError):
+        pass
+    return None
+
+class ResourceBudget:
     """
-    Open the EWF disk image and handle split files (E01, E02, etc.).
+    Admits per-profile jobs against a memory and temp-disk budget. Each job
+    states its cost up front (estimate_profile_cost) and waits until it fits
+    next to the jobs already running, so many small profiles run wide while
+    big ones run narrow. A job bigger than the whole budget still runs, alone.
+    A budget of None means unlimited.
+    """
+    def __init__(self, memory_bytes=None, disk_bytes=None):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._cond = threading.Condition()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._running = 0
+        self.peak_running = 0
+        self.waits = 0
+
+    @classmethod
+    def from_system(cls, memory_bytes=None, disk_bytes=None, temp_dir=None):
+        """Budget with defaults of half the available memory and half the free temp space."""
+        if memory_bytes is None:
+            available = get_available_memory()
+            memory_bytes = available // 2 if available else None
+        if disk_bytes is None:
+            try:
+                disk_bytes = shutil.disk_usage(temp_dir or tempfile.gettempdir()).free // 2
+            except OSError:
+                disk_bytes = None
+        return cls(memory_bytes, disk_bytes)
+
+    def exceeds(self, memory, disk):
+        """True if a job of this cost is bigger than the whole budget (it can only run alone)."""
+        return ((self.memory_bytes is not None and memory > self.memory_bytes)
+                or (self.disk_bytes is not None and disk > self.disk_bytes))
+
+    def _fits(self, memory, disk):
+        if self._running == 0:
+            return True
+        return ((self.memory_bytes is None or self._memory_used + memory <= self.memory_bytes)
+                and (self.disk_bytes is None or self._disk_used + disk <= self.disk_bytes))
+
+    def acquire(self, memory, disk):
+        """Block until a job of this cost fits, then account for it."""
+        with self._cond:
+            if not self._fits(memory, disk):
+                self.waits += 1
+                self._cond.wait_for(lambda: self._fits(memory, disk))
+            self._memory_used += memory
+            self._disk_used += disk
+            self._running += 1
+            self.peak_running = max(self.peak_running, self._running)
+
+    def release(self, memory, disk):
+        with self._cond:
+            self._memory_used -= memory
+            self._disk_used -= disk
+            self._running -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, memory, disk):
+        self.acquire(memory, disk)
+        try:
+            yield
+        finally:
+            self.release(memory, disk)
+
+def process_user_profiles_pipelined(fs_info, selected_browser, logger, artifact_results=None, filters=None,
+                                    source='image', parser_workers=None, queue_size=4, journal=None, budget=None,
+                                    on_history=None):
+    """
+    Same result as process_user_profiles, but image reads, SQLite parsing and
+    writing the output overlap in a staged asyncio pipeline:
+
+      reader (1 thread, owns the pytsk3 handles) -> parse_queue -> parser workers
+      -> export_queue -> writer (1 thread: checkpoint, on_history)
+
+    The queues are bounded, so at most queue_size profiles wait between stages
+    and temp space/memory stay bounded however many profiles the image holds.
+    With on_history (e.g. HistoryExporter.write) the writer stage exports each
+    profile's rows as they arrive; without it they are collected and returned.
 
     Args:
-        image_path (str): Path to any segment of the EWF image
-        logger: Logging object
+        parser_workers (int or None): Number of concurrent parser workers (default: CPU count)
+        queue_size (int): Capacity of each inter-stage queue
+        journal (CheckpointJournal or None): Skip profiles it has done, record the rest
+        budget (ResourceBudget or None): Admit each profile (copy + parse) only when
+            its size fits the memory/temp-disk budget
+        on_history (callable or None): Called in the writer stage with each profile's history records
 
     Returns:
-        tuple: (ewf_handle, img_info, image_name, image_size, image_hash, filenames)
+        list: Collected browser history entries (empty with on_history)
     """
-    try:
-        image_path = os.path.normpath(image_path)
-        base_path = os.path.dirname(image_path)
-        base_name = os.path.splitext(os.path.basename(image_path))[0]
-        
-        # Verify this is an E01 file
-        if not image_path.upper().endswith('.E01'):
-            logger.error("Must specify the .E01 file of the image series")
-            raise ValueError("Invalid file format - must be .E01")
-        
-        # Find all segments for this specific image
-        filenames = get_ewf_segments(base_path, base_name, logger)
-        
-        if not filenames:
-            logger.error(f"No valid EWF segments found for {base_name}")
-            raise ValueError("No valid segments found")
-        
-        # Report what we found
-        if len(filenames) > 1:
-            logger.info(f"Found {len(filenames)} segments for {base_name}")
-        else:
-            logger.info(f"Single segment image: {base_name}")
-        
-        # Open the image with all its segments
-        ewf_handle = pyewf.handle()
-        ewf_handle.open(filenames)
+    import asyncio
+    return asyncio.run(_run_profile_pipeline(
+        fs_info, selected_browser, logger, artifact_results, filters, source,
+        parser_workers or os.cpu_count() or 1, queue_size, journal, budget or ResourceBudget(), on_history
+    ))
 
-        # Extract embedded hash from EWF binary sections
-        embedded_md5, embedded_sha1 = extract_ewf_hashes(filenames, logger)
-        if embedded_md5 or embedded_sha1:
-            image_hash = embedded_md5 or embedded_sha1
-        else:
-            logger.warning("No embedded hash found. Computing SHA-256 as session baseline.")
-            ewf_handle.seek(0)
-            image_hash = compute_hash_by_algorithm(ewf_handle, 'sha256', logger)
+async def _run_profile_pipeline(fs_info, selected_browser, logger, artifact_results, filters, source,
+                                parser_workers, queue_size, journal=None, budget=None, on_history=None):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    parse_queue = asyncio.Queue(maxsize=queue_size)
+    export_queue = asyncio.Queue(maxsize=queue_size)
+    stats = {'read': new_stage_stats(), 'parse': new_stage_stats(), 'export': new_stage_stats()}
+    all_history = []
+    start = time.perf_counter()
 
-        ewf_handle.seek(0)  # Reset before wrapping
-        img_info = EwfImgInfo(ewf_handle)
-        
-        # Get total image size
-        image_size = ewf_handle.get_media_size()
-        size_gb = image_size / (1024**3)
-        logger.info(f"Total image size: {image_size} bytes ({size_gb:.2f} GB)")
-        
-        return ewf_handle, img_info, base_name, image_size, image_hash, filenames
-        
-    except Exception as e:
-        logger.error(f"Failed to open EWF image: {str(e)}")
-        raise
+    reader_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reader')  # Only thread touching pytsk3
+    parser_pool = ThreadPoolExecutor(max_workers=parser_workers, thread_name_prefix='parser')
+    writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+
+    async def timed(pool, stage, func, *args):
+        t0 = time.perf_counter()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        finally:
+            stats[stage]['busy'] += time.perf_counter() - t0
+
+    async def reader():
+        try:
+            logger.info("\nFound user profiles:")
+            users = await timed(reader_pool, 'read', list_image_users, fs_info, logger)
+            for name in users:
+                logger.info(f"Searching browser history for user: {name}")
+                found_files = await timed(reader_pool, 'read', find_browser_files, fs_info, name, logger, selected_browser)
+                if journal:
+                    found_files = {browser: {profile_name: files_dict for profile_name, files_dict in profiles.items()
+                                             if not journal.is_done(name, browser, profile_name)}
+                                   for browser, profiles in found_files.items()}
+                PROGRESS.add_profiles(sum(len(profiles) for profiles in found_files.values()))
+                for browser, profiles in found_files.items():
+                    for profile_name, files_dict in profiles.items():
+                        # Waits while the profiles in flight leave no room for this one
+                        cost = estimate_profile_cost(files_dict)
+                        await loop.run_in_executor(None, budget.acquire, *cost)
+                        temp_dir = WORKSPACE.acquire(cost[1])
+                        try:
+                            copied = await timed(reader_pool, 'read', copy_profile_artifacts, files_dict, browser, temp_dir)
+                        except Exception as e:
+                            logger.error(f"Error reading {browser} profile {profile_name}: {str(e)}")
+                            WORKSPACE.release(temp_dir)
+                            budget.release(*cost)
+                            continue
+                        stats['read']['items'] += 1
+                        stats['read']['bytes'] += copied
+                        # Blocks while the parsers are behind (backpressure)
+                        await parse_queue.put((name, browser, profile_name, temp_dir, copied, cost))
+        finally:
+            for _ in range(parser_workers):
+                await parse_queue.put(None)
+
+    async def parser():
+        try:
+            while True:
+                job = await parse_queue.get()
+                if job is None:
+                    break
+                name, browser, profile_name, temp_dir, copied, cost = job
+                try:
+                    results = await timed(parser_pool, 'parse', parse_profile_artifacts,
+                                          temp_dir, browser, profile_name, None, filters, False)
+                except Exception as e:
+                    logger.error(f"Error processing {browser} history from profile {profile_name}: {str(e)}")
+                    continue
+                finally:
+                    WORKSPACE.release(temp_dir)
+                    budget.release(*cost)
+                stats['parse']['items'] += 1
+                stats['parse']['bytes'] += copied
+                stats['parse']['rows'] += sum(len(entries) for entries in results.values())
+                await export_queue.put((name, browser, profile_name, results))
+        finally:
+            await export_queue.put(None)
+
+    def collect(name, browser, profile_name, results):
+        history_entries = tag_history_source(results.pop('history', []), name, source)
+        if journal:
+            journal.record_profile(name, browser, profile_name, history_entries, results)
+        if history_entries:
+            logger.debug(f"Successfully processed {browser} history from profile {profile_name}")
+            if on_history:
+                on_history(history_entries)
+            else:
+                all_history.extend(history_entries)
+        if artifact_results is not None:
+            for artifact_name, entries in results.items():
+                artifact_results.setdefault(artifact_name, []).extend(entries)
+        PROGRESS.profile_done()
+        return len(history_entries)
 
-def parse_hash_algorithm():
-    """Prompt user to select hash algorithm for raw image verification."""
-    print("\nSelect hash algorithm for integrity verification:")
-    print("1. MD5 (fastest, forensic standard)")
-    print("2. SHA-1 (forensic standard)")
-    print("3. SHA-256 (most secure)")
+    async def writer():
+        finished = 0
+        while finished < parser_workers:
+            item = await export_queue.get()
+            if item is None:
+                finished += 1
+                continue
+            rows = await timed(writer_pool, 'export', collect, *item)
+            stats['export']['items'] += 1
+            stats['export']['rows'] += rows
 
-    choice = input("\nEnter your choice (1-3, default: 1): ").strip()
+    PROGRESS.reset()
+    try:
+        await asyncio.gather(reader(), writer(), *(parser() for _ in range(parser_workers)))
+    finally:
+        for pool in (reader_pool, parser_pool, writer_pool):
+            pool.shutdown(wait=True)
+    PROGRESS.finish()
 
-    algo_map = {
-        '1': 'md5',
-        'md5': 'md5',
-        '2': 'sha1',
-        'sha1': 'sha1',
-        '3': 'sha256',
-        'sha256': 'sha256',
-        '': 'md5',
-    }
+    log_pipeline_stats(stats, time.perf_counter() - start, logger)
+    if budget.waits:
+        logger.info(f"Resource budget: {budget.waits} profiles waited for room, at most {budget.peak_running} in flight")
+    return all_history
 
-    algorithm = algo_map.get(choice.lower(), 'md5')
-    print(f"Using {algorithm.upper()} for hashing.")
-    return algorithm
+# Tables whose leaf pages are compared in diff mode, and how their rows are read back.
+# {family: {kind: (table, query)}}; each query selects (rowid, url, title, time) from
+# the compared table aliased as r.
+DIFF_TABLES = {
+    'chromium': {
+        'url': ('urls', "SELECT r.id, r.url, r.title, r.last_visit_time FROM urls r"),
+        'visit': ('visits', "SELECT r.id, u.url, u.title, r.visit_time FROM visits r JOIN urls u ON u.id = r.url"),
+    },
+    'firefox': {
+        'url': ('moz_places', "SELECT r.id, r.url, r.title, r.last_visit_date FROM moz_places r"),
+        'visit': ('moz_historyvisits', "SELECT r.id, u.url, u.title, r.visit_date FROM moz_historyvisits r "
+                                       "JOIN moz_places u ON u.id = r.place_id"),
+    },
+}
 
-def compute_hash_raw_segments(segments, algorithm, logger):
-    """Compute hash across all segments of a raw image as if they were one file."""
-    logger.info(f"Computing {algorithm.upper()} hash across {len(segments)} segments...")
-    h = hashlib.new(algorithm)
-    chunk_size = 1024 * 1024
-    total_size = sum(os.path.getsize(s) for s in segments)
-    processed = 0
+def artifact_fingerprint(file):
+    """MFT entry (meta.addr), size and timestamps of a file inside the image, or None if it's missing."""
+    if file is None or file.info.meta is None:
+        return None
+    meta = file.info.meta
+    return tuple(getattr(meta, field, None) for field in
+                 ('addr', 'size', 'mtime', 'mtime_nano', 'ctime', 'ctime_nano', 'crtime', 'crtime_nano'))
 
-    for segment in segments:
-        with open(segment, 'rb') as f:
-            while True:
-                data = f.read(chunk_size)
-                if not data:
-                    break
-                h.update(data)
-                processed += len(data)
-                print(f"\r[HASHING] {(processed/total_size)*100:.1f}% complete", end="")
+def sqlite_page_checksums(db_path, page_size):
+    """BLAKE2b digest of every page of a database file, in page order."""
+    checksums = []
+    with open(db_path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            checksums.append(hashlib.blake2b(page, digest_size=16).digest())
+    return checksums
 
-    result = h.hexdigest()
-    print(f"\n[+] Computed {algorithm.upper()}: {result}")
-    return result
+def read_sqlite_page_size(db_path):
+    with open(db_path, 'rb') as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(b'SQLite format 3\x00'):
+        return None
+    page_size = struct.unpack_from('>H', header, 16)[0]
+    return 65536 if page_size == 1 else page_size
+
+def _read_varint(buf, pos):
+    """SQLite varint at pos. Returns (value, next_pos)."""
+    value = 0
+    for i in range(8):
+        byte = buf[pos + i]
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos + i + 1
+    return (value << 8) | buf[pos + 8], pos + 9
 
-def open_raw_image(image_path, algorithm, logger):
+def sqlite_table_leaves(f, page_size, root_page):
     """
-    Open a raw DD image.
+    Leaf page numbers of a table b-tree, found by walking its interior pages only.
 
     Returns:
-        tuple: (img_info, base_name, image_size, image_hash, segments)
+        set: Page numbers of the table's leaf pages
     """
-    image_path = os.path.normpath(image_path)
-    base_path = os.path.dirname(image_path)
-    base_name = os.path.splitext(os.path.basename(image_path))[0]
-
-    # Check if this is a segmented raw image (.001, .002, ...)
-    segments = get_raw_segments(base_path, base_name, logger)
-    if segments:
-        logger.info(f"Found {len(segments)} raw segments for {base_name}")
-        img_info = RawSegmentImgInfo(segments)
-    else:
-        logger.info(f"Single raw image: {base_name}")
-        img_info = pytsk3.Img_Info(image_path)
-        segments = [image_path]
-
-    image_size = img_info.get_size()
-    logger.info(f"Image size: {image_size} bytes ({image_size/(1024**3):.2f} GB)")
+    leaves = set()
+    stack = [root_page]
+    seen = set()
+    while stack:
+        page_number = stack.pop()
+        if page_number in seen or page_number < 1:
+            continue
+        seen.add(page_number)
+        f.seek((page_number - 1) * page_size)
+        page = f.read(page_size)
+        header = 100 if page_number == 1 else 0
+        if len(page) <= header:
+            continue
+        if page[header] == 0x0D:
+            leaves.add(page_number)
+        elif page[header] == 0x05:
+            cells = struct.unpack_from('>H', page, header + 3)[0]
+            stack.append(struct.unpack_from('>I', page, header + 8)[0])
+            for i in range(cells):
+                pointer = struct.unpack_from('>H', page, header + 12 + 2 * i)[0]
+                stack.append(struct.unpack_from('>I', page, pointer)[0])
+    return leaves
 
-    image_hash = compute_hash_raw_segments(segments, algorithm, logger)
+def sqlite_leaf_rowids(f, page_size, page_number):
+    """Rowids of the cells on one table leaf page."""
+    f.seek((page_number - 1) * page_size)
+    page = f.read(page_size)
+    header = 100 if page_number == 1 else 0
+    rowids = []
+    cells = struct.unpack_from('>H', page, header + 3)[0]
+    for i in range(cells):
+        pointer = struct.unpack_from('>H', page, header + 8 + 2 * i)[0]
+        _, pos = _read_varint(page, pointer)  # Payload size
+        rowid, _ = _read_varint(page, pos)
+        rowids.append(rowid - (1 << 64) if rowid >= 1 << 63 else rowid)
+    return rowids
 
-    return img_info, base_name, image_size, image_hash, segments
+def sqlite_table_roots(db_path, tables):
+    """{table: root page} from sqlite_schema, for the tables that exist."""
+    conn = sqlite3.connect(Path(db_path).as_uri() + "?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT name, rootpage FROM sqlite_master WHERE type = 'table'").fetchall()
+    finally:
+        conn.close()
+    return {name: root for name, root in rows if name in tables}
 
-def get_filesystem(img_info, image_size, logger):
+def changed_rowids(old_db, new_db, family):
     """
-    Get the filesystem information from the disk image. If offset is random, carves raw data until it hits another partition or end
+    Rowids of the url/visit rows that may differ between two copies of a history database.
 
-    Args:
-        img_info: Disk image information object
-        logger: Logging object
-        image_size: Size of image
-        volume_info: the volume we are in
+    Pages are compared by checksum; only table leaf pages that changed are parsed,
+    and the rowids on them (in either copy) are the candidates. A row that moved
+    to another page shows up on two changed pages and is filtered out later by
+    comparing its content. Returns None when the copies can't be compared page by
+    page (different page sizes), meaning every row is a candidate.
 
     Returns:
-        tuple: fs_info or None if failed
+        dict or None: {kind: set of rowids}
     """
-    # Detect and select partition offset
-    offset, volume_info = get_partition_offset(img_info, logger)
-    if offset is None:
-        logger.info("User quit partition selection")
+    page_size = read_sqlite_page_size(old_db)
+    if page_size is None or page_size != read_sqlite_page_size(new_db):
         return None
-    
-    logger.info(f"Using partition offset: {offset}")
-    
-    try:
-        # Open filesystem
-        fs_info = pytsk3.FS_Info(img_info, offset=offset)
-        return fs_info
-    except Exception as e:
-        logger.error(f"Failed to open filesystem at offset {offset}: {str(e)}")
-        
-        # Peek 100 bytes to show the user
-        raw_data = img_info.read(offset, 100)
-        print(f"Raw data preview at {offset}")
-        hex_view = raw_data.hex(' ', 1).upper()
-        # Text view (The decoded English/readable parts)
-        text_view = "".join([chr(b) if 32 <= b <= 126 else "." for b in raw_data])
-        
-        print(f"HEX:  {hex_view[:50]}") 
-        print(f"TEXT: {text_view}")
-        print("------------------------------------------")
 
-        # Ask the user if they want to carve data
-        choice = input("\nUnrecognized filesystem. Carve from this offset to a file for analysis? (y/n, Default: 'n'): ")
-        
-        if choice.lower() == 'y':
-            # Calculate the 'Maximum' possible carve size
-            max_safe_size = calculate_carve_size(offset, image_size, volume_info, logger)
-            
-            print(f"\nMaximum suggested carve size: {max_safe_size} bytes ({max_safe_size // 1024**2} MB)")
-            user_size = input("How many bytes to carve? (Type 'all' or press Enter for maximum): ").strip().lower()
-            
-            # Determine the actual size to carve
-            if user_size == 'all' or user_size == '':
-                carve_size = max_safe_size
-            else:
-                try:
-                    carve_size = int(user_size)
-                    if carve_size > (image_size - offset):
-                        logger.warning("Requested size exceeds disk boundaries. Capping at disk end.")
-                        carve_size = image_size - offset
-                except ValueError:
-                    logger.error("Invalid number entered. Defaulting to maximum safe size.")
-                    carve_size = max_safe_size
+    old_pages = sqlite_page_checksums(old_db, page_size)
+    new_pages = sqlite_page_checksums(new_db, page_size)
+    changed = {i + 1 for i in range(max(len(old_pages), len(new_pages)))
+               if i >= len(old_pages) or i >= len(new_pages) or old_pages[i] != new_pages[i]}
 
-            output_name = f"carved_offset_{offset}.bin"
-            logger.info(f"Carving {carve_size} bytes starting at {offset}...")
-            run_carver(img_info, offset, carve_size, output_name)
-            
-        return None
+    tables = {kind: table for kind, (table, _) in DIFF_TABLES[family].items()}
+    candidates = {kind: set() for kind in tables}
+    if not changed - {1}:
+        return candidates
 
-def calculate_carve_size(user_offset, total_image_size, volume_info, logger):
+    for db_path in (old_db, new_db):
+        roots = sqlite_table_roots(db_path, set(tables.values()))
+        with open(db_path, 'rb') as f:
+            for kind, table in tables.items():
+                if table not in roots:
+                    continue
+                for page_number in sqlite_table_leaves(f, page_size, roots[table]) & changed:
+                    candidates[kind].update(sqlite_leaf_rowids(f, page_size, page_number))
+    return candidates
+
+def query_diff_rows(db_path, family, kind, rowids=None):
     """
-    Calculate the maximum safe carve size based on partition boundaries.
-    
-    Args:
-        user_offset: The offset where carving starts
-        total_image_size: Total size of the disk image
-        volume_info: Volume information object containing partition data
-        logger: Logger object
-    
+    Read url or visit rows, all of them or only the given rowids.
+
     Returns:
-        int: Maximum safe carve size in bytes
+        dict: {rowid: (url, title, time)}
     """
-    # Default to carving everything until the end of the disk
-    end_point = total_image_size
-    
-    if volume_info:
-        # Create a sorted list of all partition starting offsets
-        # We use partition.start * 512 to get the byte address
-        all_starts = sorted([p.start * 512 for p in volume_info])
-
-        for p_start_bytes in all_starts:
-            # Find the first partition that starts AFTER our manual offset
-            if p_start_bytes > user_offset:
-                end_point = p_start_bytes
-                logger.info(f"Next partition detected at {end_point}. Limiting carve size.")
-                break
-                
-    return end_point - user_offset
+    _, query = DIFF_TABLES[family][kind]
+    conn = sqlite3.connect(db_path)
+    try:
+        if rowids is None:
+            rows = conn.execute(query).fetchall()
+        else:
+            conn.execute("CREATE TEMP TABLE wanted (id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT INTO wanted VALUES (?)", ((rowid,) for rowid in rowids))
+            rows = conn.execute(f"{query} WHERE r.id IN (SELECT id FROM temp.wanted)").fetchall()
+    except sqlite3.Error as e:
+        # An unreadable side would turn every row of the other side into a change
+        raise sqlite3.Error(f"Could not read {kind} rows from {db_path}: {e}") from e
+    finally:
+        conn.close()
+    return {rowid: (url, title or '', time or 0) for rowid, url, title, time in rows}
 
-def run_carver(img_info, start_offset, carve_size, output_filename):
+def copy_history_database(files_dict, browser, dest_dir):
     """
-    Carve raw data from disk image to a file.
-    
-    Args:
-        img_info: Disk image information object
-        start_offset: Starting byte offset for carving
-        carve_size: Number of bytes to carve
-        output_filename: Output filename for carved data
+    Copy a profile's history database (and its WAL) out of the image and fold
+    the WAL into it, so the copy's pages are the database as the browser saw it.
+
+    Returns:
+        str: Path of the copy
     """
-    chunk_size = 1024 * 1024  # 1MB buffer (bucket to move bytes to file, loading all eg:50GB would crash RAM)
-    bytes_carved = 0
-    
+    db_path = os.path.join(dest_dir, get_history_filename(browser))
+    copy_artifact_file(files_dict['main'], db_path)
+    if files_dict.get('wal') is not None:
+        copy_artifact_file(files_dict['wal'], f"{db_path}-wal")
+    conn = sqlite3.connect(db_path)
     try:
-        with open(output_filename, "wb") as f_out:
-            while bytes_carved < carve_size:
-                to_read = min(chunk_size, carve_size - bytes_carved) # 50.5 GB, then grab 1Mb until we have 50.5-49GB = 0.5GB, don't grab 1GB that's in the bucket, grab the min 0.5GB
-                data = img_info.read(start_offset + bytes_carved, to_read)
-                
-                if not data:
-                    break
-                
-                f_out.write(data)
-                bytes_carved += len(data)
-                
-                # Progress bar
-                percent = (bytes_carved / carve_size) * 100
-                print(f"\r[CARVING] {percent:.1f}% ({bytes_carved // 1024**2} MB)", end="")
-                
-        print(f"\n[+] Success! Data saved to: {output_filename}")
-    except Exception as e:
-        print(f"\n[!] Error during carving: {e}")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    return db_path
 
-def process_user_profiles(fs_info, selected_browser, logger):
+def diff_profile(old_files, new_files, browser, profile_name):
     """
-    Process browser history for all user profiles.
+    Compare one profile between two images.
+
+    Either side may be None (the profile only exists in one image); then all of
+    the other side's URLs and visits count as added or removed.
+
+    Both databases are copied out of the images (with their WAL folded in) and
+    every page is checksummed, so reading and hashing cost grows with the size
+    of the databases. Only the row queries and comparisons are limited to the
+    changed pages.
+
+    Returns:
+        list: (change, kind, HistoryRecord) tuples with change 'added' or 'removed'
+    """
+    family = browser_family(browser)
+    old_size = estimate_profile_cost(old_files)[1] if old_files else 0
+    new_size = estimate_profile_cost(new_files)[1] if new_files else 0
+    with WORKSPACE.directory(old_size) as old_dir, WORKSPACE.directory(new_size) as new_dir:
+        old_db = copy_history_database(old_files, browser, old_dir) if old_files else None
+        new_db = copy_history_database(new_files, browser, new_dir) if new_files else None
+        candidates = changed_rowids(old_db, new_db, family) if old_db and new_db else None
+
+        changes = []
+        for kind in DIFF_TABLES[family]:
+            rowids = None if candidates is None else candidates[kind]
+            if rowids is not None and not rowids:
+                continue
+            old_rows = query_diff_rows(old_db, family, kind, rowids) if old_db else {}
+            new_rows = query_diff_rows(new_db, family, kind, rowids) if new_db else {}
+            # URL rows also change when a page is revisited (title, last visit time), and a
+            # visit's title comes from its URL row: only the URL (and visit time) count
+            same = (lambda a, b: a[0] == b[0]) if kind == 'url' else (lambda a, b: (a[0], a[2]) == (b[0], b[2]))
+            for change, rows, other in (('removed', old_rows, new_rows), ('added', new_rows, old_rows)):
+                for rowid, (url, title, visit_time) in sorted(rows.items()):
+                    if rowid in other and same(rows[rowid], other[rowid]):
+                        continue
+                    changes.append((change, kind, HistoryRecord(browser, profile_name, url, title, visit_time)))
+    return changes
+
+def diff_images(old_fs, new_fs, selected_browser, logger, old_source='baseline', new_source='image'):
+    """
+    URLs and visits added or removed between two images of the same machine.
+
+    Profiles whose history database and WAL have the same MFT entry, size and
+    timestamps in both images are skipped without reading them. The others are
+    copied out of both images and checksummed page by page (I/O in proportion to
+    the database size); only the rows on changed pages are then queried and
+    compared, so the parsing follows the size of the change.
 
     Args:
-        fs_info: Filesystem information object
-        selected_browser (str or None): Specific browser to analyze
+        old_fs: Filesystem of the earlier image
+        new_fs: Filesystem of the later image
+        selected_browser (str or None): Specific browser to compare
         logger: Logging object
+        old_source, new_source: Labels recorded on removed/added rows
 
     Returns:
-        list: Collected browser history entries
+        list: (change, kind, HistoryRecord) tuples
     """
-    all_history = []
-    
-    try:
-        # Open Users directory
-        users_dir = fs_info.open_dir("Users")
-    except Exception as e:
-        logger.error(f"Failed to open Users directory: {str(e)}")
-        return all_history
-    
-    logger.info("\nFound user profiles:")
-    for entry in users_dir:
-        name = "unknown"  # Initialize name to handle errors
+    profiles = {}
+    for side, fs_info in (('old', old_fs), ('new', new_fs)):
+        for user in list_image_users(fs_info, logger):
+            try:
+                found_files = find_browser_files(fs_info, user, logger, selected_browser)
+            except Exception as e:
+                logger.error(f"Error processing user {user}: {str(e)}")
+                continue
+            for browser, browser_profiles in found_files.items():
+                for profile_name, files_dict in browser_profiles.items():
+                    profiles.setdefault((user, browser, profile_name), {})[side] = files_dict
+
+    changes = []
+    skipped = 0
+    PROGRESS.reset(len(profiles))
+    for (user, browser, profile_name), sides in sorted(profiles.items()):
+        old_files, new_files = sides.get('old'), sides.get('new')
+        if old_files and new_files and all(
+                artifact_fingerprint(old_files.get(name)) == artifact_fingerprint(new_files.get(name))
+                for name in ('main', 'wal')):
+            skipped += 1
+            PROGRESS.profile_done()
+            continue
         try:
-            # Decode username and filter out system directories
-            name = entry.info.name.name.decode('utf-8')
-            if name not in [".", "..", "Default", "Default User", "All Users", "Public"]:
-                if entry.info.meta is None:
-                    continue
-                if entry.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR: # Check if pytsk3 recognizes it as a directory
-                    logger.info(f"Searching browser history for user: {name}")
-                    
-                    # Find browser files for this user
-                    found_files = find_browser_files(fs_info, name, logger, selected_browser)
-                    
-                    # Process found browser files
-                    for browser, profiles in found_files.items():
-                        for profile_name, fs_file in profiles.items():
-                            try:
-                                history_entries = extract_and_analyze_history(fs_file, browser, profile_name)
-                                if history_entries:
-                                    logger.info(f"Successfully processed {browser} history from profile {profile_name}")
-                                    all_history.extend(history_entries)
-                            except Exception as e:
-                                logger.error(f"Error processing {browser} history from profile {profile_name}: {str(e)}")
+            profile_changes = diff_profile(old_files, new_files, browser, profile_name)
         except Exception as e:
-            logger.error(f"Error processing user {name}: {str(e)}")
+            logger.error(f"Error comparing {browser} profile {profile_name} of {user}: {str(e)}")
+            PROGRESS.profile_done()
             continue
-    
-    return all_history
+        for change, kind, record in profile_changes:
+            record.user = user
+            record.source = new_source if change == 'added' else old_source
+        if profile_changes:
+            logger.info(f"{browser} profile {profile_name} of {user}: {len(profile_changes)} changes")
+        changes.extend(profile_changes)
+        PROGRESS.profile_done()
+    PROGRESS.finish()
+    logger.info(f"Compared {len(profiles)} profiles, {skipped} unchanged by metadata, {len(changes)} changes")
+    return changes
+
+def open_baseline_filesystem(image_path, mode, logger):
+    """
+    Open the earlier image of a diff (same image type as the main one) down to
+    its filesystem. It isn't hashed: a full read of the baseline would cost more
+    than the diff itself.
+
+    Returns:
+        tuple: (fs_info or None, image_name, handle to close)
+    """
+    if mode == 'ewf':
+        handle, img_info, image_name, image_size, _, _ = open_ewf_image(image_path, logger, compute_hash=False)
+        raw_segments = None
+    else:
+        img_info, image_name, image_size, _, raw_segments = open_raw_image(image_path, None, logger,
+                                                                           compute_hash=False)
+        handle = img_info
+    return get_filesystem(img_info, image_size, logger, raw_segments), image_name, handle
+
+@instrument_stage('export')
+def export_history_diff(changes, output_dir, selected_browser, image_name, baseline_name, compression=None):
+    """
+    Export the output of diff_images to [prefix]_diff_[baseline].csv.
+
+    Returns:
+        str: Path of the CSV export
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    filename_prefix = export_prefix(image_name, selected_browser)
+
+    csv_path = os.path.join(output_dir, f'{filename_prefix}_diff_{baseline_name}.csv{COMPRESSION_SUFFIXES.get(compression, "")}')
+    with open_export(csv_path, compression) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['change', 'kind'] + HistoryRecord.FIELDS)
+        for change, kind, record in changes:
+            writer.writerow((change, kind) + record.as_row())
+    METRICS.add(rows=len(changes))
+    print(f"\nExported diff to: {csv_path}")
+    return csv_path
+
+def parse_arguments(argv=None):
+    """
+    Parse command line arguments. Anything not given here is asked for interactively.
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Extract browser history from disk images or a live system.")
+    parser.add_argument('image_path', nargs='?', help="Path to the .E01 file or raw image")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('-q', '--quiet', action='store_true', help="Only warnings and errors on the console, no progress")
+    output.add_argument('-v', '--verbose', action='count', default=0,
+                        help="Debug logging on the console; also print every history row")
+
+    filters = parser.add_argument_group('history filters (applied inside the SQL queries)')
+    filters.add_argument('--since', type=parse_filter_time, help="Only visits at or after this local time (YYYY-MM-DD [HH:MM[:SS]])")
+    filters.add_argument('--until', type=parse_until_time,
+                         help="Only visits at or before this local time (YYYY-MM-DD [HH:MM[:SS]]); a date alone includes that whole day")
+    filters.add_argument('--domain', action='append', dest='domains', metavar='DOMAIN',
+                         help="Only URLs on this domain or its subdomains (repeatable)")
+    filters.add_argument('--url-regex', help="Only URLs matching this regular expression")
+
+    performance = parser.add_argument_group('performance')
+    performance.add_argument('--pipeline', action='store_true',
+                             help="Overlap image reads, parsing and output in a staged pipeline (image modes)")
+    performance.add_argument('--parser-workers', type=int, default=None, metavar='N',
+                             help="Parser workers for --pipeline and live mode (default: CPU count)")
+    performance.add_argument('--memory-budget', type=parse_size, metavar='SIZE',
+                             help="Memory the profiles in flight may use, e.g. 8G (default: half the available RAM)")
+    performance.add_argument('--temp-budget', type=parse_size, metavar='SIZE',
+                             help="Temp disk the profiles in flight may use (default: half the free temp space)")
+
+    performance.add_argument('--ram-budget', type=parse_size, metavar='SIZE',
+                             help="Keep profile copies up to this total size on tmpfs (/dev/shm); 0 disables "
+                                  "(default: a quarter of the free tmpfs space)")
+    performance.add_argument('--scratch-dir', metavar='DIR',
+                             help="Where profile copies that don't fit in --ram-budget go (default: system temp)")
+
+    performance.add_argument('--profile-stage', action='append', choices=METRIC_STAGES, metavar='STAGE',
+                             help=f"Run a stage under cProfile, saved next to the metrics file (repeatable; one of: {', '.join(METRIC_STAGES)})")
+    performance.add_argument('--trace-memory-stage', action='append', choices=METRIC_STAGES, metavar='STAGE',
+                             help="Track Python allocations of a stage with tracemalloc (repeatable). The peak "
+                                  "is process-wide, so it includes concurrent stages; use --parser-workers 1 "
+                                  "for a per-stage figure")
+
+    performance.add_argument('--io-stats', action='store_true',
+                             help="Account every image read per stage (count, size histogram, seek distances)")
+    performance.add_argument('--io-trace', action='store_true',
+                             help="Also write every image read to [image]_io_trace.csv (implies --io-stats)")
+
+    checkpoint = parser.add_argument_group('checkpoint and resume (image modes)')
+    checkpoint.add_argument('--no-checkpoint', action='store_true',
+                            help="Don't keep a checkpoint journal; an interrupted run starts over")
+    checkpoint.add_argument('--restart', action='store_true',
+                            help="Discard an existing checkpoint for this image instead of resuming it")
+
+    dedup = parser.add_argument_group('deduplication')
+    dedup.add_argument('--no-dedup', action='store_true', help="Keep duplicate rows seen through several sources")
+    dedup.add_argument('--dedup-spill-dir', help="Directory for the on-disk dedup set (default: system temp)")
+    dedup.add_argument('--dedup-expected-rows', type=int, metavar='N',
+                       help="Distinct history rows the dedup Bloom filter is sized for; about 1.2 bytes of memory "
+                            f"per row (default: {HistoryDeduplicator.DEFAULT_EXPECTED_ITEMS})")
+
+    iocs = parser.add_argument_group('indicators of compromise')
+    iocs.add_argument('--ioc-file', action='append', metavar='PATH',
+                      help="Indicator list checked against every history URL while parsing (repeatable; "
+                           "one per line, prefixed 'domain:', 'url:' (substring) or 'regex:')")
+
+    exports = parser.add_argument_group('exports')
+    exports.add_argument('--timeline', action='store_true',
+                         help="Also write one chronological CSV merged across all users, browsers and profiles")
+    exports.add_argument('--no-summary', action='store_true',
+                         help="Skip the per-domain/user/hour summary written next to the history export")
+    exports.add_argument('--compress', nargs='?', const='auto', choices=['auto', 'gzip', 'zstd'],
+                         help="Write the history and timeline as compressed CSV/JSONL, compressed in parallel "
+                              "(auto: zstd if the zstandard module is installed, else gzip)")
+
+    diff = parser.add_argument_group('differential extraction (image modes)')
+    diff.add_argument('--diff-against', metavar='BASELINE_IMAGE',
+                      help="Only export URLs and visits added or removed since this earlier image of the same machine")
+
+    index = parser.add_argument_group('case-wide URL index')
+    index.add_argument('--index-dir', help="URL index directory; this run's history CSV is added to it after export")
+    index.add_argument('--index-add', nargs='+', metavar='CSV',
+                       help="Add existing history export CSVs to --index-dir and exit")
+    index.add_argument('--index-compact', action='store_true', help="Merge all index segments into one and exit")
+    index.add_argument('--lookup', action='append', metavar='URL_OR_DOMAIN',
+                       help="Which images visited this URL or domain (and subdomains), from --index-dir; repeatable")
+
+    args = parser.parse_args(argv)
+    if (args.index_add or args.index_compact or args.lookup) and not args.index_dir:
+        parser.error("--index-add, --index-compact and --lookup need --index-dir")
+    args.verbosity = 0 if args.quiet else min(1 + args.verbose, 2)
+    try:
+        args.filters = build_history_filters(args.since, args.until, args.domains, args.url_regex)
+    except re.error as e:
+        parser.error(f"Invalid --url-regex: {e}")
+    return args
 
 def main():
     """
     Main function to execute the script.
     Handles command line input for the E01 image path and orchestrates the workflow.
     """
+    args = parse_arguments()
+    if args.index_add or args.index_compact or args.lookup:
+        run_url_index_command(args)
+        return
+    filters = args.filters
+    METRICS.configure(args.profile_stage, args.trace_memory_stage)
+    PROGRESS.configure(args.verbosity)
+    WORKSPACE.configure(args.ram_budget, args.scratch_dir)
+
     # Mode selection
     mode = parse_input_mode()
 
     # Live system path
     if mode == 'live':
         image_name = 'live_system'
-        logger = setup_logging(image_name)
+        logger = setup_logging(image_name, args.verbosity)
         logger.info("Running in live system mode")
 
         try:
+            IOCS.configure(args.ioc_file, logger)
+            compression = resolve_compression(args.compress, logger)
             selected_browser = parse_browser_selection()
             output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_history_exports")
-            all_history = process_live_system(selected_browser, logger)
+            artifact_results = {}
+            budget = ResourceBudget.from_system(args.memory_budget, args.temp_budget)
+            with HistoryExporter(output_dir, selected_browser, image_name, not args.no_summary, compression,
+                                 not args.no_dedup, args.dedup_spill_dir, args.timeline, logger,
+                                 args.dedup_expected_rows) as exporter:
+                process_live_system(selected_browser, logger, artifact_results, filters,
+                                    parser_workers=args.parser_workers, budget=budget, on_history=exporter.write)
 
-            if all_history:
-                export_history(all_history, output_dir, selected_browser, image_name)
+            if exporter.rows:
+                if args.index_dir:
+                    add_to_url_index(args.index_dir, [exporter.csv_path], logger)
+                if IOCS.enabled:
+                    export_ioc_hits(output_dir, selected_browser, image_name)
                 logger.info("Successfully exported browser history")
             else:
                 logger.warning("No browser history found.")
+            export_artifacts(artifact_results, output_dir, selected_browser, image_name)
+            write_metrics_report(output_dir, selected_browser, image_name, logger)
         except Exception as e:
             logger.error(f"Critical error: {str(e)}")
             sys.exit(1)
@@ -1116,8 +4978,8 @@ def main():
 
     # Image path (EWF or RAW)
     try:
-        if len(sys.argv) > 1:
-            image_path = sys.argv[1]
+        if args.image_path:
+            image_path = args.image_path
         else:
             prompt = "Enter path to .E01 file: " if mode == 'ewf' else "Enter path to raw image (.dd/.raw/.img): "
             image_path = input(prompt).strip()
@@ -1132,8 +4994,10 @@ def main():
         image_name = re.sub(r'\.(dd|raw|img)$', '', image_name, flags=re.IGNORECASE)
         image_name = re.sub(r'\.\d{3}$', '', image_name)  # .001, .002, etc.
 
-        logger = setup_logging(image_name)
+        logger = setup_logging(image_name, args.verbosity)
         logger.info(f"Processing image: {image_path} (mode: {mode})")
+        IOCS.configure(args.ioc_file, logger)
+        compression = resolve_compression(args.compress, logger)
         
     except KeyboardInterrupt:
         print("\nProgram interrupted by user.")
@@ -1147,35 +5011,105 @@ def main():
     filenames = None
     raw_segments = None
     raw_img_info = None 
+    io_accounting = None
+    journal = None
     analysis_complete = False
 
     try:
-        selected_browser = parse_browser_selection()
         output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser_history_exports")
+        if not args.no_checkpoint and not args.diff_against:
+            journal = CheckpointJournal(os.path.join(output_dir, f"{image_name}_checkpoint"), logger, args.restart)
 
-        # Open image
+        # Open image; it is hashed once the checkpoint is known to belong to it
         if mode == 'ewf':
-            ewf_handle, img_info, image_name, total_image_size, initial_hash, filenames = open_ewf_image(image_path, logger)
+            ewf_handle, img_info, image_name, total_image_size, _, filenames = open_ewf_image(image_path, logger,
+                                                                                             compute_hash=False)
         else: #raw
-            hash_algorithm = parse_hash_algorithm()
-            img_info, image_name, total_image_size, initial_hash, raw_segments = open_raw_image(image_path, hash_algorithm, logger)
+            img_info, image_name, total_image_size, _, raw_segments = open_raw_image(image_path, None, logger,
+                                                                                     compute_hash=False)
             raw_img_info = img_info
+        if journal:
+            journal.bind(filenames if mode == 'ewf' else raw_segments, filters)
+
+        # A resumed run keeps the answers given last time
+        if journal and journal.get('profiles_done') is not None:
+            selected_browser = journal.get('selected_browser')
+            logger.info(f"Resuming with browser selection: {selected_browser or 'all'}")
+        else:
+            selected_browser = parse_browser_selection()
+
+        if mode == 'ewf':
+            initial_hash = ewf_image_hash(ewf_handle, filenames, logger, journal)
+        else:
+            hash_algorithm = (journal.get('hash_algorithm') if journal else None) or parse_hash_algorithm()
+            initial_hash = raw_image_hash(raw_segments, hash_algorithm, logger, journal)
+        if journal and journal.get('profiles_done') is None:
+            journal.set('selected_browser', selected_browser)
+            journal.set('profiles_done', [])
+
+        if args.io_stats or args.io_trace:
+            io_trace_path = None
+            if args.io_trace:
+                os.makedirs(output_dir, exist_ok=True)
+                io_trace_path = os.path.join(output_dir, f"{image_name}_io_trace.csv")
+            io_accounting = image_class('IOAccountingImgInfo')(img_info, io_trace_path)
+            img_info = io_accounting
 
         # Filesystem & extraction 
-        fs_info = get_filesystem(img_info, total_image_size, logger)
+        fs_info = get_filesystem(img_info, total_image_size, logger, raw_segments, journal)
         if fs_info is None:
             initial_hash = None  # prevent validation on clean exit
             return
 
-        all_history = process_user_profiles(fs_info, selected_browser, logger)
+        if args.diff_against:
+            logger.info(f"Comparing against baseline image: {args.diff_against}")
+            baseline_fs, baseline_name, baseline_handle = open_baseline_filesystem(args.diff_against, mode, logger)
+            try:
+                if baseline_fs is None:
+                    initial_hash = None
+                    return
+                changes = diff_images(baseline_fs, fs_info, selected_browser, logger, baseline_name, image_name)
+                export_history_diff(changes, output_dir, selected_browser, image_name, baseline_name, compression)
+            finally:
+                baseline_handle.close()
+            analysis_complete = True
+            return
+
+        # Output of profiles finished before an interruption
+        resumed_history, artifact_results = journal.load_partial() if journal else ([], {})
+        if resumed_history:
+            logger.info(f"Resumed {len(resumed_history)} history rows from the checkpoint")
+            if IOCS.enabled:
+                for record in resumed_history:
+                    IOCS.check(record)
+
+        # Rows are exported (and deduplicated) as each profile finishes, the resumed ones first
+        with HistoryExporter(output_dir, selected_browser, image_name, not args.no_summary, compression,
+                             not args.no_dedup, args.dedup_spill_dir, args.timeline, logger,
+                             args.dedup_expected_rows) as exporter:
+            exporter.write(resumed_history)
+            budget = ResourceBudget.from_system(args.memory_budget, args.temp_budget)
+            if args.pipeline:
+                process_user_profiles_pipelined(fs_info, selected_browser, logger, artifact_results, filters,
+                                                image_name, args.parser_workers, journal=journal, budget=budget,
+                                                on_history=exporter.write)
+            else:
+                process_user_profiles(fs_info, selected_browser, logger, artifact_results, filters, image_name,
+                                      journal, on_history=exporter.write, budget=budget)
 
-        if all_history:
-            export_history(all_history, output_dir, selected_browser, image_name)
+        if exporter.rows:
+            if args.index_dir:
+                add_to_url_index(args.index_dir, [exporter.csv_path], logger)
+            if IOCS.enabled:
+                export_ioc_hits(output_dir, selected_browser, image_name)
             logger.info("Successfully exported browser history")
         else:
             logger.warning("No browser history found to export.")
+        export_artifacts(artifact_results, output_dir, selected_browser, image_name)
 
         analysis_complete = True
+        if journal:
+            journal.finish()
     except Exception as e:
         logger.error(f"Critical error: {str(e)}")
         sys.exit(1)
@@ -1202,6 +5136,13 @@ def main():
             else:
                 logger.critical("VALIDATION FAILED: Hash mismatch! Image may have been modified.")
 
+        if analysis_complete:
+            write_metrics_report(output_dir, selected_browser, image_name, logger)
+        if io_accounting is not None:
+            io_path = io_accounting.write_report(os.path.join(output_dir, f"{image_name}_io_stats.json"))
+            logger.info(f"Wrote image I/O accounting to: {io_path}")
+            io_accounting.close_trace()
+
         # Always close handles
         if ewf_handle is not None:
             ewf_handle.close()
@@ -43,5 +43,827 @@ def test_open_raw_external_drive():
         print(f"External drive {external_drive_path} is not accessible.")
         assert True  # Test passes if the drive is not accessible
 
+def make_chromium_profile(profile_dir, urls):
+    """Create a minimal Chromium profile with a History database and Bookmarks file."""
+    import sqlite3
+    import json
+    os.makedirs(profile_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(profile_dir, 'History'))
+    conn.executescript("""
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, last_visit_time INTEGER);
+        CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER);
+        CREATE TABLE keyword_search_terms (keyword_id INTEGER, url_id INTEGER, term TEXT);
+        CREATE TABLE downloads (id INTEGER PRIMARY KEY, target_path TEXT, start_time INTEGER,
+                                received_bytes INTEGER, total_bytes INTEGER);
+        CREATE TABLE downloads_url_chains (id INTEGER, chain_index INTEGER, url TEXT);
+    """)
+    conn.executemany("INSERT INTO urls (url, title, last_visit_time) VALUES (?, ?, ?)", urls)
+    conn.execute("INSERT INTO visits (url, visit_time) SELECT id, last_visit_time FROM urls")
+    conn.execute("INSERT INTO keyword_search_terms VALUES (1, 1, 'forensics')")
+    conn.execute("INSERT INTO downloads VALUES (1, 'C:\\\\tool.exe', 13300000000000000, 10, 10)")
+    conn.execute("INSERT INTO downloads_url_chains VALUES (1, 0, 'https://example.com/tool.exe')")
+    conn.commit()
+    conn.close()
+    with open(os.path.join(profile_dir, 'Bookmarks'), 'w') as f:
+        json.dump({'roots': {'bookmark_bar': {'name': 'Bookmarks bar', 'type': 'folder', 'children': [
+            {'type': 'url', 'name': 'Example', 'url': 'https://example.com/', 'date_added': '13300000000000000'}
+        ]}}}, f)
+
+def make_chromium_history(history_path, user, count=2000):
+    """Create a Chromium History database with count URLs (https://<user>.com/<i>), one visit each."""
+    import sqlite3
+    os.makedirs(os.path.dirname(history_path), exist_ok=True)
+    conn = sqlite3.connect(history_path)
+    conn.executescript("""
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, last_visit_time INTEGER);
+        CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER);
+    """)
+    conn.executemany("INSERT INTO urls VALUES (?, ?, ?, ?)",
+                     [(i, f'https://{user}.com/{i}', f'page {i}', 13300000000000000 + i) for i in range(1, count + 1)])
+    conn.execute("INSERT INTO visits (url, visit_time) SELECT id, last_visit_time FROM urls")
+    conn.commit()
+    conn.close()
+
+def test_extract_profile_artifacts_single_workspace(tmp_path):
+    profile_dir = str(tmp_path / 'Default')
+    make_chromium_profile(profile_dir, [('https://example.com/', 'Example', 13300000000000000)])
+
+    files_dict = script.build_files_dict('Chrome', script.list_live_profile_entries(profile_dir, 'Chrome'))
+    results = script.extract_profile_artifacts(files_dict, 'Chrome', 'Default')
+
+    assert [e.url for e in results['history']] == ['https://example.com/']
+    assert results['downloads'][0]['url'] == 'https://example.com/tool.exe'
+    assert results['keyword_searches'][0]['term'] == 'forensics'
+    assert results['bookmarks'][0]['folder'] == 'Bookmarks bar'
+    assert 'favicons' not in results  # No Favicons file in this profile
+
+def test_firefox_searches_come_from_form_history(tmp_path):
+    import sqlite3
+    profile_dir = tmp_path / 'abcd.default'
+    profile_dir.mkdir()
+    conn = sqlite3.connect(str(profile_dir / 'places.sqlite'))
+    conn.executescript("""
+        CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT, title TEXT, last_visit_date INTEGER);
+        CREATE TABLE moz_keywords (id INTEGER PRIMARY KEY, keyword TEXT, place_id INTEGER);
+        INSERT INTO moz_places VALUES (1, 'https://example.com/?q=%s', 'Example', 1700000000000000);
+        INSERT INTO moz_keywords VALUES (1, 'ex', 1);
+    """)
+    conn.close()
+    conn = sqlite3.connect(str(profile_dir / 'formhistory.sqlite'))
+    conn.executescript("""
+        CREATE TABLE moz_formhistory (id INTEGER PRIMARY KEY, fieldname TEXT, value TEXT, lastUsed INTEGER);
+        INSERT INTO moz_formhistory VALUES (1, 'searchbar-history', 'forensics', 1700000000000000);
+        INSERT INTO moz_formhistory VALUES (2, 'email', 'someone@example.com', 1700000000000000);
+    """)
+    conn.close()
+
+    results = script.parse_profile_artifacts(str(profile_dir), 'Firefox', 'abcd.default')
+    assert [entry['term'] for entry in results['keyword_searches']] == ['forensics']
+    assert [entry['keyword'] for entry in results['bookmark_keywords']] == ['ex']
+
+def test_history_filters_pushed_into_sql(tmp_path):
+    from datetime import datetime
+    profile_dir = str(tmp_path / 'Default')
+    webkit = lambda dt: int((dt.timestamp() + 11644473600) * 1000000)
+    make_chromium_profile(profile_dir, [
+        ('https://www.example.com/a', 'A', webkit(datetime(2024, 1, 10))),
+        ('https://example.com/b', 'B', webkit(datetime(2024, 3, 10, 15, 30))),
+        ('https://other.org/c', 'C', webkit(datetime(2024, 1, 15))),
+    ])
+    db_path = os.path.join(profile_dir, 'History')
+
+    filters = script.build_history_filters(since=datetime(2024, 1, 1), until=datetime(2024, 2, 1))
+    assert {r[0] for r in script.extract_chromium_history(db_path, filters)} == {'https://www.example.com/a', 'https://other.org/c'}
+
+    # A date-only --until keeps that whole day
+    filters = script.build_history_filters(until=script.parse_until_time('2024-03-10'))
+    assert len(script.extract_chromium_history(db_path, filters)) == 3
+    filters = script.build_history_filters(until=script.parse_until_time('2024-03-09 23:59'))
+    assert len(script.extract_chromium_history(db_path, filters)) == 2
+
+    filters = script.build_history_filters(domains=['example.com'])
+    assert {r[0] for r in script.extract_chromium_history(db_path, filters)} == {'https://www.example.com/a', 'https://example.com/b'}
+
+    filters = script.build_history_filters(url_regex=r'/[bc]$')
+    assert {r[0] for r in script.extract_chromium_history(db_path, filters)} == {'https://example.com/b', 'https://other.org/c'}
+
+def test_parse_arguments_builds_filters():
+    args = script.parse_arguments(['image.E01', '--since', '2024-01-01', '--domain', 'Example.com'])
+    assert args.image_path == 'image.E01'
+    assert args.filters['domains'] == {'example.com'}
+    assert script.parse_arguments([]).filters is None
+
+def test_export_history_formats_compact_records(tmp_path):
+    import json
+    record = script.HistoryRecord('Chrome', 'Default', 'https://example.com/', 'Example', 13300000000000000)
+    assert not hasattr(record, '__dict__')
+
+    script.export_history([record, record], str(tmp_path), None, 'case')
+
+    with open(tmp_path / 'case_browser_history.json') as f:
+        exported = json.load(f)
+    assert exported == [record.as_dict(), record.as_dict()]
+    assert exported[0]['timestamp'] == script.format_browser_timestamp(13300000000000000, 'Chrome')
+    with open(tmp_path / 'case_browser_history.csv') as f:
+        assert f.readline().strip() == 'browser,profile,timestamp,url,title,user,source'
+
+def test_deduplicator_spills_to_disk_and_keeps_source(tmp_path):
+    records = [script.HistoryRecord('Chrome', 'Default', f'https://example.com/{i}', None, i, 'alice', 'live_system')
+               for i in range(50)]
+    repeats = [script.HistoryRecord('Chrome', 'Default', f'https://example.com/{i}', None, i, 'alice', 'image')
+               for i in range(0, 50, 5)]
+
+    with script.HistoryDeduplicator(expected_items=100, memory_keys=8, spill_dir=str(tmp_path)) as dedup:
+        unique = list(dedup.filter(records + repeats))
+
+    assert len(unique) == 50
+    assert dedup.duplicates == 10
+    assert {r.source for r in unique} == {'live_system'}
+    assert os.listdir(tmp_path) == []  # Spill set removed on close
+
+def test_deduplicator_warns_past_bloom_capacity(tmp_path, caplog):
+    import logging
+    records = [script.HistoryRecord('Chrome', 'Default', f'https://example.com/{i}', None, i, 'alice', 'img')
+               for i in range(30)]
+    logger = logging.getLogger('test_dedup')
+    with script.HistoryDeduplicator(expected_items=20, spill_dir=str(tmp_path), logger=logger) as dedup:
+        with caplog.at_level(logging.WARNING, logger='test_dedup'):
+            assert len(list(dedup.filter(records[:20]))) == 20
+            assert not caplog.records
+            assert len(list(dedup.filter(records))) == 10
+    assert dedup.duplicates == 20
+    assert [r.getMessage() for r in caplog.records] == [
+        "Dedup Bloom filter passed its design capacity of 20 rows; "
+        "lookups will increasingly hit the on-disk set (raise --dedup-expected-rows)"]
+    assert script.parse_arguments(['image.E01', '--dedup-expected-rows', '500000000']).dedup_expected_rows == 500000000
+
+def test_exporter_dedups_while_streaming_and_records_merged_sources(tmp_path):
+    import csv
+    live = [script.HistoryRecord('Chrome', 'Default', f'https://example.com/{i}', None, 13300000000000000 + i,
+                                 'alice', 'live_system') for i in range(10)]
+    image = [script.HistoryRecord('Chrome', 'Default', f'https://example.com/{i}', None, 13300000000000000 + i,
+                                  'alice', 'img') for i in range(5, 15)]
+    os.makedirs(str(tmp_path / 'spill'))
+
+    with script.HistoryExporter(str(tmp_path), None, 'case', summary=False, dedup=True,
+                                spill_dir=str(tmp_path / 'spill')) as exporter:
+        assert exporter.write(live) == 10
+        assert exporter.write(image) == 5
+        assert exporter.write(live[:3]) == 0   # Same source again: nothing to merge
+
+    assert exporter.rows == 15
+    with open(exporter.csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['source'] for row in rows] == ['live_system'] * 10 + ['img'] * 5
+    with open(tmp_path / 'case_browser_history_merged_sources.csv', newline='', encoding='utf-8') as f:
+        merged = list(csv.DictReader(f))
+    assert [(row['url'], row['source'], row['also_in']) for row in merged] == [
+        (f'https://example.com/{i}', 'live_system', 'img') for i in range(5, 10)]
+    assert os.listdir(tmp_path / 'spill') == []
+
+def make_ext4_image(tmp_path, users, name='disk.img'):
+    """Build a small ext4 image with Chromium profiles under Users/<name>/... (needs mkfs.ext4)."""
+    import shutil
+    import subprocess
+    if shutil.which('mkfs.ext4') is None:
+        pytest.skip("mkfs.ext4 not available")
+    root = tmp_path / 'root'
+    for user, urls in users.items():
+        make_chromium_profile(str(root / 'Users' / user / 'AppData/Local/Google/Chrome/User Data/Default'), urls)
+    image = tmp_path / name
+    subprocess.run(['mkfs.ext4', '-q', '-F', '-d', str(root), str(image), '8M'], check=True)
+    return str(image)
+
+def make_diff_baseline(tmp_path, monkeypatch, users):
+    """
+    Write a 2000-URL Chrome History for each user and build the baseline ext4 image.
+
+    Returns:
+        tuple: ({user: History path}, baseline image path)
+    """
+    histories = {}
+    for user in users:
+        histories[user] = str(tmp_path / 'root' / 'Users' / user / 'AppData/Local/Google/Chrome/User Data/Default'
+                              / 'History')
+        make_chromium_history(histories[user], user)
+    monkeypatch.setenv('E2FSPROGS_FAKE_TIME', '1700000000')   # Same inode change times in both images
+    return histories, make_ext4_image(tmp_path, {}, 'old.img')
+
+def test_pipelined_profiles_match_sequential(tmp_path):
+    import logging
+    import pytsk3
+    image = make_ext4_image(tmp_path, {
+        'alice': [('https://a.com/', 'A', 13300000000000000)],
+        'bob': [('https://b.com/', 'B', 13300000001000000), ('https://c.com/', 'C', 13300000002000000)],
+    })
+    fs_info = pytsk3.FS_Info(pytsk3.Img_Info(image))
+    logger = logging.getLogger('test')
+
+    sequential_artifacts, pipelined_artifacts = {}, {}
+    sequential = script.process_user_profiles(fs_info, None, logger, sequential_artifacts)
+    pipelined = script.process_user_profiles_pipelined(fs_info, None, logger, pipelined_artifacts, parser_workers=2, queue_size=1)
+
+    key = lambda r: (r.user, r.url)
+    assert sorted(map(key, pipelined)) == sorted(map(key, sequential)) == [
+        ('alice', 'https://a.com/'), ('bob', 'https://b.com/'), ('bob', 'https://c.com/')]
+    assert len(pipelined_artifacts['downloads']) == len(sequential_artifacts['downloads']) == 2
+
+    # Streamed from the writer stage instead of collected
+    exported = []
+    assert script.process_user_profiles_pipelined(fs_info, None, logger, on_history=exported.extend,
+                                                  parser_workers=2, queue_size=1) == []
+    assert sorted(map(key, exported)) == sorted(map(key, sequential))
+
+def test_stage_metrics_report(tmp_path):
+    import json
+    metrics = script.StageMetrics()
+    metrics.configure(profile_stages=['sqlite_parse'], trace_memory_stages=['sqlite_parse'])
+    with metrics.stage('sqlite_parse') as counts:
+        counts['rows'] += 1000
+        counts['bytes_read'] += 4096
+        sum(range(10000))
+
+    path = metrics.write_report(str(tmp_path / 'case_metrics.json'))
+    with open(path) as f:
+        stage = json.load(f)['stages']['sqlite_parse']
+    assert stage['calls'] == 1 and stage['rows'] == 1000 and stage['bytes_read'] == 4096
+    assert stage['wall_seconds'] > 0 and stage['rows_per_second'] > 0
+    assert 'traced_peak_bytes' in stage
+    assert os.path.exists(tmp_path / 'case_metrics_sqlite_parse.prof')
+
+def test_io_accounting_per_stage(tmp_path):
+    import csv
+    import pytsk3
+    image = tmp_path / 'disk.raw'
+    image.write_bytes(os.urandom(64 * 1024))
+    trace = tmp_path / 'trace.csv'
+    img_info = script.IOAccountingImgInfo(pytsk3.Img_Info(str(image)), str(trace))
+
+    with script.METRICS.stage('filesystem_walk'):
+        img_info.read(0, 4096)     # First read: neither sequential nor a seek
+        img_info.read(4096, 4096)  # Sequential
+        img_info.read(0, 512)      # Backward seek
+    img_info.read(32768, 1000)
+    img_info.close()
+
+    report = img_info.report()
+    walk = report['stages']['filesystem_walk']
+    assert walk['reads'] == 3 and walk['bytes'] == 4096 * 2 + 512
+    assert walk['sequential_reads'] == 1 and walk['backward_seeks'] == 1
+    assert sum(walk['seek_distances'].values()) == 2
+    assert walk['read_sizes'] == {'512': 1, '4096': 2}
+    assert report['stages']['unstaged']['read_sizes'] == {'1024': 1}
+    with open(trace) as f:
+        assert len(list(csv.reader(f))) == 5
+
+def test_bench_databases_keep_rows_in_wal(tmp_path):
+    import bench_script
+    chrome_db = str(tmp_path / 'History')
+    bench_script.make_chromium_history(chrome_db, 200, wal=True)
+    assert os.path.getsize(chrome_db + '-wal') > 0
+    result = bench_script.run_case(chrome_db, 'Chrome', 200)
+    assert result['rows'] == 200 and result['rows_per_second'] > 0
+
+    firefox_db = str(tmp_path / 'places.sqlite')
+    bench_script.make_firefox_places(firefox_db, 200)
+    assert bench_script.run_case(firefox_db, 'Firefox', 200)['rows'] == 200
+
+def test_import_does_not_load_image_backends():
+    import subprocess
+    import sys
+    code = "import sys, script; assert not {'pytsk3', 'pyewf', 'asyncio'} & set(sys.modules); script.RawSegmentImgInfo"
+    subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+def test_progress_replaces_per_row_echo(tmp_path, capsys):
+    profile_dir = str(tmp_path / 'Default')
+    make_chromium_profile(profile_dir, [(f'https://example.com/{i}', None, 13300000000000000 + i) for i in range(500)])
+    db_path = os.path.join(profile_dir, 'History')
+
+    progress = script.PROGRESS
+    try:
+        progress.configure(1)
+        progress.reset(profiles_total=2)
+        script.parse_history_db(db_path, 'Chrome', 'Default')
+        progress.profile_done()
+        progress.finish()
+        out = capsys.readouterr().out
+        assert 'URL:' not in out
+        assert '500 rows' in out and 'profiles 1/2' in out
+
+        progress.configure(0)
+        script.parse_history_db(db_path, 'Chrome', 'Default')
+        progress.finish()
+        assert capsys.readouterr().out == ''
+    finally:
+        progress.configure(1)
+
+def test_live_snapshot_includes_uncheckpointed_wal(tmp_path):
+    import sqlite3
+    profile_dir = tmp_path / 'Default'
+    make_chromium_profile(str(profile_dir), [('https://a.com/', 'A', 13300000000000000)])
+
+    # Simulate a running browser: WAL mode, new rows only in the -wal file, connection still open
+    browser = sqlite3.connect(str(profile_dir / 'History'))
+    browser.execute("PRAGMA journal_mode=WAL")
+    browser.execute("PRAGMA wal_autocheckpoint=0")
+    browser.execute("INSERT INTO urls (url, title, last_visit_time) VALUES ('https://b.com/', 'B', 13300000001000000)")
+    browser.commit()
+    try:
+        assert os.path.getsize(str(profile_dir / 'History-wal')) > 0
+        snapshot = str(tmp_path / 'snapshot')
+        assert script.snapshot_sqlite_database(str(profile_dir / 'History'), snapshot, pages_per_step=1)
+        urls = [row[0] for row in script.extract_chromium_history(snapshot)]
+        assert urls == ['https://b.com/', 'https://a.com/']
+
+        files_dict = script.build_files_dict('Chrome', script.list_live_profile_entries(str(profile_dir), 'Chrome'))
+        workspace = tmp_path / 'workspace'
+        workspace.mkdir()
+        script.copy_profile_artifacts(files_dict, 'Chrome', str(workspace))
+        assert not (workspace / 'History-wal').exists()  # Folded into the snapshot
+        assert (workspace / 'Bookmarks').exists()        # Non-SQLite files are plain copies
+    finally:
+        browser.close()
+
+def test_discover_live_profiles_scans_users_in_parallel(tmp_path):
+    import logging
+    chrome = os.path.join('AppData', 'Local', 'Google', 'Chrome', 'User Data')
+    for user in ('alice', 'bob', 'Public'):
+        make_chromium_profile(str(tmp_path / user / chrome / 'Default'), [(f'https://{user}.com/', user, 13300000000000000)])
+    make_chromium_profile(str(tmp_path / 'bob' / chrome / 'Profile 1'), [('https://bob2.com/', 'bob2', 13300000000000000)])
+    os.makedirs(str(tmp_path / 'bob' / chrome / 'Crashpad'))   # Not a profile
+    (tmp_path / 'notes.txt').write_text('not a user')
+
+    logger = logging.getLogger('test_discovery')
+    jobs = script.discover_live_profiles(str(tmp_path), None, logger, max_workers=4)
+    assert [(user, browser, profile) for user, browser, profile, _ in jobs] == [
+        ('alice', 'Chrome', 'Default'), ('bob', 'Chrome', 'Default'), ('bob', 'Chrome', 'Profile 1')]
+    assert set(jobs[0][3]['extra']) == {'Bookmarks'}
+    assert script.discover_live_profiles(str(tmp_path), 'Firefox', logger) == []
+
+    results = script.extract_profile_artifacts(jobs[2][3], 'Chrome', 'Profile 1')
+    assert [record.url for record in results['history']] == ['https://bob2.com/']
+
+def test_browser_registry_finds_every_browser_listing_each_directory_once(tmp_path):
+    import logging
+    local, roaming = tmp_path / 'carol' / 'AppData' / 'Local', tmp_path / 'carol' / 'AppData' / 'Roaming'
+    make_chromium_profile(str(local / 'BraveSoftware' / 'Brave-Browser' / 'User Data' / 'Default'),
+                          [('https://brave.com/', 'brave', 13300000000000000)])
+    make_chromium_profile(str(roaming / 'Opera Software' / 'Opera Stable'),
+                          [('https://opera.com/', 'opera', 13300000000000000)])
+    make_chromium_profile(str(local / 'google' / 'chrome' / 'User Data' / 'Default'),   # Case-insensitive match
+                          [('https://chrome.com/', 'chrome', 13300000000000000)])
+    os.makedirs(str(roaming / 'librewolf' / 'Profiles' / 'abcd.default'))
+    script.sqlite3.connect(str(roaming / 'librewolf' / 'Profiles' / 'abcd.default' / 'places.sqlite')).close()
+
+    jobs = script.discover_live_profiles(str(tmp_path), None, logging.getLogger('test_registry'))
+    assert [(browser, profile) for _, browser, profile, _ in jobs] == [
+        ('Chrome', 'Default'), ('Brave', 'Default'), ('Opera', 'Default'), ('LibreWolf', 'abcd.default')]
+    assert script.discover_live_profiles(str(tmp_path), 'LibreWolf', logging.getLogger('test_registry'))[0][1] == 'LibreWolf'
+    assert script.canonical_browser('opera gx') == 'Opera GX' and script.browser_family('Waterfox') == 'firefox'
+
+    listed = []
+    def list_dirs(path):
+        listed.append(path)
+        return script.list_live_subdirs(path)
+    appdata = {'Local': str(local), 'Roaming': str(roaming)}
+    assert set(script.locate_browsers(appdata, list_dirs)) == {'Chrome', 'Brave', 'Opera', 'LibreWolf'}
+    assert len(listed) == len(set(listed))
+
+def test_browser_selection_returns_registry_names(monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda prompt: 'opera gx')
+    assert script.parse_browser_selection() == 'Opera GX'
+    monkeypatch.setattr('builtins.input', lambda prompt: '11')
+    assert script.parse_browser_selection() == 'LibreWolf'
+    assert script.export_prefix('img', 'Opera GX') == 'img_browser_history_opera_gx'
+    assert script.export_prefix('img', None) == 'img_browser_history'
+
+class BytesImage:
+    """Minimal img_info stand-in backed by a bytes object."""
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    def read(self, offset, length):
+        return self.data[offset:offset + length]
+
+    def get_size(self):
+        return len(self.data)
+
+def test_scan_boot_sectors_ranks_volumes(tmp_path):
+    import logging
+    import struct
+    image = bytearray(8 * 1024 * 1024)
+
+    def ntfs_boot(hidden, total_sectors):
+        sector = bytearray(512)
+        sector[3:11] = b'NTFS    '
+        struct.pack_into('<HB', sector, 11, 512, 8)
+        struct.pack_into('<I', sector, 28, hidden)
+        struct.pack_into('<QQ', sector, 40, total_sectors, 4)
+        struct.pack_into('<Q', sector, 72, 0x1234)
+        sector[510:512] = b'\x55\xaa'
+        return sector
+
+    fat = bytearray(512)
+    struct.pack_into('<HBHBHH', fat, 11, 512, 8, 32, 2, 0, 0)
+    struct.pack_into('<I', fat, 32, 2048)
+    fat[82:90] = b'FAT32   '
+    fat[510:512] = b'\x55\xaa'
+
+    ntfs_offset = 1024 * 1024
+    image[ntfs_offset:ntfs_offset + 512] = ntfs_boot(2048, 4096)
+    image[ntfs_offset + 4096 * 512:ntfs_offset + 4096 * 512 + 512] = ntfs_boot(2048, 4096)  # Backup boot sector
+    image[5 * 1024 * 1024:5 * 1024 * 1024 + 512] = fat
+    image[6 * 1024 * 1024 + 100:6 * 1024 * 1024 + 108] = b'NTFS    '  # Unaligned noise
+    image[7 * 1024 * 1024 + 3:7 * 1024 * 1024 + 11] = b'NTFS    '  # Aligned, but no valid BPB
+
+    candidates = script.scan_boot_sectors(BytesImage(image), logging.getLogger('test_scan'), block_size=64 * 1024)
+    assert [(c['offset'], c['type']) for c in candidates] == [(ntfs_offset, 'NTFS'), (5 * 1024 * 1024, 'FAT32')]
+    assert candidates[0]['size'] == 4096 * 512
+    assert candidates[0]['score'] > candidates[1]['score']
+
+def test_carver_fast_paths_match_image_and_stay_sparse(tmp_path):
+    import random
+    data = bytearray(random.Random(0).randbytes(3 * 1024 * 1024))
+    data[1024 * 1024:2 * 1024 * 1024] = bytes(1024 * 1024)   # Zero run in the middle
+    data += bytes(8 * 1024 * 1024)                            # and a long zero tail
+    segments = []
+    for i, start in enumerate(range(0, len(data), 5 * 1024 * 1024 // 2)):
+        path = tmp_path / f'image.{i + 1:03d}'
+        path.write_bytes(data[start:start + 5 * 1024 * 1024 // 2])
+        segments.append(str(path))
+
+    start, size = 4096, len(data) - 8192
+    expected = bytes(data[start:start + size])
+    raw_out, buffered_out = str(tmp_path / 'raw.bin'), str(tmp_path / 'buffered.bin')
+    script.run_carver(BytesImage(data), start, size, raw_out, raw_segments=segments)
+    script.run_carver(BytesImage(data), start, size, buffered_out)
+
+    for path in (raw_out, buffered_out):
+        with open(path, 'rb') as f:
+            assert f.read() == expected
+    # The buffered path skips the zero chunks instead of writing them
+    assert os.stat(buffered_out).st_blocks * 512 < size
+
+def test_merge_timeline_orders_profiles_globally(tmp_path):
+    import csv
+    # Two Chrome profiles and a Firefox profile, each newest first as the SQL returns them
+    webkit = 11644473600000000
+    chrome_a = [script.HistoryRecord('Chrome', 'Default', f'https://a{t}.com/', '', webkit + t) for t in (90, 50, 10)]
+    chrome_b = [script.HistoryRecord('Chrome', 'Profile 1', f'https://b{t}.com/', '', webkit + t) for t in (70, 60)]
+    firefox = [script.HistoryRecord('Firefox', 'x.default', f'https://f{t}.com/', '', t) for t in (95, 55, 5)]
+
+    runs = script.TimelineRuns(str(tmp_path / 'img.runs'))
+    for record in chrome_a + chrome_b + firefox:
+        runs.append(record.unix_micros, record.as_row())
+    assert len(runs.runs) == 3 and runs.rows == 8
+    merged = list(script.merge_timeline(runs))
+    assert [key for key, _ in merged] == [95, 90, 70, 60, 55, 50, 10, 5]
+    assert next(csv.reader([merged[0][1]]))[3] == 'https://f95.com/'
+    runs.close()
+    assert not os.path.exists(str(tmp_path / 'img.runs'))
+
+    # The exporter spills each profile as it is written and merges the runs on close
+    with script.HistoryExporter(str(tmp_path), None, 'img', summary=False, timeline=True) as exporter:
+        for profile in (chrome_a, chrome_b, firefox):
+            exporter.write(profile)
+        assert os.path.exists(exporter.runs_path) and len(exporter.timeline.runs) == 3
+    assert not os.path.exists(exporter.runs_path)
+    with open(tmp_path / 'img_browser_history_timeline.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == script.HistoryRecord.FIELDS and len(rows) == 9
+    assert [row[3] for row in rows[1:4]] == ['https://f95.com/', 'https://a90.com/', 'https://b70.com/']
+
+def test_url_index_lookup_across_images(tmp_path):
+    import logging
+    logger = logging.getLogger('test_url_index')
+    webkit = 11644473600000000
+    index_dir = str(tmp_path / 'index')
+    csv_paths = []
+    for image, user, urls, postings in (('pc1', 'alice', ['https://mail.example.com/inbox#top', 'https://other.org/'], 5),
+                                        ('pc2', 'bob', ['https://www.example.com/', 'HTTPS://Other.org/'], 4)):
+        records = [script.HistoryRecord('Chrome', 'Default', url, '', webkit + 1700000000000000 + i)
+                   for i, url in enumerate(urls)]
+        script.tag_history_source(records, user, image)
+        csv_path = script.export_history(records, str(tmp_path / image), None, image)
+        csv_paths.append(csv_path)
+        assert script.add_to_url_index(index_dir, [csv_path], logger) == postings   # URLs + host and parent domains
+    assert script.add_to_url_index(index_dir, csv_paths, logger) == 0       # Already indexed
+
+    def lookup(term):
+        return sorted((r['image'], r['user']) for r in script.lookup_url_index(index_dir, term))
+
+    assert lookup('example.com') == [('pc1', 'alice'), ('pc2', 'bob')]     # Subdomain and www. included
+    assert lookup('mail.example.com') == [('pc1', 'alice')]
+    assert lookup('https://other.org/') == [('pc1', 'alice'), ('pc2', 'bob')]
+    assert lookup('https://mail.example.com/inbox') == [('pc1', 'alice')]
+    assert lookup('nowhere.net') == []
+    assert script.lookup_url_index(index_dir, 'other.org')[0]['timestamp']
+
+    script.compact_url_index(index_dir, logger)
+    assert len(script.read_url_index_manifest(index_dir)) == 1
+    assert lookup('example.com') == [('pc1', 'alice'), ('pc2', 'bob')]
+    assert lookup('https://other.org/') == [('pc1', 'alice'), ('pc2', 'bob')]
+
+    # One reader maps the segments once; a hit decodes only the strings its postings use
+    with script.UrlIndexReader(index_dir) as reader:
+        segment, = reader.segments
+        assert segment.num_strings == 6   # pc1, alice, Default, Chrome, pc2, bob
+        assert [r['user'] for r in reader.lookup('mail.example.com')] == ['alice']
+        assert sorted(segment._strings.values()) == ['Chrome', 'Default', 'alice', 'pc1']
+        assert reader.lookup('nowhere.net') == []
+
+def test_ioc_matcher_flags_urls_while_parsing(tmp_path):
+    import csv
+    ioc_file = tmp_path / 'iocs.txt'
+    ioc_file.write_text("\n".join([
+        "# watch list",
+        "evil.com",
+        "url:/wp-admin/shell.php",
+        "regex:[?&]token=[0-9a-f]{32}",
+        "regex:^ftp://",            # No usable literal: checked on every URL
+    ]))
+    matcher = script.IOCMatcher()
+    matcher.configure([str(ioc_file)])
+    assert matcher.match('https://cdn.EVIL.com/x') == [('domain', 'evil.com')]
+    assert matcher.match('https://notevil.com/') == []
+    assert matcher.match('https://site.org/WP-Admin/shell.php?a=1') == [('url', '/wp-admin/shell.php')]
+    assert matcher.match('https://a.org/?token=' + 'ab' * 16) == [('regex', '[?&]token=[0-9a-f]{32}')]
+    assert matcher.match('https://a.org/?token=short') == []
+    assert matcher.match('ftp://files.example/') == [('regex', '^ftp://')]
+
+    profile_dir = tmp_path / 'Default'
+    make_chromium_profile(str(profile_dir), [('https://evil.com/a', 'A', 13300000000000000),
+                                             ('https://good.org/', 'B', 13300000001000000)])
+    old = script.IOCS
+    script.IOCS = matcher
+    try:
+        records = script.parse_history_db(str(profile_dir / 'History'), 'Chrome', 'Default')
+        script.tag_history_source(records, 'alice', 'img')
+        path = script.export_ioc_hits(str(tmp_path / 'out'), None, 'img')
+    finally:
+        script.IOCS = old
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [(r['url'], r['user'], r['ioc_type'], r['indicator']) for r in rows] == [
+        ('https://evil.com/a', 'alice', 'domain', 'evil.com')]
+
+def test_ioc_file_with_bad_regex_names_the_line(tmp_path):
+    ioc_file = tmp_path / 'iocs.txt'
+    ioc_file.write_text("evil.com\nregex:[unclosed\n")
+    with pytest.raises(ValueError, match=r"iocs\.txt, line 2: Invalid IOC regex '\[unclosed'"):
+        script.IOCMatcher().configure([str(ioc_file)])
+
+def test_aho_corasick_overlapping_patterns():
+    automaton = script.AhoCorasick()
+    for word in ('he', 'she', 'his', 'hers'):
+        automaton.add(word, word)
+    assert automaton.search('ushers') == {'she', 'he', 'hers'}
+    assert automaton.search('xyz') == set()
+
+def test_export_history_writes_streaming_summary(tmp_path):
+    import json
+    from datetime import datetime
+    webkit = 11644473600000000
+    base = int(datetime(2024, 3, 4, 9, 30).timestamp() * 1000000)  # A Monday, local time
+    records = [script.HistoryRecord('Chrome', 'Default', url, '', webkit + base + hours * 3600 * 1000000)
+               for url, hours in (('https://a.com/1', 0), ('https://a.com/2', 1), ('https://b.com/', 24))]
+    script.tag_history_source(records, 'alice', 'img')
+    script.export_history(records, str(tmp_path), None, 'img')
+
+    with open(tmp_path / 'img_browser_history_summary.json', encoding='utf-8') as f:
+        summary = json.load(f)
+    assert summary['rows'] == 3
+    assert summary['top_domains'][0] == {'domain': 'a.com', 'visits': 2, 'first_seen': '2024-03-04 09:30:00',
+                                         'last_seen': '2024-03-04 10:30:00'}
+    assert summary['users'] == [{'user': 'alice', 'visits': 3, 'first_seen': '2024-03-04 09:30:00',
+                                 'last_seen': '2024-03-05 09:30:00'}]
+    assert summary['visits_by_hour'][9] == 2 and summary['visits_by_hour'][10] == 1
+    assert summary['visits_by_weekday']['Mon'] == 2 and summary['visits_by_weekday']['Tue'] == 1
+    assert summary['visits_by_day'] == {'2024-03-04': 2, '2024-03-05': 1}
+    assert summary['estimated_overflow_domains'] is None
+
+def test_compressed_export_matches_plain_export(tmp_path):
+    import gzip
+    from pathlib import Path
+    import json
+    records = [script.HistoryRecord('Firefox', 'abcd.default', f'https://site{i}.com/page', f'Title {i}',
+                                    1700000000000000 + i) for i in range(5000)]
+    script.tag_history_source(records, 'alice', 'img')
+    plain = script.export_history(records, str(tmp_path / 'plain'), None, 'img', summary=False)
+    compressed = script.export_history(records, str(tmp_path / 'gz'), None, 'img', summary=False, compression='gzip')
+    assert compressed.endswith('img_browser_history.csv.gz')
+
+    # Tiny blocks: many gzip members, compressed out of order, written in order
+    with script.ParallelCompressedWriter(str(tmp_path / 'blocks.csv.gz'), 'gzip', threads=4, block_size=4096) as f:
+        with open(plain, newline='', encoding='utf-8') as source:
+            for line in source:
+                f.write(line)
+    with open(plain, 'rb') as f:
+        expected = f.read()
+    assert gzip.decompress(Path(compressed).read_bytes()) == expected
+    assert gzip.decompress((tmp_path / 'blocks.csv.gz').read_bytes()) == expected
+
+    with gzip.open(tmp_path / 'gz' / 'img_browser_history.jsonl.gz', 'rt', encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert lines == [record.as_dict() for record in records]
+
+def test_aggregator_switches_to_sketch_past_max_domains():
+    aggregator = script.HistoryAggregator(max_domains=10, top_k=3)
+    for i in range(50):
+        aggregator.add_row(('Chrome', 'Default', '2024-01-01 00:00:00', f'https://d{i}.com/', '', 'u', 's'))
+    for _ in range(20):
+        aggregator.add_row(('Chrome', 'Default', '2024-01-01 00:00:00', 'https://heavy.com/', '', 'u', 's'))
+    summary = aggregator.summary()
+    assert summary['distinct_domains'] == 10 and summary['domains_estimated']
+    overflow = summary['estimated_overflow_domains']
+    assert overflow['visits'] == 60
+    assert overflow['top'][0]['domain'] == 'heavy.com' and overflow['top'][0]['estimated_visits'] >= 20
+
+def test_resource_budget_runs_small_jobs_wide_and_large_jobs_narrow(tmp_path):
+    small = tmp_path / 'History'
+    small.write_bytes(b'x' * 1000)
+    (tmp_path / 'History-wal').write_bytes(b'x' * 500)
+    assert script.estimate_profile_cost({'main': str(small), 'wal': str(small) + '-wal', 'extra': {}}) == (3000, 1500)
+    assert script.parse_size('1.5K') == 1536 and script.parse_size('4G') == 4 * 1024 ** 3
+
+    def run(costs, budget):
+        def job(cost):
+            with budget.reserve(cost, 0):
+                script.time.sleep(0.05)
+        with script.ThreadPoolExecutor(max_workers=len(costs)) as pool:
+            list(pool.map(job, costs))
+        return budget.peak_running
+
+    assert run([10] * 8, script.ResourceBudget(memory_bytes=100)) == 8
+    assert run([60] * 4, script.ResourceBudget(memory_bytes=100)) == 1
+    # Bigger than the whole budget: still runs, alone
+    assert run([500, 500], script.ResourceBudget(memory_bytes=100)) == 1
+
+def test_sequential_profiles_respect_resource_budget(tmp_path, monkeypatch):
+    import logging
+    import pytsk3
+    image = make_ext4_image(tmp_path, {'alice': [('https://a.com/', 'A', 13300000000000000)]})
+    fs_info = pytsk3.FS_Info(pytsk3.Img_Info(image))
+    modes = []
+    real_extract = script.extract_profile_artifacts
+    def recording_extract(*args, concurrent=True, **kwargs):
+        modes.append(concurrent)
+        return real_extract(*args, concurrent=concurrent, **kwargs)
+    monkeypatch.setattr(script, 'extract_profile_artifacts', recording_extract)
+
+    logger = logging.getLogger('test_budget')
+    script.process_user_profiles(fs_info, None, logger, budget=script.ResourceBudget(memory_bytes=1 << 30))
+    history = script.process_user_profiles(fs_info, None, logger, budget=script.ResourceBudget(memory_bytes=1))
+    assert modes == [True, False]   # Over budget: artifacts parsed one at a time
+    assert [r.url for r in history] == ['https://a.com/']
+
+def test_workspace_spills_large_profiles_and_reuses_directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(script.TempWorkspace, 'RAM_ROOT', str(tmp_path / 'shm'))
+    workspace = script.TempWorkspace(ram_bytes=1000, scratch_dir=str(tmp_path / 'scratch'))
+    small, large = workspace.acquire(600), workspace.acquire(5000)
+    assert small.startswith(str(tmp_path / 'shm')) and large.startswith(str(tmp_path / 'scratch'))
+    # The RAM budget is in use, so a second small profile spills too
+    assert workspace.acquire(600).startswith(str(tmp_path / 'scratch'))
+
+    os.makedirs(os.path.join(small, 'Local Storage'))
+    open(os.path.join(small, 'History'), 'wb').close()
+    workspace.release(small)
+    assert os.listdir(small) == []
+    assert workspace.acquire(600) == small
+
+    workspace.cleanup()
+    assert not os.path.exists(small) and not os.path.exists(large)
+
+    # A RAM budget of 0 disables tmpfs, even for profiles whose size is unknown (0)
+    disabled = script.TempWorkspace(ram_bytes=0, scratch_dir=str(tmp_path / 'scratch'))
+    assert disabled.acquire(0).startswith(str(tmp_path / 'scratch'))
+    disabled.cleanup()
+
+def test_checkpoint_resumes_after_interruption(tmp_path, monkeypatch):
+    import logging
+    import pytsk3
+    image = make_ext4_image(tmp_path, {
+        'alice': [('https://a.com/', 'A', 13300000000000000)],
+        'bob': [('https://b.com/', 'B', 13300000001000000)],
+    })
+    fs_info = pytsk3.FS_Info(pytsk3.Img_Info(image))
+    logger = logging.getLogger('test_checkpoint')
+    checkpoint_dir = str(tmp_path / 'checkpoint')
+
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([image])
+    journal.set('image_hash', 'abc')
+    journal.set('partition_offset', 0)
+
+    real_extract = script.extract_profile_artifacts
+    def interrupt_on_bob(files_dict, browser, profile_name, **kwargs):
+        results = real_extract(files_dict, browser, profile_name, **kwargs)
+        if any(r.url == 'https://b.com/' for r in results['history']):
+            raise KeyboardInterrupt
+        return results
+    monkeypatch.setattr(script, 'extract_profile_artifacts', interrupt_on_bob)
+    with pytest.raises(KeyboardInterrupt):
+        script.process_user_profiles(fs_info, None, logger, {}, journal=journal)
+    monkeypatch.setattr(script, 'extract_profile_artifacts', real_extract)
+
+    # Restarted run: same image, alice's profile comes from the checkpoint
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([image])
+    assert journal.get('image_hash') == 'abc' and journal.get('partition_offset') == 0
+    resumed, artifacts = journal.load_partial()
+    assert [(r.user, r.url, r.source) for r in resumed] == [('alice', 'https://a.com/', 'image')]
+    assert len(artifacts['downloads']) == 1
+    new = script.process_user_profiles(fs_info, None, logger, artifacts, journal=journal)
+    assert [(r.user, r.url) for r in new] == [('bob', 'https://b.com/')]
+    assert len(artifacts['downloads']) == 2
+
+    # Different evidence behind the same name: the checkpoint is dropped
+    with open(image, 'ab') as f:
+        f.write(b'\0' * 512)
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([image])
+    assert journal.get('image_hash') is None and journal.load_partial() == ([], {})
+
+def test_checkpoint_discarded_when_filters_change(tmp_path):
+    import logging
+    image = tmp_path / 'disk.img'
+    image.write_bytes(b'\0' * 512)
+    logger = logging.getLogger('test_checkpoint')
+    checkpoint_dir = str(tmp_path / 'checkpoint')
+    filters = script.build_history_filters(since=script.datetime(2024, 1, 1), domains=['Example.com'])
+
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([str(image)], filters)
+    journal.set('selected_browser', 'Chrome')
+    journal.set('profiles_done', ['alice/Chrome/Default'])
+
+    # Same filters: the run resumes
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([str(image)], script.build_history_filters(since=script.datetime(2024, 1, 1), domains=['example.com']))
+    assert journal.get('selected_browser') == 'Chrome'
+
+    # Different filters: the partial exports don't match, start over (and prompt again)
+    journal = script.CheckpointJournal(checkpoint_dir, logger)
+    journal.bind([str(image)], None)
+    assert journal.get('selected_browser') is None and journal.get('profiles_done') is None
+
+def test_diff_images_reports_only_changed_visits(tmp_path, monkeypatch):
+    import logging
+    import sqlite3
+    import pytsk3
+    histories, old_image = make_diff_baseline(tmp_path, monkeypatch, ('alice', 'bob'))
+
+    # Between acquisitions bob browses two new pages and deletes one visit; alice's files are untouched
+    conn = sqlite3.connect(histories['bob'])
+    conn.execute("INSERT INTO urls VALUES (2001, 'https://new.com/', 'New', 13400000000000000)")
+    conn.execute("INSERT INTO visits (url, visit_time) VALUES (2001, 13400000000000000), (5, 13400000000000001)")
+    conn.execute("DELETE FROM visits WHERE id = 1000")
+    conn.commit()
+    conn.close()
+    os.utime(histories['bob'], (1800000000, 1800000000))
+    new_image = make_ext4_image(tmp_path, {'carol': [('https://carol.com/', 'C', 13300000000000000)]}, 'new.img')
+
+    compared = []
+    real_diff_profile = script.diff_profile
+    def counting_diff_profile(old_files, new_files, browser, profile_name):
+        compared.append(bool(old_files))
+        return real_diff_profile(old_files, new_files, browser, profile_name)
+    monkeypatch.setattr(script, 'diff_profile', counting_diff_profile)
+    changes = script.diff_images(pytsk3.FS_Info(pytsk3.Img_Info(old_image)), pytsk3.FS_Info(pytsk3.Img_Info(new_image)),
+                                 None, logging.getLogger('test_diff'), 'old', 'new')
+
+    assert sorted(compared) == [False, True]   # alice skipped by metadata; bob compared; carol is new
+    assert sorted((change, kind, r.user, r.url, r.source) for change, kind, r in changes) == [
+        ('added', 'url', 'bob', 'https://new.com/', 'new'),
+        ('added', 'url', 'carol', 'https://carol.com/', 'new'),
+        ('added', 'visit', 'bob', 'https://bob.com/5', 'new'),
+        ('added', 'visit', 'bob', 'https://new.com/', 'new'),
+        ('added', 'visit', 'carol', 'https://carol.com/', 'new'),
+        ('removed', 'visit', 'bob', 'https://bob.com/1000', 'old'),
+    ]
+
+def test_diff_images_ignores_title_only_changes(tmp_path, monkeypatch):
+    import logging
+    import sqlite3
+    import pytsk3
+    histories, old_image = make_diff_baseline(tmp_path, monkeypatch, ('bob',))
+    history = histories['bob']
+
+    # The page retitles itself and gets a new visit on the same leaf as its old one
+    conn = sqlite3.connect(history)
+    conn.execute("UPDATE urls SET title = 'Renamed', last_visit_time = 13400000000000000 WHERE id = 2000")
+    conn.execute("INSERT INTO visits (url, visit_time) VALUES (2000, 13400000000000000)")
+    conn.commit()
+    conn.close()
+    os.utime(history, (1800000000, 1800000000))
+    new_image = make_ext4_image(tmp_path, {}, 'new.img')
+
+    changes = script.diff_images(pytsk3.FS_Info(pytsk3.Img_Info(old_image)), pytsk3.FS_Info(pytsk3.Img_Info(new_image)),
+                                 None, logging.getLogger('test_diff'), 'old', 'new')
+
+    assert [(change, kind, r.url, r.title, r.visit_time) for change, kind, r in changes] == [
+        ('added', 'visit', 'https://bob.com/2000', 'Renamed', 13400000000000000),
+    ]
+
 if __name__ == "__main__":
     pytest.main()